@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""measure cold start: import time of dxfvis and time to the first rendered image
+
+usage::
+
+    python -m benchmarks.bench_import --output import.json
+
+every measurement runs in a fresh interpreter. exits with status 1 when a target is missed.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from typing import Dict
+
+
+# targets in seconds, measured from the start of the import
+TARGETS = {
+    'import_dxfvis': 0.02,
+    'import_dxfvis_render': 0.2,
+    'first_render': 1.0,
+}
+
+_SCRIPTS = {
+    'import_dxfvis': 'import dxfvis',
+    'import_dxfvis_render': 'import dxfvis.render',
+    'first_render': 'import dxfvis; dxfvis.render_dxf({path!r}, 256)',
+}
+
+_TIMER = '''
+import sys, time
+t0 = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - t0
+heavy = [m for m in ('numpy', 'cv2', 'ezdxf') if m in sys.modules]
+print(elapsed, ','.join(heavy) or '-')
+'''
+
+
+def _measure(body: str, repeat: int) -> Dict[str, object]:
+    best = None
+    modules = ''
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', _TIMER.format(body=body)])
+        elapsed, modules = out.decode().split()
+        elapsed = float(elapsed)
+        best = elapsed if best is None else min(best, elapsed)
+
+    return {'seconds': best, 'loaded': [m for m in modules.split(',') if m != '-']}
+
+
+def run(repeat: int = 5) -> Dict[str, Dict[str, object]]:
+    from benchmarks.generate import make_case
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'small.dxf')
+        make_case('mixed', 100).saveas(path)
+        for name, body in _SCRIPTS.items():
+            result = _measure(body.format(path=path), repeat)
+            result['target'] = TARGETS[name]
+            result['ok'] = result['seconds'] <= TARGETS[name]
+            results[name] = result
+
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    for name, result in results.items():
+        print('{:<22} {:>8.4f}s  target {:>6.3f}s  {:<4} loaded: {}'.format(
+            name, result['seconds'], result['target'], 'ok' if result['ok'] else 'MISS',
+            ', '.join(result['loaded']) or '-'))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return 0 if all(r['ok'] for r in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
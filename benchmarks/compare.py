@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""compare two JSON files written by `benchmarks.run`
+
+usage::
+
+    python -m benchmarks.compare base.json head.json --threshold 1.1
+
+exits with status 1 when any timing of `head` is slower than `base` by more than the threshold.
+"""
+
+import argparse
+import json
+import sys
+
+from typing import Any
+from typing import Dict
+from typing import Tuple
+
+
+def _flatten(report: Dict[str, Any]) -> Dict[Tuple[str, int, str], float]:
+    """map (case, n_entities, metric) to the measured value"""
+
+    flat = {}
+    for result in report['results']:
+        key = (result['case'], result['n_entities'])
+        for stage, value in result['stages'].items():
+            flat[key + (stage,)] = value
+
+        for image_size, values in result['image_sizes'].items():
+            for metric in ('rasterize', 'end_to_end', 'end_to_end_png'):
+                if metric not in values:
+                    continue
+
+                flat[key + ('{}@{}'.format(metric, image_size),)] = values[metric]
+
+        flat[key + ('peak_rss_mb',)] = result['peak_rss_mb']
+
+    return flat
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='ratio head / base regarded as a regression')
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = _flatten(json.load(f))
+    with open(args.head) as f:
+        head = _flatten(json.load(f))
+
+    regressed = False
+    for key in sorted(set(base) & set(head)):
+        ratio = head[key] / base[key] if base[key] > 0 else float('inf')
+        mark = ''
+        if ratio > args.threshold:
+            mark = '  <-- regression'
+            regressed = True
+
+        print('{:>8} {:>8} {:<22} {:>10.4f} {:>10.4f} {:>6.2f}x{}'.format(
+            key[0], key[1], key[2], base[key], head[key], ratio, mark))
+
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
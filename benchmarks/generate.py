@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""synthetic drawing generators for the benchmark suite
+
+every generator is seeded, so the same arguments always produce the same drawing.
+"""
+
+from typing import Dict
+from typing import Optional
+
+import ezdxf
+import numpy as np
+from ezdxf.drawing import Drawing
+
+
+DEFAULT_MIX = {'LINE': 0.4, 'LWPOLYLINE': 0.3, 'ARC': 0.15, 'CIRCLE': 0.15}
+DASHED_LINETYPES = ['DASHED', 'DASHDOT', 'CENTER', 'PHANTOM', 'DOT', 'DIVIDE']
+
+
+def make_drawing(
+        n_entities: int,
+        mix: Optional[Dict[str, float]] = None,
+        dashed_ratio: float = 0.0,
+        n_layers: int = 1,
+        n_texts: int = 0,
+        insert_depth: int = 0,
+        n_inserts: int = 0,
+        extent: float = 10000.,
+        seed: int = 0) -> Drawing:
+    """build a drawing filled with random entities
+
+    :param n_entities: number of LINE/LWPOLYLINE/ARC/CIRCLE/LINE_CHAIN entities in the modelspace.
+        a LINE_CHAIN is a polyline exploded into connected LINE entities.
+    :param mix: relative frequency of each dxftype. `DEFAULT_MIX` in default.
+    :param dashed_ratio: ratio of entities drawn with a dashed linetype
+    :param n_layers: number of layers the entities are spread over
+    :param n_texts: number of TEXT entities
+    :param insert_depth: nesting depth of the block referenced by INSERT entities
+    :param n_inserts: number of INSERT entities in the modelspace
+    :param extent: edge length of the square the entities are placed in
+    :param seed: seed of the random generator
+    """
+
+    rng = np.random.RandomState(seed)
+    mix = DEFAULT_MIX if mix is None else mix
+    dxftypes = sorted(mix.keys())
+    probs = np.array([mix[t] for t in dxftypes], dtype=np.float64)
+    probs /= probs.sum()
+
+    drawing = ezdxf.new('R2010', setup=True)
+    layer_names = ['LAYER_{:04d}'.format(i) for i in range(n_layers)]
+    for i, name in enumerate(layer_names):
+        drawing.layers.new(name, dxfattribs={'color': i % 249 + 1})
+
+    msp = drawing.modelspace()
+    kinds = rng.choice(len(dxftypes), size=n_entities, p=probs)
+    centers = rng.uniform(0, extent, size=(n_entities, 2))
+    sizes = rng.uniform(extent / 1000, extent / 50, size=n_entities)
+    angles = rng.uniform(0, 360, size=(n_entities, 2))
+    layers = rng.randint(0, n_layers, size=n_entities)
+    is_dashed = rng.uniform(size=n_entities) < dashed_ratio
+    linetypes = rng.randint(0, len(DASHED_LINETYPES), size=n_entities)
+    for i in range(n_entities):
+        attribs = {'layer': layer_names[layers[i]]}
+        if is_dashed[i]:
+            attribs['linetype'] = DASHED_LINETYPES[linetypes[i]]
+
+        _add_entity(msp, dxftypes[kinds[i]], centers[i], sizes[i], angles[i], attribs, rng)
+
+    for i in range(n_texts):
+        x, y = rng.uniform(0, extent, size=2)
+        msp.add_text('TEXT {}'.format(i), dxfattribs={
+            'insert': (x, y), 'height': extent / 500, 'layer': layer_names[i % n_layers]})
+
+    if n_inserts > 0:
+        block_name = _make_nested_block(drawing, insert_depth, extent / 100, rng)
+        for i in range(n_inserts):
+            x, y = rng.uniform(0, extent, size=2)
+            msp.add_blockref(block_name, (x, y), dxfattribs={'layer': layer_names[i % n_layers]})
+
+    return drawing
+
+
+def _add_entity(layout, dxftype, center, size, angles, attribs, rng):
+    """add one entity of the given dxftype around `center`"""
+
+    x, y = center
+    if dxftype == 'LINE':
+        dx, dy = rng.uniform(-size, size, size=2)
+        layout.add_line((x, y), (x + dx, y + dy), dxfattribs=attribs)
+    elif dxftype == 'LWPOLYLINE':
+        n_points = rng.randint(3, 12)
+        points = np.array([x, y]) + rng.uniform(-size, size, size=(n_points, 2))
+        layout.add_lwpolyline([tuple(p) for p in points], dxfattribs=attribs)
+    elif dxftype == 'LINE_CHAIN':
+        n_points = rng.randint(3, 12)
+        points = np.array([x, y]) + rng.uniform(-size, size, size=(n_points, 2))
+        for start, end in zip(points[:-1], points[1:]):
+            layout.add_line(tuple(start), tuple(end), dxfattribs=attribs)
+    elif dxftype == 'ARC':
+        layout.add_arc((x, y), size, angles[0], angles[1], dxfattribs=attribs)
+    elif dxftype == 'CIRCLE':
+        layout.add_circle((x, y), size, dxfattribs=attribs)
+    else:
+        raise ValueError('unsupported dxftype: {}'.format(dxftype))
+
+
+def _make_nested_block(drawing, depth, size, rng):
+    """create blocks nested `depth` times and return the name of the outermost one"""
+
+    name = 'NESTED_0'
+    block = drawing.blocks.new(name)
+    for _ in range(8):
+        _add_entity(block, 'LINE', (0, 0), size, (0, 0), {}, rng)
+
+    for level in range(1, depth + 1):
+        inner = name
+        name = 'NESTED_{}'.format(level)
+        block = drawing.blocks.new(name)
+        block.add_blockref(inner, (size, 0))
+        block.add_blockref(inner, (0, size))
+        _add_entity(block, 'CIRCLE', (0, 0), size, (0, 0), {}, rng)
+
+    return name
+
+
+# named workloads used by run.py. values are keyword arguments for `make_drawing`
+CASES = {
+    'lines': dict(mix={'LINE': 1.0}),
+    'chains': dict(mix={'LINE_CHAIN': 1.0}),
+    'mixed': dict(),
+    'dashed': dict(dashed_ratio=1.0),
+    'layers': dict(n_layers=500),
+    'texts': dict(n_texts_ratio=1.0),
+    'inserts': dict(insert_depth=6, n_inserts_ratio=0.01),
+}
+
+
+def make_case(case: str, n_entities: int, seed: int = 0) -> Drawing:
+    """build the drawing of a named workload with `n_entities` entities"""
+
+    kwargs = dict(CASES[case])
+    if 'n_texts_ratio' in kwargs:
+        kwargs['n_texts'] = int(n_entities * kwargs.pop('n_texts_ratio'))
+    if 'n_inserts_ratio' in kwargs:
+        kwargs['n_inserts'] = max(1, int(n_entities * kwargs.pop('n_inserts_ratio')))
+
+    return make_drawing(n_entities, seed=seed, **kwargs)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""time `render_dxf` on synthetic drawings and save the results as JSON
+
+usage::
+
+    python -m benchmarks.run --cases mixed,dashed --sizes 1000,10000 --output bench.json
+
+every (case, size) pair is measured in a fresh process, so peak RSS is not shared between cases.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Any
+from typing import Dict
+from typing import List
+
+
+DEFAULT_CASES = ['lines', 'chains', 'mixed', 'dashed', 'layers', 'texts', 'inserts']
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_IMAGE_SIZES = [512, 2048, 8192]
+
+
+def _peak_rss_mb() -> float:
+    """peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # bytes on macOS, KiB elsewhere
+        return peak / 2 ** 20
+
+    return peak / 2 ** 10
+
+
+def _measure(path: str, image_sizes: List[int], repeat: int) -> Dict[str, Any]:
+    """measure every stage of rendering `path`. runs inside a worker process"""
+
+    import ezdxf
+    from dxfvis.encode import render_dxf_to_bytes
+    from dxfvis.render import collect_ops
+    from dxfvis.render import rasterize_ops
+    from dxfvis.render import render_dxf
+    from dxfvis.stitch import stitch_lines
+    from dxfvis.types import merge_ops
+
+    result: Dict[str, Any] = {'stages': {}, 'image_sizes': {}}
+    parse_times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        drawing = ezdxf.readfile(path)
+        parse_times.append(time.perf_counter() - t0)
+
+    result['stages']['parse'] = min(parse_times)
+    result['peak_rss_mb_after_parse'] = _peak_rss_mb()
+
+    collect_times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        ops, dxf_space = collect_ops(drawing)
+        collect_times.append(time.perf_counter() - t0)
+
+    result['stages']['collect'] = min(collect_times)
+    result['n_ops'] = len(ops)
+    # opencvの呼び出し回数. LINEを繋げない場合と比べます
+    result['n_draw_calls'] = len(merge_ops(stitch_lines(ops)))
+    result['n_draw_calls_unstitched'] = len(merge_ops(ops))
+    result['peak_rss_mb_after_collect'] = _peak_rss_mb()
+
+    for image_size in image_sizes:
+        rasterize_times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            canvas = rasterize_ops(ops, dxf_space, image_size)
+            rasterize_times.append(time.perf_counter() - t0)
+            del canvas
+
+        unstitched_times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            canvas = rasterize_ops(ops, dxf_space, image_size, stitch=False)
+            unstitched_times.append(time.perf_counter() - t0)
+            del canvas
+
+        e2e_times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            canvas = render_dxf(path, image_size)
+            e2e_times.append(time.perf_counter() - t0)
+            del canvas
+
+        png_times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            render_dxf_to_bytes(path, image_size, format='png', compression=1)
+            png_times.append(time.perf_counter() - t0)
+
+        result['image_sizes'][str(image_size)] = {
+            'rasterize': min(rasterize_times),
+            'rasterize_unstitched': min(unstitched_times),
+            'end_to_end': min(e2e_times),
+            'end_to_end_png': min(png_times),
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+
+    result['peak_rss_mb'] = _peak_rss_mb()
+    return result
+
+
+def _git_revision() -> str:
+    try:
+        out = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+    return out.decode().strip()
+
+
+def _environment() -> Dict[str, Any]:
+    import cv2
+    import ezdxf
+    import numpy as np
+
+    return {
+        'git_revision': _git_revision(),
+        'timestamp': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'ezdxf': ezdxf.__version__,
+    }
+
+
+def run(
+        cases: List[str],
+        sizes: List[int],
+        image_sizes: List[int],
+        repeat: int = 3,
+        seed: int = 0) -> Dict[str, Any]:
+    """run the benchmark for every combination of cases and sizes
+
+    :param cases: names of workloads defined in `generate.CASES`
+    :param sizes: numbers of entities per drawing
+    :param image_sizes: `image_size` values passed to `render_dxf`
+    :param repeat: number of repetitions. the fastest one is recorded
+    :param seed: seed of the drawing generators
+    """
+
+    from benchmarks.generate import make_case
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as workdir:
+        for case in cases:
+            for n_entities in sizes:
+                path = os.path.join(workdir, '{}_{}.dxf'.format(case, n_entities))
+                make_case(case, n_entities, seed=seed).saveas(path)
+                with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    measured = executor.submit(_measure, path, image_sizes, repeat).result()
+
+                measured.update({
+                    'case': case,
+                    'n_entities': n_entities,
+                    'file_size_mb': os.path.getsize(path) / 2 ** 20,
+                })
+                results.append(measured)
+                os.remove(path)
+                print('{:>8} {:>8} parse {:.3f}s collect {:.3f}s peak {:.0f}MiB'.format(
+                    case, n_entities, measured['stages']['parse'], measured['stages']['collect'],
+                    measured['peak_rss_mb']), file=sys.stderr)
+
+    return {
+        'environment': _environment(),
+        'config': {'cases': cases, 'sizes': sizes, 'image_sizes': image_sizes, 'repeat': repeat, 'seed': seed},
+        'results': results,
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(float(v)) for v in value.split(',') if v]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--cases', default=','.join(DEFAULT_CASES),
+                        help='comma separated workloads. available: ' + ', '.join(DEFAULT_CASES))
+    parser.add_argument('--sizes', type=_int_list, default=DEFAULT_SIZES,
+                        help='comma separated entity counts, e.g. 1e3,1e4,1e5,1e6')
+    parser.add_argument('--image-sizes', type=_int_list, default=DEFAULT_IMAGE_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_output.json')
+    args = parser.parse_args(argv)
+
+    report = run(args.cases.split(','), args.sizes, args.image_sizes, args.repeat, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
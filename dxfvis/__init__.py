@@ -1 +1,35 @@
-from .render import render_dxf
\ No newline at end of file
+import importlib
+
+# public names and the modules defining them. modules are imported on first access,
+# so `import dxfvis` does not import numpy, opencv or ezdxf.
+_LAZY_ATTRS = {
+    'render_dxf': 'dxfvis.render',
+    'render_dxf_to_bytes': 'dxfvis.encode',
+    'render_dxf_async': 'dxfvis.service',
+    'render_layer_masks': 'dxfvis.masks',
+    'render_layout': 'dxfvis.layout',
+    'render_pipeline': 'dxfvis.shared',
+    'render_progressive': 'dxfvis.progressive',
+    'write_svg': 'dxfvis.svg',
+    'probe': 'dxfvis.scan',
+    'register_draw_func': 'dxfvis.registry',
+    'RenderReport': 'dxfvis.types',
+    'PickBuffer': 'dxfvis.types',
+    'StrokePolicy': 'dxfvis.stroke',
+    'RenderBudget': 'dxfvis.budget',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""limits on the time and memory a render may take
+
+a broken or hostile file (millions of dashes from a tiny linetype pattern, a huge `image_size`)
+should not tie up a worker. `RenderBudget` holds the limits and each render gets its own
+`BudgetMeter`, which is checked between batches (dxftype groups, chunks of entities, merged
+draw calls) and never per pixel. what was cut is listed in `BudgetMeter.exceeded`.
+"""
+
+import math
+import time
+
+from typing import List
+from typing import Optional
+
+import numpy as np
+
+from dxfvis.tessellate import Curve
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import Size
+
+
+# names of the budgets in `BudgetMeter.exceeded`
+TIME = 'time'
+CANVAS = 'canvas'
+OPS = 'ops'
+DASHES = 'dashes'
+
+# share of `max_seconds` for reading and building the ops. the rest is left to draw the ops built by then
+BUILD_SHARE = 0.5
+
+
+class RenderBudget(object):
+    """limits of a render. None is no limit
+
+        budget = RenderBudget(max_seconds=5, max_canvas_bytes=256 << 20)
+        img = render_dxf(path, 8192, budget=budget, report=report)
+        if report.exceeded:
+            ...  # a partial image
+    """
+
+    def __init__(
+            self,
+            max_seconds: Optional[float] = None,
+            max_canvas_bytes: Optional[int] = None,
+            max_ops: Optional[int] = None,
+            max_dashes: Optional[int] = None) -> None:
+        """
+        :param max_seconds: wall time from the start of the render. what is drawn by then is returned.
+            reading and building the ops stop at `BUILD_SHARE` of it, so that what is built can be drawn.
+        :param max_canvas_bytes: size of the canvas (and the pick buffer). the image is made smaller to fit.
+        :param max_ops: number of entities built into ops. the first ones in drawing order are drawn.
+        :param max_dashes: number of dashes and dots of one dashed entity. entities with more are not drawn.
+        """
+        self.max_seconds = max_seconds
+        self.max_canvas_bytes = max_canvas_bytes
+        self.max_ops = max_ops
+        self.max_dashes = max_dashes
+
+    def start(self) -> 'BudgetMeter':
+        """meter of a render starting now"""
+        return BudgetMeter(self)
+
+
+class BudgetMeter(object):
+    """state of one render under a `RenderBudget`"""
+
+    def __init__(self, budget: RenderBudget) -> None:
+        self.budget = budget
+        self.started = time.perf_counter()
+        self.exceeded: List[str] = []
+
+    def cut(self, name: str) -> None:
+        """record that a budget was exceeded"""
+
+        if name not in self.exceeded:
+            self.exceeded.append(name)
+
+    def is_expired(self, share: float = 1.) -> bool:
+        """whether `share` of the time is over. recorded if so
+
+        :param share: ratio of `max_seconds`. `BUILD_SHARE` while the ops are built
+        """
+
+        max_seconds = self.budget.max_seconds
+        if max_seconds is None or time.perf_counter() - self.started <= max_seconds * share:
+            return False
+
+        self.cut(TIME)
+        return True
+
+    def fit_image_size(self, dxf_space: BoundingBox, image_size: int, dtype: type = np.float64,
+                       pick: bool = False) -> int:
+        """largest image size up to `image_size` whose canvas fits `max_canvas_bytes`"""
+
+        max_bytes = self.budget.max_canvas_bytes
+        if max_bytes is None:
+            return image_size
+
+        from dxfvis.render import get_image_shape
+
+        def size_of(size: int) -> int:
+            return canvas_bytes(get_image_shape(dxf_space, size), dtype, pick)
+
+        nbytes = size_of(image_size)
+        if nbytes <= max_bytes:
+            return image_size
+
+        self.cut(CANVAS)
+        # 面積は辺の長さの2乗に比例するので、まず比で縮め、丸めの誤差は1画素ずつ詰めます
+        size = max(int(image_size * math.sqrt(max_bytes / nbytes)), 1)
+        while size > 1 and size_of(size) > max_bytes:
+            size -= 1
+
+        return size
+
+    def is_too_dashed(self, op: OpenCVOp) -> bool:
+        """whether `op` draws more dashes than `max_dashes`. recorded if so"""
+
+        max_dashes = self.budget.max_dashes
+        if max_dashes is None:
+            return False
+
+        try:
+            n_dashes = count_dashes(op)
+        except Exception:  # the op fails when it is drawn as well
+            return False
+
+        if n_dashes <= max_dashes:
+            return False
+
+        self.cut(DASHES)
+        return True
+
+
+def canvas_bytes(canvas_shape: Size, dtype: type = np.float64, pick: bool = False) -> int:
+    """bytes of a canvas, and of its int32 pick buffer if `pick`"""
+
+    nbytes = int(np.prod(canvas_shape)) * np.dtype(dtype).itemsize
+    if pick:
+        nbytes += int(np.prod(canvas_shape[:2])) * 4
+
+    return nbytes
+
+
+def count_dashes(op: OpenCVOp) -> float:
+    """number of dashes and dots a dashed line or polyline op draws. 0 for the other ops
+
+    lengths and patterns are mapped to pixels by the same scale, so the count is found in DXF units
+    without drawing.
+    """
+
+    from dxfvis import util
+    from dxfvis.draw_funcs import line
+    from dxfvis.draw_funcs import polyline
+
+    dashed_lines = (line.pattern_line, line.textured_line)
+    kwargs = {name: val for name, (val, _) in op.kwargs.items()}
+    if op.func in dashed_lines:
+        lengths = _segment_lengths([op.args[0][0], op.args[1][0]], False)
+    elif op.func is polyline._draw_pl_op and kwargs.get('draw_func') in dashed_lines:
+        # パターンは辺ごとに始め直されます
+        lengths = _segment_lengths(op.args[0][0], kwargs.get('is_closed', False))
+    elif op.func in (polyline.pattern_polyline, polyline.textured_polyline):
+        names = ('pattern',) if op.func is polyline.pattern_polyline else ('pattern_string', 'pattern_length')
+        kwargs.update(zip(names, (val for val, _ in op.args[1:])))
+        curve = op.args[0][0]
+        lengths = _segment_lengths(curve.points(None) if isinstance(curve, Curve) else curve,
+                                   kwargs.get('is_closed', False)).sum(keepdims=True)
+    else:
+        return 0
+
+    if 'pattern' in kwargs:
+        elements = kwargs['pattern'][1:]
+    else:
+        elements = util.approx_pattern_string(kwargs['pattern_string'], kwargs['pattern_length'])[1:]
+
+    period = sum(abs(v) for v in elements)
+    if not period > 0:
+        # 長さのないパターンは実線で描かれます
+        return 0
+
+    return float(np.ceil(lengths / period).sum()) * len(elements)
+
+
+def _segment_lengths(points, is_closed: bool) -> np.ndarray:
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(pts) < 2:
+        return np.zeros(0)
+
+    if is_closed:
+        pts = np.concatenate([pts, pts[:1]])
+
+    return np.hypot(*np.diff(pts, axis=0).T)
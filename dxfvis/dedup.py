@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""drop duplicated geometry before drawing
+
+CAD exports often hold the same geometry several times (copied layers, XREFs bound twice).
+every op gets a canonical key of its style and geometry, quantized to a tolerance, with the
+endpoints of lines in a fixed order. ops with the same key are drawn once, and plain lines lying
+on another line of the same style are dropped as well.
+"""
+
+import math
+
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+from dxfvis.stitch import _is_plain_line
+from dxfvis.tessellate import Curve
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import VariableStatus as S
+
+
+# geometry closer than this ratio of the extents is regarded as the same in default
+RELATIVE_TOLERANCE = 1e-9
+
+# values in DXF units, which are quantized
+_GEOMETRY = (S.CONSTANT_MAPPING, S.POINT_MAPPING, S.SEQUENCE_MAPPING, S.ARRAY_MAPPING, S.CURVE_MAPPING,
+             S.SUBPIXEL_MAPPING)
+
+
+def dedup_ops(
+        ops: Sequence[Optional[OpenCVOp]],
+        dxf_space: BoundingBox,
+        tolerance: Optional[float] = None) -> Tuple[List[OpenCVOp], int]:
+    """drop ops drawing the same shape in the same style, and plain lines covered by another line of their style
+
+    of the same shapes, the one drawn last is kept, so what shows on top does not change.
+    a covered line is dropped wherever the covering one is drawn.
+
+    :param ops: drawing operations built by `collect_ops`
+    :param dxf_space: extents of the drawing in DXF coordinates
+    :param tolerance: coordinates closer than this (in DXF units) are regarded as the same.
+        `RELATIVE_TOLERANCE` of the extents in default.
+
+    :returns ops to draw in the order of `ops`, number of ops dropped
+    """
+
+    ops = [op for op in ops if op is not None]
+    (xmin, ymin), (xmax, ymax) = dxf_space
+    span = max(xmax - xmin, ymax - ymin)
+    if tolerance is None:
+        tolerance = span * RELATIVE_TOLERANCE
+    if not tolerance > 0:
+        return ops, 0
+
+    is_kept = np.ones(len(ops), dtype=bool)
+    lines: List[int] = []
+    last: Dict[Hashable, int] = {}
+    for i, op in enumerate(ops):
+        if _is_plain_line(op):
+            lines.append(i)
+            continue
+
+        key = _op_key(op, tolerance)
+        if key is None:
+            continue
+
+        if key in last:
+            is_kept[last[key]] = False
+
+        last[key] = i
+
+    if len(lines) > 1:
+        covered = _covered_lines([ops[i] for i in lines], tolerance, tolerance / span)
+        is_kept[np.array(lines)[covered]] = False
+
+    return [op for op, kept in zip(ops, is_kept) if kept], int(len(ops) - is_kept.sum())
+
+
+def _covered_lines(lines: List[OpenCVOp], tolerance: float, angle_tolerance: float) -> np.ndarray:
+    """whether each line lies on another line of the same style. of equal lines, the last is not covered"""
+
+    style_index: Dict[Hashable, int] = {}
+    styles = np.array([style_index.setdefault(_kwargs_key(op.kwargs), len(style_index)) for op in lines])
+    pts = np.array([(op.args[0][0][:2], op.args[1][0][:2]) for op in lines], dtype=np.float64)
+
+    # 向きを揃えた単位ベクトル d と、直線の位置 (d に垂直な距離) で同じ直線上の線分をまとめます
+    vec = pts[:, 1] - pts[:, 0]
+    length = np.hypot(vec[:, 0], vec[:, 1])
+    flip = (vec[:, 0] < 0) | ((vec[:, 0] == 0) & (vec[:, 1] < 0))
+    vec[flip] *= -1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        d = vec / length[:, None]
+    d[length == 0] = 0
+
+    offset = d[:, 0] * pts[:, 0, 1] - d[:, 1] * pts[:, 0, 0]
+    proj = np.einsum('nij,nj->ni', pts, d)
+    start = np.floor(proj.min(axis=1) / tolerance + 0.5).astype(np.int64)
+    stop = np.floor(proj.max(axis=1) / tolerance + 0.5).astype(np.int64)
+    # 長さ0の線分は端点の位置でまとめます
+    is_dot = length == 0
+    offset[is_dot] = 0
+    start[is_dot] = 0
+    stop[is_dot] = 0
+    point_keys = np.floor(pts[:, 0] / tolerance + 0.5).astype(np.int64) * is_dot[:, None]
+
+    line_keys = np.column_stack([
+        styles,
+        np.floor(d / angle_tolerance + 0.5).astype(np.int64),
+        np.floor(offset / tolerance + 0.5).astype(np.int64),
+        point_keys])
+    _, groups = np.unique(line_keys, axis=0, return_inverse=True)
+    groups = groups.reshape(-1)
+
+    # 直線ごとに始点の順、同じ始点では長い順、同じ線分では後に描くものから並べ、それまでの終点の最大で覆われるかを判定します
+    index = np.arange(len(lines))
+    order = np.lexsort((-index, -stop, start, groups))
+    stop_sorted = stop[order] - stop.min()
+    width = int(stop_sorted.max()) + 1
+    keys = groups[order].astype(np.int64) * width + stop_sorted
+    reach = np.maximum.accumulate(keys)
+    covered = np.zeros(len(lines), dtype=bool)
+    covered[order[1:]] = reach[:-1] >= keys[1:]
+    return covered
+
+
+def _op_key(op: OpenCVOp, tolerance: float) -> Optional[Hashable]:
+    """canonical key of the style and shape of an op, or None if it cannot be compared"""
+
+    try:
+        key = (op.func, op.merge_arg,
+               tuple(_value_key(val, status, tolerance) for val, status in op.args),
+               _kwargs_key(op.kwargs, tolerance))
+        hash(key)
+    except (TypeError, ValueError):
+        return None
+
+    return key
+
+
+def _kwargs_key(kwargs: Dict[str, Tuple[Any, S]], tolerance: Optional[float] = None) -> Hashable:
+    if tolerance is None:
+        # 色と線の太さだけのものはそのまま使えます
+        key = tuple(sorted((name, val, status.value) for name, (val, status) in kwargs.items()))
+        try:
+            hash(key)
+            return key
+        except TypeError:
+            pass
+
+    return tuple(sorted((name, _value_key(val, status, tolerance)) for name, (val, status) in kwargs.items()))
+
+
+def _value_key(val: Any, status: S, tolerance: Optional[float]) -> Hashable:
+    if status in _GEOMETRY and tolerance is not None:
+        return _quantize(val, tolerance)
+
+    return _hashable(val)
+
+
+def _quantize(val: Any, tolerance: float) -> Hashable:
+    if isinstance(val, Curve):
+        return getattr(val.func, '__name__', val.func), tuple(_quantize(arg, tolerance) for arg in val.args)
+    if isinstance(val, (bool, str)) or val is None:
+        return val
+    if callable(val):  # flatten functions of curves
+        return val
+    if isinstance(val, (int, float, np.number)):
+        return math.floor(float(val) / tolerance + 0.5)
+    if isinstance(val, np.ndarray):
+        q = np.floor(val.astype(np.float64) / tolerance + 0.5).astype(np.int64)
+        return q.shape, q.tobytes()
+    if isinstance(val, (list, tuple)) or hasattr(val, '__len__'):
+        return tuple(_quantize(v, tolerance) for v in val)
+
+    raise TypeError('cannot quantize {}'.format(type(val).__name__))
+
+
+def _hashable(val: Any) -> Hashable:
+    if isinstance(val, np.ndarray):
+        return val.shape, val.dtype.str, val.tobytes()
+    if isinstance(val, (list, tuple)):
+        return tuple(_hashable(v) for v in val)
+
+    return val
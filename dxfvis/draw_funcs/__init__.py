@@ -1,10 +1,37 @@
-from .arc import draw_arc
-from .circle import draw_circle
-from .line import draw_line
-from .polyline import draw_polyline
-from .polyline import draw_lwpolyline
-from .text import draw_text
-from .point import draw_point
-from .insert import draw_insert
-from .mtext import draw_mtext
-from .ellipse import draw_ellipse
+import importlib
+
+# the entity classes used in annotations of the draw functions live in ezdxf.legacy / ezdxf.modern,
+# which are loaded along with ezdxf.drawing
+import ezdxf.drawing  # noqa: F401
+
+# draw functions and the modules defining them. modules are imported on first access.
+_LAZY_ATTRS = {
+    'draw_arc': '.arc',
+    'draw_circle': '.circle',
+    'draw_line': '.line',
+    'draw_polyline': '.polyline',
+    'draw_lwpolyline': '.polyline',
+    'draw_text': '.text',
+    'draw_point': '.point',
+    'draw_insert': '.insert',
+    'draw_mtext': '.mtext',
+    'draw_ellipse': '.ellipse',
+    'draw_spline': '.spline',
+    'draw_hatch': '.hatch',
+    'draw_solid': '.solid',
+}
+
+__all__ = list(_LAZY_ATTRS)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRS:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+    value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
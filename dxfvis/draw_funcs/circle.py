@@ -2,21 +2,23 @@
 # -*- coding:utf-8 -*-
 
 
+import math
+
 from typing import Optional
+from typing import List
 from typing import Tuple
 
-import cv2
 import ezdxf
 import numpy as np
 
+from dxfvis import ocs
 from dxfvis import util
+from dxfvis.tessellate import Curve
+from dxfvis.tessellate import flatten_arc
 from dxfvis.types import OpenCVOp
 from dxfvis.types import BoundingBox
-from dxfvis.types import VariableStatus as S
-from dxfvis.types import NPPoint
 
-from .arc import pattern_arc
-from .arc import textured_arc_approx
+from .polyline import curve_op
 
 
 def draw_circle(
@@ -24,42 +26,47 @@ def draw_circle(
         drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
     """円を描画します"""
 
-    linetype = util.get_linetype(entity, drawing)
-    pt_center = entity.dxf.center[:2]
-    radius = int(entity.dxf.radius)
-    if radius == 0:
+    style = (util.get_color(entity, drawing), util.get_linetype(entity, drawing), util.get_lineweight(entity, drawing))
+    return _circle_ops([entity], drawing, [style])[0]
+
+
+def draw_circles(
+        entities: List[ezdxf.legacy.graphics.Circle],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数の円をまとめて描画します"""
+
+    return _circle_ops(entities, drawing, util.get_styles(entities, drawing))
+
+
+def _circle_ops(entities, drawing, styles) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    # 押し出し方向ごとに中心をまとめてWCSに変換します
+    entity_reps: List[Optional[Tuple[OpenCVOp, BoundingBox]]] = [None] * len(entities)
+    for extrusion, indices in ocs.group_by_extrusion(entities).items():
+        matrix = ocs.ocs_matrix(extrusion)
+        centers = np.array([ocs.xyz(entities[i].dxf.center) for i in indices], dtype=np.float64).reshape(-1, 3)
+        if matrix is not None and ocs.is_conformal(matrix):
+            centers[:, :2] = ocs.to_wcs(centers[:, :2], matrix, centers[:, 2])
+            matrix = None
+
+        for i, center in zip(indices, centers):
+            color, linetype, lineweight = styles[i]
+            entity_reps[i] = _circle_op(entities[i], drawing, color, linetype, lineweight, center, matrix)
+
+    return entity_reps
+
+
+def _circle_op(entity, drawing, color, linetype, lineweight, center, matrix) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    radius = entity.dxf.radius
+    if radius <= 0:
         return None
 
-    if linetype is None or linetype.dxf.length == 0:
-        op = OpenCVOp(cv2.circle,
-                      args=((pt_center, S.POINT_MAPPING), (radius, S.CONSTANT_MAPPING)),
-                      kwargs={
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING)})
-    elif 'pattern' in linetype.dxfattribs().keys():
-        op = OpenCVOp(pattern_arc,
-                      args=(
-                          (pt_center, S.POINT_MAPPING),
-                          (radius, S.CONSTANT_MAPPING),
-                          (entity.dxf.pattern, S.SEQUENCE_MAPPING),
-                          (0, S.NO_MAPPING),
-                          (360, S.NO_MAPPING)),
-                      kwargs={
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING)})
+    pt_center = (float(center[0]), float(center[1]))
+    bbox = ((pt_center[0] - radius, pt_center[1] - radius), (pt_center[0] + radius, pt_center[1] + radius))
+    if matrix is None:
+        curve = Curve(flatten_arc, pt_center, radius, 0., 2 * math.pi)
     else:
-        pattern_length = 1 if 'length' not in linetype.dxfattribs() else linetype.dxf.length
-        op = OpenCVOp(textured_arc_approx,
-                      args=(
-                          (pt_center, S.POINT_MAPPING),
-                          (radius, S.CONSTANT_MAPPING),
-                          (linetype.dxf.description, S.NO_MAPPING),
-                          (pattern_length, S.CONSTANT_MAPPING),
-                          (0, S.NO_MAPPING),
-                          (360, S.NO_MAPPING)),
-                      kwargs={
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING)})
+        # 傾いた平面の円は楕円になります
+        curve = Curve(ocs.flatten_in_ocs, matrix, float(center[2]), flatten_arc, pt_center, radius, 0., 2 * math.pi)
+        bbox = ocs.map_bbox(bbox, matrix, float(center[2]))
 
-    bbox = ((pt_center[0] - radius, pt_center[1] - radius), (pt_center[0] + radius, pt_center[1] + radius))
-    return op, bbox
+    return curve_op(curve, entity, drawing, color, linetype, lineweight), bbox
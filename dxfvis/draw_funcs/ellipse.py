@@ -2,21 +2,20 @@
 # -*- coding:utf-8 -*-
 
 
+from typing import List
 from typing import Optional
 from typing import Tuple
 
-import cv2
 import ezdxf
-import numpy as np
 
+from dxfvis import ocs
 from dxfvis import util
+from dxfvis.tessellate import Curve
+from dxfvis.tessellate import flatten_ellipse
 from dxfvis.types import OpenCVOp
 from dxfvis.types import BoundingBox
-from dxfvis.types import VariableStatus as S
-from dxfvis.types import NPPoint
 
-from .arc import pattern_arc
-from .arc import textured_arc_approx
+from .polyline import curve_op
 
 
 def draw_ellipse(
@@ -24,4 +23,31 @@ def draw_ellipse(
         drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
     """楕円を描画します"""
 
-    return None
+    return _ellipse_op(entity, drawing, util.get_color(entity, drawing), util.get_linetype(entity, drawing),
+                       util.get_lineweight(entity, drawing))
+
+
+def draw_ellipses(
+        entities: List[ezdxf.modern.ellipse.Ellipse],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数の楕円をまとめて描画します"""
+
+    styles = util.get_styles(entities, drawing)
+    return [_ellipse_op(entity, drawing, color, linetype, lineweight)
+            for entity, (color, linetype, lineweight) in zip(entities, styles)]
+
+
+def _ellipse_op(entity, drawing, color, linetype, lineweight) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    major_axis = entity.dxf.major_axis[:2]
+    ratio = entity.dxf.ratio
+    if major_axis == (0, 0) or ratio == 0:
+        return None
+
+    start_param = entity.get_dxf_attrib('start_param', 0.)
+    end_param = entity.get_dxf_attrib('end_param', 0.)
+    if ocs.get_extrusion(entity)[2] < 0:
+        # 中心と軸はWCSですが、短軸は押し出し方向から決まるので、-Z では媒介変数の向きが逆になります
+        start_param, end_param = -end_param, -start_param
+
+    curve = Curve(flatten_ellipse, entity.dxf.center[:2], major_axis, ratio, start_param, end_param)
+    return curve_op(curve, entity, drawing, color, linetype, lineweight), curve.bbox()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+
+import math
+
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import cv2
+import ezdxf
+import numpy as np
+from ezdxf.modern.hatch import BoundaryPathData
+from ezdxf.modern.hatch import PatternData
+
+from dxfvis import util
+from dxfvis.tessellate import Curve
+from dxfvis.tessellate import flatten_arc
+from dxfvis.tessellate import flatten_bulges
+from dxfvis.tessellate import flatten_ellipse
+from dxfvis.tessellate import flatten_spline
+from dxfvis.types import OpenCVOp
+from dxfvis.types import BoundingBox
+from dxfvis.types import VariableStatus as S
+
+
+# パターンの線の間隔がこのピクセル数より狭い場合は、線の代わりに濃度を落とした塗りつぶしで描画します. 0で無効
+SOLID_TONE_SPACING = 3.
+# 1つのハッチで描画する線分の上限. 超える場合は塗りつぶしで描画します
+MAX_PATTERN_SEGMENTS = 1000000
+
+# pattern line: (angle in degree, base point, offset, dash lengths) in DXF units
+PatternLine = Tuple[float, Tuple[float, float], Tuple[float, float], Tuple[float, ...]]
+
+
+def draw_hatch(
+        entity: ezdxf.modern.hatch.Hatch,
+        drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    """ハッチを描画します"""
+
+    return _hatch_op(entity, drawing, util.get_color(entity, drawing), util.get_lineweight(entity, drawing))
+
+
+def draw_hatches(
+        entities: List[ezdxf.modern.hatch.Hatch],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数のハッチをまとめて描画します"""
+
+    styles = util.get_styles(entities, drawing)
+    return [_hatch_op(entity, drawing, color, lineweight) for entity, (color, _, lineweight) in zip(entities, styles)]
+
+
+def _hatch_op(entity, drawing, color, lineweight) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    loops = get_boundary_loops(entity)
+    if len(loops) == 0:
+        return None
+
+    if entity.has_solid_fill or entity.has_gradient_data:
+        op = OpenCVOp(fill_loops,
+                      args=((loops, S.CURVE_MAPPING),),
+                      kwargs={'color': (color, S.NO_MAPPING)})
+    else:
+        pattern_lines = [
+            (line.angle, tuple(line.base_point[:2]), tuple(line.offset[:2]), tuple(line.dash_length_items))
+            for line in PatternData(entity).lines]
+        if len(pattern_lines) == 0:
+            return None
+
+        base_points = np.array([line[1] for line in pattern_lines], dtype=np.float64)
+        op = OpenCVOp(pattern_hatch,
+                      args=(
+                          (loops, S.CURVE_MAPPING),
+                          (base_points, S.ARRAY_MAPPING),
+                          (pattern_lines, S.NO_MAPPING),
+                          (1., S.CONSTANT_MAPPING)),
+                      kwargs={
+                          'color': (color, S.NO_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
+                          'tone': (True, S.NO_MAPPING)})
+
+    bboxes = np.array([loop.bbox() for loop in loops])
+    bbox = (tuple(bboxes[:, 0].min(axis=0)), tuple(bboxes[:, 1].max(axis=0)))
+    return op, bbox
+
+
+def get_boundary_loops(entity: ezdxf.modern.hatch.Hatch) -> List[Curve]:
+    """ハッチの境界をそれぞれ閉じた曲線に変換します"""
+
+    loops = []
+    for path in BoundaryPathData(entity).paths:
+        if hasattr(path, 'vertices'):  # PolylinePath
+            if len(path.vertices) < 3 and not any(v[2] for v in path.vertices if len(v) > 2):
+                continue
+
+            vertices = [v[:2] for v in path.vertices]
+            bulges = [v[2] if len(v) > 2 else 0 for v in path.vertices]
+            loops.append(Curve(flatten_bulges, vertices, bulges, True))
+        else:  # EdgePath
+            edges = [_edge_data(edge) for edge in path.edges]
+            edges = [edge for edge in edges if edge is not None]
+            if edges:
+                loops.append(Curve(flatten_edges, edges))
+
+    return loops
+
+
+def _edge_data(edge) -> Optional[tuple]:
+    """ezdxfのエッジを描画時に折れ線にするための値に変換します"""
+
+    edge_type = type(edge).__name__
+    if edge_type == 'LineEdge':
+        return 'line', tuple(edge.start[:2]), tuple(edge.end[:2])
+    elif edge_type == 'ArcEdge':
+        return ('arc', tuple(edge.center[:2]), edge.radius, edge.start_angle, edge.end_angle,
+                bool(edge.is_counter_clockwise))
+    elif edge_type == 'EllipseEdge':
+        return ('ellipse', tuple(edge.center[:2]), tuple(edge.major_axis[:2]), edge.ratio, edge.start_angle,
+                edge.end_angle, bool(edge.is_counter_clockwise))
+    elif edge_type == 'SplineEdge':
+        if len(edge.control_points) >= 2:
+            return ('spline', [p[:2] for p in edge.control_points], list(edge.knot_values), edge.degree,
+                    list(edge.weights) or None)
+        elif len(edge.fit_points) >= 2:
+            return ('line',) + tuple(tuple(p[:2]) for p in edge.fit_points)
+
+    return None
+
+
+def flatten_edges(edges: List[tuple], tolerance: Optional[float] = None) -> np.ndarray:
+    """エッジで構成された境界を頂点の配列に変換します"""
+
+    points: List[np.ndarray] = []
+    for edge in edges:
+        if edge[0] == 'line':
+            pts = np.array(edge[1:], dtype=np.float64)
+        elif edge[0] == 'arc':
+            _, center, radius, start_angle, end_angle, is_counter_clockwise = edge
+            pts = flatten_arc(center, radius, *_edge_sweep(start_angle, end_angle, is_counter_clockwise), tolerance)
+        elif edge[0] == 'ellipse':
+            _, center, major_axis, ratio, start_angle, end_angle, is_counter_clockwise = edge
+            start, sweep = _edge_sweep(start_angle, end_angle, is_counter_clockwise)
+            if sweep >= 0:
+                pts = flatten_ellipse(center, major_axis, ratio, start, start + sweep, tolerance)
+            else:
+                pts = flatten_ellipse(center, major_axis, ratio, start + sweep, start, tolerance)[::-1]
+        else:
+            _, control_points, knots, degree, weights = edge
+            pts = flatten_spline(control_points, knots, degree, weights, tolerance)
+
+        # 向きが逆に格納されているエッジは前のエッジにつながるように反転します
+        if points:
+            last = points[-1][-1]
+            if np.sum((pts[-1] - last) ** 2) < np.sum((pts[0] - last) ** 2):
+                pts = pts[::-1]
+
+        points.append(pts)
+
+    return np.concatenate(points)
+
+
+def _edge_sweep(start_angle, end_angle, is_counter_clockwise) -> Tuple[float, float]:
+    """エッジの角度(度)を開始角と回転角(ラジアン)に変換します. 時計回りのエッジの角度は反転して格納されています"""
+
+    if is_counter_clockwise:
+        sweep = (end_angle - start_angle) % 360 or 360
+    else:
+        start_angle, end_angle = -start_angle, -end_angle
+        sweep = -((start_angle - end_angle) % 360 or 360)
+
+    return math.radians(start_angle), math.radians(sweep)
+
+
+def fill_loops(img: np.ndarray, loops: List[np.ndarray], color=(255, 255, 255)) -> None:
+    """境界をまとめて塗りつぶします. 内側の境界は穴になります"""
+    cv2.fillPoly(img, loops, color)
+
+
+def pattern_hatch(
+        img: np.ndarray,
+        loops: List[np.ndarray],
+        base_points: np.ndarray,
+        pattern_lines: List[PatternLine],
+        px_per_unit: float,
+        color=(255, 255, 255),
+        thickness=1,
+        tone=True) -> None:
+    """パターンハッチを平行線群として描画します. 線はnumpyで境界に切り取り、一度に描画します
+
+    線が細かすぎる場合は塗りつぶします. `tone` がTrueの場合は線の密度に応じて色を薄めます
+    """
+
+    segments, coverage = hatch_segments(loops, base_points, pattern_lines, px_per_unit, thickness)
+    if segments is None:
+        cv2.fillPoly(img, loops, tuple(c * coverage for c in color) if tone else color)
+    elif len(segments) > 0:
+        cv2.polylines(img, list(np.rint(segments).astype(np.int32)), False, color, thickness)
+
+
+def hatch_segments(
+        loops: List[np.ndarray],
+        base_points: np.ndarray,
+        pattern_lines: List[PatternLine],
+        px_per_unit: float,
+        thickness=1) -> Tuple[Optional[np.ndarray], float]:
+    """パターンの線分を境界で切り取ります
+
+    :returns (M, 2, 2)の線分. 塗りつぶす場合はNone, 線が画素を覆う割合
+    """
+
+    edges_from = np.concatenate(loops).astype(np.float64)
+    edges_to = np.concatenate([np.roll(loop, -1, axis=0) for loop in loops]).astype(np.float64)
+
+    families = []
+    for (angle, _, offset, dashes), base in zip(pattern_lines, base_points):
+        # 画像上ではy軸が反転します
+        direction = np.array([np.cos(np.radians(angle)), -np.sin(np.radians(angle))])
+        normal = np.array([-direction[1], direction[0]])
+        offset = np.array([offset[0], -offset[1]]) * px_per_unit
+        spacing = float(offset @ normal)
+        if abs(spacing) < 1e-9:
+            continue
+
+        families.append((direction, normal, spacing, float(offset @ direction), base.astype(np.float64),
+                         np.array(dashes, dtype=np.float64) * px_per_unit))
+
+    if not families:
+        return np.zeros((0, 2, 2)), 0.
+
+    coverage = min(1., sum(max(thickness, 1) / abs(f[2]) for f in families))
+    if min(abs(f[2]) for f in families) < SOLID_TONE_SPACING:
+        return None, coverage
+
+    segments = []
+    for direction, normal, spacing, shift, base, dashes in families:
+        segs = _clip_family(edges_from - base, edges_to - base, direction, normal, spacing, shift, dashes)
+        if segs is None:
+            return None, coverage
+
+        segments.append(segs + base)
+
+    return np.concatenate(segments), coverage
+
+
+def _clip_family(p0, p1, direction, normal, spacing, shift, dashes) -> Optional[np.ndarray]:
+    """基準点を原点とした境界の辺 p0 -> p1 で平行線群を切り取り、(M, 2, 2)の線分を返します.
+    線分の数が`MAX_PATTERN_SEGMENTS`を超える場合はNoneを返します"""
+
+    # 各辺の端点が何本目の線の位置にあるか
+    t0 = p0 @ normal / spacing
+    t1 = p1 @ normal / spacing
+    k_from = np.ceil(np.minimum(t0, t1))
+    k_to = np.ceil(np.maximum(t0, t1))  # 半開区間で頂点上の交点を二重に数えません
+    counts = (k_to - k_from).astype(np.int64)
+    total = int(counts.sum())
+    if total > 2 * MAX_PATTERN_SEGMENTS:
+        return None
+    if total == 0:
+        return np.zeros((0, 2, 2))
+
+    edge_idx = np.repeat(np.arange(len(p0)), counts)
+    first = np.cumsum(counts) - counts
+    k = k_from[edge_idx] + (np.arange(total) - first[edge_idx])
+    ratio = (k - t0[edge_idx]) / (t1[edge_idx] - t0[edge_idx])
+    s0 = p0[edge_idx] @ direction
+    s1 = p1[edge_idx] @ direction
+    s = s0 + ratio * (s1 - s0)
+
+    # 線ごとに交点を並べ、偶数番目から奇数番目までを内側とします
+    order = np.lexsort((s, k))
+    k = k[order]
+    s = s[order]
+    _, group_start, group_count = np.unique(k, return_index=True, return_counts=True)
+    rank = np.arange(len(k)) - np.repeat(group_start, group_count)
+    keep = rank < np.repeat(group_count - group_count % 2, group_count)
+    k = k[keep][0::2]
+    s_from = s[keep][0::2]
+    s_to = s[keep][1::2]
+
+    if len(dashes) > 0:
+        k, s_from, s_to = _apply_dashes(k, s_from, s_to, shift, dashes)
+        if k is None:
+            return None
+
+    origin = k[:, None] * spacing * normal
+    return np.stack([origin + s_from[:, None] * direction, origin + s_to[:, None] * direction], axis=1)
+
+
+def _apply_dashes(k, s_from, s_to, shift, dashes):
+    """線分を破線のパターンで分割します. 破線の始点は各線の基準点 k * offset です"""
+
+    period = np.abs(dashes).sum()
+    if period <= 0:
+        return k, s_from, s_to
+
+    starts = np.cumsum(np.abs(dashes)) - np.abs(dashes)
+    draw = dashes >= 0  # 0 is a dot
+    dash_from = starts[draw]
+    dash_len = dashes[draw]
+
+    phase = k * shift
+    m_from = np.floor((s_from - phase) / period)
+    m_to = np.floor((s_to - phase) / period)
+    n_periods = (m_to - m_from + 1).astype(np.int64)
+    total = int(n_periods.sum()) * len(dash_from)
+    if total > MAX_PATTERN_SEGMENTS:
+        return None, None, None
+
+    seg_idx = np.repeat(np.arange(len(k)), n_periods)
+    first = np.cumsum(n_periods) - n_periods
+    m = m_from[seg_idx] + (np.arange(len(seg_idx)) - first[seg_idx])
+    period_start = phase[seg_idx] + m * period
+    a = (period_start[:, None] + dash_from[None, :]).ravel()
+    b = a + np.tile(dash_len, len(seg_idx))
+    seg_idx = np.repeat(seg_idx, len(dash_from))
+    a = np.maximum(a, s_from[seg_idx])
+    b = np.minimum(b, s_to[seg_idx])
+    visible = b >= a
+    return k[seg_idx][visible], a[visible], b[visible]
@@ -15,8 +15,6 @@ from dxfvis.types import BoundingBox
 from dxfvis.types import VariableStatus as S
 from dxfvis.types import NPPoint
 
-from .arc import pattern_arc
-from .arc import textured_arc_approx
 
 
 def draw_insert(
@@ -2,6 +2,7 @@
 # -*- coding:utf-8 -*-
 
 
+from typing import List
 from typing import Tuple
 
 import cv2
@@ -20,24 +21,38 @@ def draw_line(
         drawing: ezdxf.drawing.Drawing) -> Tuple[OpenCVOp, BoundingBox]:
     """実線を描画します"""
 
-    linetype = util.get_linetype(entity, drawing)
+    return _line_op(entity, drawing, util.get_color(entity, drawing), util.get_linetype(entity, drawing),
+                    util.get_lineweight(entity, drawing))
+
+
+def draw_lines(
+        entities: List[ezdxf.legacy.graphics.Line],
+        drawing: ezdxf.drawing.Drawing) -> List[Tuple[OpenCVOp, BoundingBox]]:
+    """複数の実線をまとめて描画します"""
+
+    styles = util.get_styles(entities, drawing)
+    return [_line_op(entity, drawing, color, linetype, lineweight)
+            for entity, (color, linetype, lineweight) in zip(entities, styles)]
+
+
+def _line_op(entity, drawing, color, linetype, lineweight) -> Tuple[OpenCVOp, BoundingBox]:
     start = entity.dxf.start[:2]
     end = entity.dxf.end[:2]
     if linetype is None or linetype.dxf.length == 0:
         op = OpenCVOp(cv2.line,
                       args=((start, S.POINT_MAPPING), (end, S.POINT_MAPPING)),
                       kwargs={
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING)})
+                          'color': (color, S.NO_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING)})
     elif 'pattern' in linetype.dxfattribs().keys():
         pattern = util.scale_linetype_length(linetype.dxf.pattern)
         op = OpenCVOp(pattern_line,
                       args=((start, S.POINT_MAPPING), (end, S.POINT_MAPPING)),
                       kwargs={
                           'pattern': (pattern, S.SEQUENCE_MAPPING),
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING),
-                          'dot_radius': (util.get_dot_radius(entity, drawing), S.CONSTANT_MAPPING)})
+                          'color': (color, S.NO_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
+                          'dot_radius': (lineweight, S.DOT_MAPPING)})
     else:
         pattern_length = 100 if 'length' not in linetype.dxfattribs() else util.scale_linetype_length(linetype.dxf.length)
         op = OpenCVOp(textured_line,
@@ -45,13 +60,12 @@ def draw_line(
                       kwargs={
                           'pattern_string': (linetype.dxf.description, S.NO_MAPPING),
                           'pattern_length': (pattern_length, S.CONSTANT_MAPPING),
-                          'thickness': (util.get_linewidth(entity, drawing), S.CONSTANT_MAPPING),
-                          'color': (util.get_color(entity, drawing), S.NO_MAPPING)})
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
+                          'color': (color, S.NO_MAPPING)})
 
-    xmin = min(start[0], end[0])
-    xmax = max(start[0], end[0])
-    ymin = min(start[1], end[1])
-    ymax = max(start[1], end[1])
+    # NaN が範囲に残るように比べます
+    xmin, xmax = (start[0], end[0]) if start[0] <= end[0] else (end[0], start[0])
+    ymin, ymax = (start[1], end[1]) if start[1] <= end[1] else (end[1], start[1])
     bbox = ((xmin, ymin), (xmax, ymax))
 
     return op, bbox
@@ -74,6 +88,11 @@ def pattern_line(
     if angle is None:
         return
 
+    if not sum(abs(p) for p in pattern[1:]) > 0:
+        # 長さのないパターンでは進まないので実線で描きます
+        cv2.line(img, pt1, pt2, color, thickness)
+        return
+
     x_coef = np.cos(angle)
     y_coef = np.sin(angle)
 
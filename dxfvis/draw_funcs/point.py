@@ -24,13 +24,13 @@ def draw_point(
 
     pt = entity.dxf.location[:2]
     color = util.get_color(entity, drawing)
-    radius = util.get_dot_radius(entity, drawing)
+    lineweight = util.get_lineweight(entity, drawing)
 
     op = OpenCVOp(cv2.circle,
-                  args=((pt, S.POINT_MAPPING), (radius, S.CONSTANT_MAPPING)),
+                  args=((pt, S.POINT_MAPPING), (lineweight, S.DOT_MAPPING)),
                   kwargs={
                       'color': (color, S.NO_MAPPING),
-                      'thickness': -1})  # fill in the circle
+                      'thickness': (-1, S.NO_MAPPING)})  # fill in the circle
 
     bbox = (pt, pt)
 
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import math
 
+from typing import List
 from typing import Tuple
 from typing import Optional
 
@@ -9,8 +11,12 @@ import cv2
 import ezdxf
 import numpy as np
 
+from dxfvis import ocs
 from dxfvis import util
+from dxfvis.tessellate import Curve
+from dxfvis.tessellate import flatten_bulges
 from dxfvis.types import OpenCVOp
+from dxfvis.types import SUBPIXEL_SHIFT
 from dxfvis.types import BoundingBox
 from dxfvis.types import VariableStatus as S
 from dxfvis.types import NPPoint
@@ -24,20 +30,37 @@ def draw_polyline(
         drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
     """多角実線を描画します"""
 
-    if entity.is_3d_polyline:
-        raise NotImplementedError
+    return _polyline_op(entity, drawing, util.get_color(entity, drawing), util.get_linetype(entity, drawing),
+                        util.get_lineweight(entity, drawing))
 
-    color = util.get_color(entity, drawing)
-    thickness = util.get_linewidth(entity, drawing)
-    linetype = util.get_linetype(entity, drawing)
+
+def draw_polylines(
+        entities: List[ezdxf.legacy.polyline.Polyline],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数の多角実線をまとめて描画します"""
+
+    styles = util.get_styles(entities, drawing)
+    return [_polyline_op(entity, drawing, color, linetype, lineweight)
+            for entity, (color, linetype, lineweight) in zip(entities, styles)]
+
+
+def _polyline_op(entity, drawing, color, linetype, lineweight) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    # 3Dポリラインは XY 平面に投影します
     vertices = [v.dxf.location[:2] for v in entity.vertices()]
+    if len(vertices) == 0:
+        return None
+
+    bulges = [v.get_dxf_attrib('bulge', 0) for v in entity.vertices()]
+    if any(bulges):
+        curve = Curve(flatten_bulges, vertices, bulges, entity.is_closed)
+        return curve_op(curve, entity, drawing, color, linetype, lineweight), curve.bbox()
 
     if linetype is None or linetype.dxf.length == 0:
         op = OpenCVOp(_draw_pl_op,
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.is_closed, S.NO_MAPPING)})
     elif 'pattern' in linetype.dxfattribs().keys():
         pattern = util.scale_linetype_length(linetype.dxf.pattern)
@@ -45,26 +68,23 @@ def draw_polyline(
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.is_closed, S.NO_MAPPING),
                           'draw_func': (pattern_line, S.NO_MAPPING),
                           'pattern': (pattern, S.SEQUENCE_MAPPING),
-                          'dot_radius': (util.get_dot_radius(entity, drawing), S.CONSTANT_MAPPING)})
+                          'dot_radius': (lineweight, S.DOT_MAPPING)})
     else:
         op = OpenCVOp(_draw_pl_op,
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.is_closed, S.NO_MAPPING),
                           'draw_func': (textured_line, S.NO_MAPPING),
                           'pattern_string': (linetype.dxf.description, S.NO_MAPPING),
                           'pattern_length': (util.scale_linetype_length(linetype.dxf.length), S.CONSTANT_MAPPING)})
 
-    x_list = [v[0] for v in vertices]
-    y_list = [v[1] for v in vertices]
-    bbox = ((min(x_list), min(y_list)), (max(x_list), max(y_list)))
-    return op, bbox
+    return op, _vertices_bbox(vertices)
 
 
 def draw_lwpolyline(
@@ -72,17 +92,63 @@ def draw_lwpolyline(
         drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
     """軽量ポリラインを描画します"""
 
-    color = util.get_color(entity, drawing)
-    thickness = util.get_linewidth(entity, drawing)
-    linetype = util.get_linetype(entity, drawing)
-    vertices = [v[:2] for v in entity.vertices()]
+    style = (util.get_color(entity, drawing), util.get_linetype(entity, drawing), util.get_lineweight(entity, drawing))
+    return _lwpolyline_ops([entity], drawing, [style])[0]
+
+
+def draw_lwpolylines(
+        entities: List[ezdxf.modern.lwpolyline.LWPolyline],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数の軽量ポリラインをまとめて描画します"""
+
+    return _lwpolyline_ops(entities, drawing, util.get_styles(entities, drawing))
+
+
+def _lwpolyline_ops(entities, drawing, styles) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    # 頂点はOCSの座標です. 押し出し方向ごとに全ての頂点をまとめてWCSに変換します
+    entity_reps: List[Optional[Tuple[OpenCVOp, BoundingBox]]] = [None] * len(entities)
+    for extrusion, indices in ocs.group_by_extrusion(entities).items():
+        points = [entities[i].get_points('xyb') for i in indices]
+        matrix = ocs.ocs_matrix(extrusion)
+        if matrix is None:
+            wcs_points = [([v[:2] for v in pts], [v[2] for v in pts]) for pts in points]
+        else:
+            elevations = [entities[i].get_dxf_attrib('elevation', 0.) for i in indices]
+            mapped = ocs.vertices_to_wcs([[v[:2] for v in pts] for pts in points], matrix, elevations)
+            # 鏡映ではふくらみの向きが逆になります
+            sign = 1. if np.linalg.det(matrix[:, :2]) > 0 else -1.
+            wcs_points = [([tuple(v) for v in vertices.tolist()], [sign * v[2] for v in pts])
+                          for vertices, pts in zip(mapped, points)]
+
+        is_conformal = matrix is None or ocs.is_conformal(matrix)
+        for k, i in enumerate(indices):
+            color, linetype, lineweight = styles[i]
+            vertices, bulges = wcs_points[k]
+            if is_conformal or not any(bulges):
+                entity_reps[i] = _lwpolyline_op(entities[i], drawing, color, linetype, lineweight, vertices, bulges)
+            else:
+                # 傾いた平面の弧は楕円弧になるので、OCSで折れ線にしてから変換します
+                curve = Curve(ocs.flatten_in_ocs, matrix, float(elevations[k]), flatten_bulges,
+                              [v[:2] for v in points[k]], [v[2] for v in points[k]], entities[i].closed)
+                entity_reps[i] = curve_op(curve, entities[i], drawing, color, linetype, lineweight), curve.bbox()
+
+    return entity_reps
+
+
+def _lwpolyline_op(entity, drawing, color, linetype, lineweight, vertices, bulges) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    if len(vertices) == 0:
+        return None
+
+    if any(bulges):
+        curve = Curve(flatten_bulges, vertices, bulges, entity.closed)
+        return curve_op(curve, entity, drawing, color, linetype, lineweight), curve.bbox()
 
     if linetype is None or linetype.dxf.length == 0:
         op = OpenCVOp(_draw_pl_op,
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.closed, S.NO_MAPPING)})
     elif 'pattern' in linetype.dxfattribs().keys():
         pattern = util.scale_linetype_length(linetype.dxf.pattern)
@@ -90,26 +156,33 @@ def draw_lwpolyline(
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.closed, S.NO_MAPPING),
                           'draw_func': (pattern_line, S.NO_MAPPING),
                           'pattern': (pattern, S.SEQUENCE_MAPPING),
-                          'dot_radius': (util.get_dot_radius(entity, drawing), S.CONSTANT_MAPPING)})
+                          'dot_radius': (lineweight, S.DOT_MAPPING)})
     else:
         op = OpenCVOp(_draw_pl_op,
                       args=((vertices, S.SEQUENCE_MAPPING),),
                       kwargs={
                           'color': (color, S.NO_MAPPING),
-                          'thickness': (thickness, S.CONSTANT_MAPPING),
+                          'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
                           'is_closed': (entity.closed, S.NO_MAPPING),
                           'draw_func': (textured_line, S.NO_MAPPING),
                           'pattern_string': (linetype.dxf.description, S.NO_MAPPING),
                           'pattern_length': (util.scale_linetype_length(linetype.dxf.length), S.CONSTANT_MAPPING)})
 
+    return op, _vertices_bbox(vertices)
+
+
+def _vertices_bbox(vertices) -> BoundingBox:
     x_list = [v[0] for v in vertices]
     y_list = [v[1] for v in vertices]
-    bbox = ((min(x_list), min(y_list)), (max(x_list), max(y_list)))
-    return op, bbox
+    if not math.isfinite(sum(x_list) + sum(y_list)):
+        # min/max は NaN を飛ばすので、範囲を無効にします
+        return (math.nan, math.nan), (math.nan, math.nan)
+
+    return (min(x_list), min(y_list)), (max(x_list), max(y_list))
 
 
 def _draw_pl_op(img, vertices, color, thickness, is_closed=False, draw_func=cv2.line, **kwargs):
@@ -127,3 +200,113 @@ def _draw_pl_op(img, vertices, color, thickness, is_closed=False, draw_func=cv2.
 
     if is_closed:
         draw_func(img, pt_start, pt_prev, **kwargs)
+
+
+def curve_op(curve: Curve, entity, drawing, color, linetype, lineweight, is_closed=False) -> OpenCVOp:
+    """曲線を折れ線として描画する操作を作ります. 頂点の数は描画時の縮尺で決まります"""
+
+    if linetype is None or linetype.dxf.length == 0:
+        # 同じ色・太さの曲線が続く場合はまとめて一度に描画されます
+        return OpenCVOp(cv2.polylines,
+                        args=(([curve], S.SUBPIXEL_MAPPING), (is_closed, S.NO_MAPPING)),
+                        kwargs={
+                            'color': (color, S.NO_MAPPING),
+                            'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
+                            'lineType': (cv2.LINE_8, S.NO_MAPPING),
+                            'shift': (SUBPIXEL_SHIFT, S.NO_MAPPING)},
+                        merge_arg=0)
+    elif 'pattern' in linetype.dxfattribs().keys():
+        pattern = util.scale_linetype_length(linetype.dxf.pattern)
+        return OpenCVOp(pattern_polyline,
+                        args=((curve, S.CURVE_MAPPING), (pattern, S.SEQUENCE_MAPPING)),
+                        kwargs={
+                            'is_closed': (is_closed, S.NO_MAPPING),
+                            'color': (color, S.NO_MAPPING),
+                            'thickness': (lineweight, S.LINEWEIGHT_MAPPING),
+                            'dot_radius': (lineweight, S.DOT_MAPPING)})
+    else:
+        pattern_length = 100 if 'length' not in linetype.dxfattribs() else util.scale_linetype_length(linetype.dxf.length)
+        return OpenCVOp(textured_polyline,
+                        args=(
+                            (curve, S.CURVE_MAPPING),
+                            (linetype.dxf.description, S.NO_MAPPING),
+                            (pattern_length, S.CONSTANT_MAPPING)),
+                        kwargs={
+                            'is_closed': (is_closed, S.NO_MAPPING),
+                            'color': (color, S.NO_MAPPING),
+                            'thickness': (lineweight, S.LINEWEIGHT_MAPPING)})
+
+
+def pattern_polyline(
+        img: np.ndarray,
+        vertices: np.ndarray,
+        pattern: Tuple[float, ...],
+        is_closed=False,
+        color=(255, 255, 255),
+        thickness=10,
+        dot_radius=4) -> None:
+    """折れ線に沿ってパターンを描画します. 破線は頂点をまたいで続きます"""
+
+    pts = np.asarray(vertices, dtype=np.float64)
+    if is_closed:
+        pts = np.concatenate([pts, pts[:1]])
+
+    dash_lengths = np.asarray(pattern[1:], dtype=np.float64)
+    period = np.abs(dash_lengths).sum()
+    if len(pts) < 2 or period <= 0:
+        cv2.polylines(img, [np.asarray(vertices, dtype=np.int32)], is_closed, color, thickness)
+        return
+
+    seg_lengths = np.hypot(*np.diff(pts, axis=0).T)
+    cum = np.concatenate([[0.], np.cumsum(seg_lengths)])
+    total = cum[-1]
+
+    # パターンを繰り返した時の各要素の開始位置
+    offsets = np.cumsum(np.abs(dash_lengths)) - np.abs(dash_lengths)
+    n_periods = int(np.ceil(total / period)) or 1
+    starts = (np.arange(n_periods)[:, None] * period + offsets[None, :]).ravel()
+    lengths = np.tile(dash_lengths, n_periods)
+
+    is_dash = (lengths > 0) & (starts < total)
+    dash_from = starts[is_dash]
+    dash_to = np.minimum(starts[is_dash] + lengths[is_dash], total)
+    if len(dash_from) > 0:
+        # 破線ごとに、両端と間に含まれる頂点をつなぎます
+        first = np.searchsorted(cum, dash_from, side='right')
+        last = np.searchsorted(cum, dash_to, side='left')
+        inner = np.maximum(last - first, 0)
+        counts = inner + 2
+        idx = np.repeat(first, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)) - 1
+        line_pts = pts[np.clip(idx, 0, len(pts) - 1)]
+        ends = np.cumsum(counts)
+        line_pts[ends - counts] = _point_at(pts, cum, seg_lengths, dash_from)
+        line_pts[ends - 1] = _point_at(pts, cum, seg_lengths, dash_to)
+        cv2.polylines(img, np.split(np.rint(line_pts).astype(np.int32), ends[:-1]), False, color, thickness)
+
+    is_dot = (lengths == 0) & (starts <= total)
+    for pt in np.rint(_point_at(pts, cum, seg_lengths, starts[is_dot])).astype(int):
+        cv2.circle(img, (int(pt[0]), int(pt[1])), dot_radius, color, thickness=-1)
+
+
+def textured_polyline(
+        img: np.ndarray,
+        vertices: np.ndarray,
+        pattern_string: str,
+        pattern_length: float,
+        is_closed=False,
+        color=(255, 255, 255),
+        thickness=10) -> None:
+    """折れ線に沿ってpattern stringを近似したパターンを描画します"""
+
+    pattern = util.approx_pattern_string(pattern_string, pattern_length)
+    pattern_polyline(img, vertices, pattern, is_closed, color, thickness)
+
+
+def _point_at(pts: np.ndarray, cum: np.ndarray, seg_lengths: np.ndarray, dists: np.ndarray) -> np.ndarray:
+    """折れ線の始点から`dists`だけ進んだ点"""
+
+    seg = np.clip(np.searchsorted(cum, dists, side='right') - 1, 0, len(seg_lengths) - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(seg_lengths[seg] > 0, (dists - cum[seg]) / seg_lengths[seg], 0.)
+
+    return pts[seg] + ratio[:, None] * (pts[seg + 1] - pts[seg])
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+
+from typing import Optional
+from typing import Tuple
+
+import cv2
+import ezdxf
+import numpy as np
+
+from dxfvis import util
+from dxfvis.types import OpenCVOp
+from dxfvis.types import BoundingBox
+from dxfvis.types import VariableStatus as S
+
+
+def draw_solid(
+        entity: ezdxf.legacy.trace.Solid,
+        drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    """塗りつぶされた三角形・四角形(SOLID, TRACE)を描画します"""
+
+    vertices = [entity.dxf.vtx0[:2], entity.dxf.vtx1[:2], entity.dxf.vtx2[:2]]
+    vtx3 = entity.get_dxf_attrib('vtx3', None)
+    # 4点目は3点目の前に結ばれます. 3点目と同じ場合は三角形です
+    if vtx3 is not None and tuple(vtx3[:2]) != tuple(vertices[2]):
+        vertices.insert(2, vtx3[:2])
+
+    pts = np.array(vertices, dtype=np.float64)
+    op = OpenCVOp(cv2.fillPoly,
+                  args=(([pts], S.ARRAY_MAPPING),),
+                  kwargs={'color': (util.get_color(entity, drawing), S.NO_MAPPING)})
+
+    bbox = (tuple(pts.min(axis=0)), tuple(pts.max(axis=0)))
+    return op, bbox
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import ezdxf
+
+from dxfvis import util
+from dxfvis.tessellate import Curve
+from dxfvis.tessellate import flatten_bulges
+from dxfvis.tessellate import flatten_spline
+from dxfvis.types import OpenCVOp
+from dxfvis.types import BoundingBox
+
+from .polyline import curve_op
+
+
+def draw_spline(
+        entity: ezdxf.modern.spline.Spline,
+        drawing: ezdxf.drawing.Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    """スプライン曲線を描画します"""
+
+    return _spline_op(entity, drawing, util.get_color(entity, drawing), util.get_linetype(entity, drawing),
+                      util.get_lineweight(entity, drawing))
+
+
+def draw_splines(
+        entities: List[ezdxf.modern.spline.Spline],
+        drawing: ezdxf.drawing.Drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]:
+    """複数のスプライン曲線をまとめて描画します"""
+
+    styles = util.get_styles(entities, drawing)
+    return [_spline_op(entity, drawing, color, linetype, lineweight)
+            for entity, (color, linetype, lineweight) in zip(entities, styles)]
+
+
+def _spline_op(entity, drawing, color, linetype, lineweight) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+    control_points = [p[:2] for p in entity.control_points]
+    if len(control_points) >= 2:
+        weights = list(entity.weights)
+        curve = Curve(flatten_spline, control_points, list(entity.knot_values), entity.dxf.degree, weights or None)
+    else:
+        # 制御点のないスプラインは通過点を直線で結びます
+        fit_points = [p[:2] for p in entity.fit_points]
+        if len(fit_points) < 2:
+            return None
+
+        curve = Curve(flatten_bulges, fit_points, [0] * len(fit_points), entity.closed)
+
+    return curve_op(curve, entity, drawing, color, linetype, lineweight), curve.bbox()
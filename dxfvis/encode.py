@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""render dxf files directly into encoded images"""
+
+import struct
+import zlib
+
+from typing import Any
+from typing import BinaryIO
+from typing import List
+from typing import Optional
+from typing import Union
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from dxfvis.render import collect_entity_ops
+from dxfvis.render import collect_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import load_drawing
+from dxfvis.render import rasterize_ops
+from dxfvis.stroke import StrokePolicy
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import merge_ops
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+
+
+FORMATS = {'png': '.png', 'jpeg': '.jpg', 'jpg': '.jpg', 'webp': '.webp'}
+
+
+def render_dxf_to_bytes(
+        drawing: Union[str, 'Drawing'],
+        image_size: int,
+        is_plain: bool = False,
+        format: str = 'png',
+        compression: Optional[int] = None,
+        monochrome: bool = False,
+        stroke: Optional[StrokePolicy] = None,
+        **filters: Any) -> bytes:
+    """render a dxf file and return as encoded image
+
+    :param drawing: path or object for a DXF file
+    :param image_size: maximum edge length of the image to return
+    :param is_plain: see `render_dxf`
+    :param format: one of png, jpeg and webp
+    :param compression: png compression level (0 ~ 9, lower is faster), or jpeg/webp quality (0 ~ 100).
+        opencv default in default.
+    :param monochrome: encode every drawn pixel as white on black. png is written with 1 bit per pixel.
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    ext = FORMATS.get(format.lower())
+    if ext is None:
+        raise ValueError('unsupported format: {}'.format(format))
+
+    drawing = load_drawing(drawing)
+    ops, dxf_space = collect_ops(drawing, **filters)
+    canvas = rasterize_ops(ops, dxf_space, image_size, dtype=np.uint8, stroke=stroke)
+    if monochrome:
+        canvas = _to_monochrome(canvas)
+    else:
+        cv2.cvtColor(canvas, cv2.COLOR_RGB2BGR, dst=canvas)
+
+    params: List[int] = []
+    if ext == '.png':
+        if compression is not None:
+            params += [cv2.IMWRITE_PNG_COMPRESSION, compression]
+        if monochrome:
+            params += [cv2.IMWRITE_PNG_BILEVEL, 1]
+    elif compression is not None:
+        params += [cv2.IMWRITE_JPEG_QUALITY if ext == '.jpg' else cv2.IMWRITE_WEBP_QUALITY, compression]
+
+    ok, buf = cv2.imencode(ext, canvas, params)
+    if not ok:
+        raise RuntimeError('failed to encode the image as {}'.format(format))
+
+    return buf.tobytes()
+
+
+def write_png_tiled(
+        drawing: Union[str, 'Drawing'],
+        file: Union[str, BinaryIO],
+        image_size: int,
+        is_plain: bool = False,
+        compression: int = 6,
+        monochrome: bool = False,
+        tile_height: int = 1024,
+        stroke: Optional[StrokePolicy] = None,
+        **filters: Any) -> None:
+    """render a dxf file into a png file one horizontal strip at a time
+
+    only one strip of `tile_height` rows is held in memory, so the image may be larger than the memory,
+    and each strip draws only the ops whose bounding box, widened by their line width, meets it.
+    lines crossing the border of strips are clipped per strip, and opencv draws a clipped line from
+    the clipped end, so their pixels may be a pixel off from `render_dxf` along the whole strip.
+
+    :param drawing: path or object for a DXF file
+    :param file: path or binary file object to write
+    :param image_size: maximum edge length of the image
+    :param is_plain: see `render_dxf`
+    :param compression: zlib compression level (0 ~ 9)
+    :param monochrome: write every drawn pixel as white with 1 bit per pixel
+    :param tile_height: number of rows rendered at once
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    drawing = load_drawing(drawing)
+    _, entity_reps = collect_entity_ops(drawing, **filters)
+    entity_reps = [entity_rep for entity_rep in entity_reps if entity_rep is not None]
+    dxf_space = get_extents(entity_reps)
+    image_shape = get_image_shape(dxf_space, image_size)
+    if isinstance(file, str):
+        with open(file, 'wb') as f:
+            _write_png_strips(f, entity_reps, dxf_space, image_shape, compression, monochrome, tile_height, stroke)
+    else:
+        _write_png_strips(file, entity_reps, dxf_space, image_shape, compression, monochrome, tile_height, stroke)
+
+
+def _write_png_strips(f, entity_reps, dxf_space, image_shape, compression, monochrome, tile_height, stroke):
+    from dxfvis.order import _pad_pixels
+
+    height, width = image_shape[:2]
+    bit_depth, color_type = (1, 0) if monochrome else (8, 2)
+    f.write(b'\x89PNG\r\n\x1a\n')
+    _write_chunk(f, b'IHDR', struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0))
+
+    # 線幅は帯ではなく画像全体の大きさで決めます
+    widths = (stroke or StrokePolicy()).widths(image_shape)
+    ops: List[OpenCVOp] = [op for op, _ in entity_reps]
+    # 帯は横幅いっぱいなので、縦の範囲だけで選びます. 線の太さの分だけ広げます
+    pixel = (dxf_space[1][1] - dxf_space[0][1]) / height
+    pads = np.array([_pad_pixels(op, widths) * pixel for op in ops], dtype=np.float64)
+    bottoms = np.array([bbox[0][1] for _, bbox in entity_reps], dtype=np.float64) - pads
+    tops = np.array([bbox[1][1] for _, bbox in entity_reps], dtype=np.float64) + pads
+
+    compressor = zlib.compressobj(compression)
+    for row in range(0, height, tile_height):
+        rows = min(tile_height, height - row)
+        strip = np.zeros((rows, width, 3), dtype=np.uint8)
+        strip_space = _strip_space(dxf_space, height, row, rows)
+        hit = (bottoms <= strip_space[1][1]) & (tops >= strip_space[0][1])
+        for op in merge_ops([ops[i] for i in np.flatnonzero(hit)], widths):
+            op(strip, strip_space, canvas_shape=image_shape, stroke=widths)
+
+        if monochrome:
+            strip = np.packbits(_to_monochrome(strip) > 0, axis=1)
+        else:
+            strip = strip.reshape(rows, -1)
+
+        # every scanline starts with filter type 0 (None)
+        scanlines = np.concatenate([np.zeros((rows, 1), dtype=np.uint8), strip], axis=1)
+        data = compressor.compress(scanlines.tobytes())
+        if data:
+            _write_chunk(f, b'IDAT', data)
+
+    _write_chunk(f, b'IDAT', compressor.flush())
+    _write_chunk(f, b'IEND', b'')
+
+
+def _strip_space(dxf_space: BoundingBox, height: int, row: int, rows: int) -> BoundingBox:
+    """DXF coordinates covered by rows `row` ~ `row + rows` of an image of `height` rows
+
+    the strip is shifted by whole pixels, so every strip maps points exactly as the whole image does.
+    """
+
+    (xmin, ymin), (xmax, ymax) = dxf_space
+    pixel = (ymax - ymin) / height
+    strip_ymin = ymin + (height - rows - row) * pixel
+    return (xmin, strip_ymin), (xmax, strip_ymin + rows * pixel)
+
+
+def _write_chunk(f: BinaryIO, chunk_type: bytes, data: bytes) -> None:
+    f.write(struct.pack('>I', len(data)))
+    f.write(chunk_type)
+    f.write(data)
+    f.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(chunk_type)) & 0xffffffff))
+
+
+def _to_monochrome(canvas: np.ndarray) -> np.ndarray:
+    """single channel image where every drawn pixel is 255"""
+    gray = canvas.max(axis=2)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY)[1]
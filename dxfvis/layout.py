@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""render paperspace layouts, with the modelspace shown through their viewports
+
+the modelspace is compiled into a `ModelScene` once. each viewport selects the ops whose bounding
+box meets its view, and draws them into its rectangle of the canvas at its own scale, so the
+content is clipped to the viewport and nothing outside it is drawn.
+"""
+
+import math
+import warnings
+
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Union
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from dxfvis.render import collect_entity_ops
+from dxfvis.render import build_entity_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import iter_entities
+from dxfvis.render import load_drawing
+from dxfvis.render import make_entity_filter
+from dxfvis.stroke import StrokePolicy
+from dxfvis.stroke import StrokeWidths
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import merge_ops
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+    from ezdxf.modern.layouts import Layout
+    from ezdxf.modern.viewport import Viewport
+
+
+class ModelScene(object):
+    """ops of the modelspace with their bounding boxes, shared by every viewport"""
+
+    ops: List[OpenCVOp]
+    bboxes: np.ndarray  # (N, 4) of xmin, ymin, xmax, ymax
+
+    def __init__(self, ops: List[OpenCVOp], bboxes: np.ndarray) -> None:
+        self.ops = ops
+        self.bboxes = bboxes
+
+    @classmethod
+    def compile(cls, drawing: 'Drawing', **filters: Any) -> 'ModelScene':
+        """build the ops of the modelspace. see `render_dxf` for the filters"""
+
+        _, entity_reps = collect_entity_ops(drawing, **filters)
+        entity_reps = [entity_rep for entity_rep in entity_reps if entity_rep is not None]
+        bboxes = np.array([(bb[0][0], bb[0][1], bb[1][0], bb[1][1]) for _, bb in entity_reps],
+                          dtype=np.float64).reshape(-1, 4)
+        return cls([op for op, _ in entity_reps], bboxes)
+
+    def select(self, view: BoundingBox) -> List[OpenCVOp]:
+        """ops whose bounding box meets `view`, in drawing order"""
+
+        (xmin, ymin), (xmax, ymax) = view
+        b = self.bboxes
+        hit = (b[:, 0] <= xmax) & (b[:, 2] >= xmin) & (b[:, 1] <= ymax) & (b[:, 3] >= ymin)
+        return [self.ops[i] for i in np.flatnonzero(hit)]
+
+
+def render_layout(
+        drawing: Union[str, 'Drawing'],
+        image_size: int,
+        layout: Optional[str] = None,
+        scene: Optional[ModelScene] = None,
+        stroke: Optional[StrokePolicy] = None,
+        **filters: Any) -> np.ndarray:
+    """render a paperspace layout and return as numpy array
+
+    the image covers the paper limits of the layout, or its content when the limits are not set.
+    entities of the layout and viewports are drawn in the order of the layout.
+
+    :param drawing: path or object for a DXF file
+    :param image_size: maximum edge length of the image to return
+    :param layout: name of the layout. the first paperspace layout in default.
+    :param scene: modelspace compiled by `ModelScene.compile`, to share it between layouts.
+        compiled with `filters` in default.
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    drawing = load_drawing(drawing)
+    if layout is None:
+        names = [name for name in drawing.layout_names() if name.lower() != 'model']
+        if not names:
+            raise ValueError('the drawing has no paperspace layout')
+
+        layout = names[0]
+
+    paperspace = drawing.layout(layout)
+    if scene is None:
+        scene = ModelScene.compile(drawing, **filters)
+
+    # ビューポートは絞り込みの対象外です
+    is_drawn = make_entity_filter(drawing, **filters)
+    items: List[Union['Viewport', int]] = []
+    entities = []
+    for entity in iter_entities(drawing, paperspace):
+        if entity.dxftype() == 'VIEWPORT':
+            if _is_visible(entity):
+                items.append(entity)
+        elif is_drawn(entity):
+            items.append(len(entities))
+            entities.append(entity)
+
+    entity_reps = build_entity_ops(entities, drawing)
+    paper_space = _paper_extents(paperspace, entity_reps, [item for item in items if not isinstance(item, int)])
+    canvas = np.zeros(get_image_shape(paper_space, image_size), dtype=np.float64)
+    widths = (stroke or StrokePolicy()).widths(canvas.shape)
+
+    ops: List[OpenCVOp] = []
+    for item in items:
+        if isinstance(item, int):
+            if entity_reps[item] is not None:
+                ops.append(entity_reps[item][0])
+            continue
+
+        for op in merge_ops(ops, widths):
+            op(canvas, paper_space, stroke=widths)
+
+        ops = []
+        _draw_viewport(canvas, item, paper_space, scene, widths)
+
+    for op in merge_ops(ops, widths):
+        op(canvas, paper_space, stroke=widths)
+
+    return canvas
+
+
+def _is_visible(viewport: 'Viewport') -> bool:
+    # id 1 はペーパー空間自体のビューポートです. statusが0以下のものは表示されていません
+    return viewport.get_dxf_attrib('id', 0) != 1 and viewport.get_dxf_attrib('status', 1) > 0
+
+
+def _viewport_rect(viewport: 'Viewport') -> BoundingBox:
+    """rectangle of a viewport on the paper"""
+
+    cx, cy = viewport.dxf.center[:2]
+    w = viewport.dxf.width / 2
+    h = viewport.dxf.height / 2
+    return (cx - w, cy - h), (cx + w, cy + h)
+
+
+def _paper_extents(paperspace: 'Layout', entity_reps, viewports: List['Viewport']) -> BoundingBox:
+    """paper limits of the layout, or the extents of its entities and viewports"""
+
+    limmin, limmax = paperspace.get_paper_limits()
+    if limmax[0] > limmin[0] and limmax[1] > limmin[1]:
+        return tuple(limmin[:2]), tuple(limmax[:2])
+
+    rects = [(None, _viewport_rect(viewport)) for viewport in viewports]
+    return get_extents(list(entity_reps) + rects)
+
+
+def _draw_viewport(canvas: np.ndarray, viewport: 'Viewport', paper_space: BoundingBox, scene: ModelScene,
+                   widths: StrokeWidths) -> None:
+    """draw the modelspace seen through `viewport` into its rectangle of `canvas`"""
+
+    if viewport.get_dxf_attrib('view_twist_angle', 0):
+        warnings.warn('twisted VIEWPORT is drawn without the twist')
+
+    (pxmin, pymin), (pxmax, pymax) = paper_space
+    height, width = canvas.shape[:2]
+    sx = width / (pxmax - pxmin)
+    sy = height / (pymax - pymin)
+
+    # ビューポートの矩形を画素に揃えて切り出します
+    (vx0, vy0), (vx1, vy1) = _viewport_rect(viewport)
+    left = min(max(math.floor((vx0 - pxmin) * sx), 0), width)
+    right = min(max(math.floor((vx1 - pxmin) * sx), 0), width)
+    top = min(max(height - math.floor((vy1 - pymin) * sy), 0), height)
+    bottom = min(max(height - math.floor((vy0 - pymin) * sy), 0), height)
+    if right <= left or bottom <= top or viewport.dxf.height <= 0:
+        return
+
+    # 切り出した画素の範囲に対応するモデル空間の範囲
+    k = viewport.get_dxf_attrib('view_height', viewport.dxf.height) / viewport.dxf.height
+    mcx, mcy = viewport.get_dxf_attrib('view_center_point', (0, 0))[:2]
+    cx, cy = viewport.dxf.center[:2]
+
+    def model_x(col: int) -> float:
+        return mcx + (pxmin + col / sx - cx) * k
+
+    def model_y(row: int) -> float:
+        return mcy + (pymin + (height - row) / sy - cy) * k
+
+    view = (model_x(left), model_y(bottom)), (model_x(right), model_y(top))
+    img = canvas[top:bottom, left:right]
+    for op in merge_ops(scene.select(view), widths):
+        op(img, view, canvas.shape, stroke=widths)
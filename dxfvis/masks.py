@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""render layers, or groups of layers, into separate masks in one pass"""
+
+import itertools
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from dxfvis.render import _lower_patterns
+from dxfvis.render import _match_any
+from dxfvis.render import collect_entity_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import load_drawing
+from dxfvis.stroke import StrokePolicy
+from dxfvis.types import merge_ops
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+
+
+def render_layer_masks(
+        drawing: Union[str, 'Drawing'],
+        image_size: int,
+        groups: Optional[Dict[str, Sequence[str]]] = None,
+        labels: bool = False,
+        dtype: type = np.uint8,
+        stroke: Optional[StrokePolicy] = None,
+        **filters: Any) -> Tuple[np.ndarray, List[str]]:
+    """render each layer, or each group of layers, into its own mask
+
+    the drawing is parsed and its ops are built once, and every op is drawn once into the mask of
+    its group, so K masks cost about as much as one `render_dxf`. all masks share the coordinates
+    of `render_dxf` with the same filters.
+
+    :param drawing: path or object for a DXF file
+    :param image_size: maximum edge length of the masks
+    :param groups: group name -> layer names or glob patterns (case is ignored). a layer matching
+        no group is not drawn. one group per layer in default, ordered as the layer table.
+    :param labels: return an integer label map instead of a stack. pixels hold 1 + the index of the
+        group drawn last on them, 0 for the background. a layer in several groups is labeled with the first.
+    :param dtype: dtype of the stack, np.uint8 (0 or 255) or bool
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+
+    :returns (H, W, K) stack of masks (a view of (K, H, W) planes) or (H, W) label map,
+        names of the K groups
+    """
+
+    drawing = load_drawing(drawing)
+    entities, entity_reps = collect_entity_ops(drawing, **filters)
+    dxf_space = get_extents(entity_reps)
+    height, width = get_image_shape(dxf_space, image_size)[:2]
+    widths = (stroke or StrokePolicy()).widths((height, width))
+
+    layers = [entity.dxf.layer.lower() for entity in entities]
+    names, layer_groups = _assign_groups(drawing, layers, groups)
+
+    if labels:
+        canvas = np.zeros((height, width), dtype=np.uint8 if len(names) < 255 else np.uint16)
+        for group, ops in _runs(entity_reps, layers, layer_groups, widths, first_only=True):
+            for op in ops:
+                op(canvas, dxf_space, color=(group + 1,), stroke=widths)
+
+        return canvas, names
+
+    value = 1 if dtype is bool else 255
+    planes = np.zeros((len(names), height, width), dtype=np.uint8)
+    for group, ops in _runs(entity_reps, layers, layer_groups, widths, first_only=False):
+        for op in ops:
+            op(planes[group], dxf_space, color=(value,), stroke=widths)
+
+    if dtype is bool:
+        planes = planes.view(bool)
+
+    return np.moveaxis(planes, 0, -1), names
+
+
+def _assign_groups(
+        drawing: 'Drawing',
+        layers: Sequence[str],
+        groups: Optional[Dict[str, Sequence[str]]]) -> Tuple[List[str], Dict[str, List[int]]]:
+    """names of the groups, lower-cased layer name -> indices of the groups it belongs to"""
+
+    if groups is None:
+        used = set(layers)
+        names = []
+        for layer in drawing.layers:
+            if layer.dxf.name.lower() in used:
+                names.append(layer.dxf.name)
+                used.discard(layer.dxf.name.lower())
+
+        # 画層テーブルにない画層は現れた順に並べます
+        for layer in layers:
+            if layer in used:
+                names.append(layer)
+                used.discard(layer)
+
+        return names, {name.lower(): [i] for i, name in enumerate(names)}
+
+    names = list(groups)
+    patterns = [_lower_patterns(groups[name]) for name in names]
+    layer_groups = {}
+    for layer in set(layers):
+        layer_groups[layer] = [i for i, p in enumerate(patterns) if _match_any(layer, p)]
+
+    return names, layer_groups
+
+
+def _runs(entity_reps, layers, layer_groups, widths, first_only):
+    """yield (group, merged ops) for runs of consecutive entities drawn into the same group"""
+
+    def iter_targets():
+        for entity_rep, layer in zip(entity_reps, layers):
+            if entity_rep is None:
+                continue
+
+            targets = layer_groups.get(layer, [])
+            for group in targets[:1] if first_only else targets:
+                yield group, entity_rep[0]
+
+    for group, items in itertools.groupby(iter_targets(), key=lambda item: item[0]):
+        yield group, merge_ops([op for _, op in items], widths)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""object coordinate systems (OCS) of planar entities
+
+ARC, CIRCLE and LWPOLYLINE are given in the plane of their extrusion vector, with axes chosen by
+the arbitrary axis algorithm of DXF. mirroring in CAD leaves an extrusion of (0, 0, -1), whose X
+axis points to -X. the batch functions group their entities by extrusion, and each group is mapped
+onto WCS XY by one (2, 3) matrix, applied to all the points of the group in one multiply.
+
+for extrusions along Z the matrix keeps circles circles, so arcs stay arcs with mapped angles.
+for tilted ones the vertices are mapped when the curve is flattened (`flatten_in_ocs`).
+"""
+
+import math
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from dxfvis.types import BoundingBox
+
+
+# extrusion of the entities given in WCS
+WCS_Z = (0., 0., 1.)
+# X axis of the OCS is taken from WCS Y when the extrusion is this close to Z
+_ARBITRARY_AXIS_LIMIT = 1 / 64
+
+Extrusion = Tuple[float, float, float]
+
+
+def get_extrusion(entity) -> Extrusion:
+    extrusion = entity.get_dxf_attrib('extrusion', WCS_Z)
+    return float(extrusion[0]), float(extrusion[1]), float(extrusion[2])
+
+
+def group_by_extrusion(entities: Sequence) -> Dict[Extrusion, List[int]]:
+    """indices of `entities` by their extrusion, in order"""
+
+    groups: Dict[Extrusion, List[int]] = {}
+    for i, entity in enumerate(entities):
+        groups.setdefault(get_extrusion(entity), []).append(i)
+
+    return groups
+
+
+def ocs_matrix(extrusion: Sequence[float]) -> Optional[np.ndarray]:
+    """(2, 3) matrix mapping OCS (x, y, z) to WCS (x, y), or None if the OCS is the WCS"""
+
+    n = np.asarray(extrusion, dtype=np.float64)
+    length = float(np.linalg.norm(n))
+    if length == 0 or (n[0] == 0 and n[1] == 0 and n[2] > 0):
+        return None
+
+    n = n / length
+    if abs(n[0]) < _ARBITRARY_AXIS_LIMIT and abs(n[1]) < _ARBITRARY_AXIS_LIMIT:
+        ax = np.cross((0., 1., 0.), n)
+    else:
+        ax = np.cross((0., 0., 1.), n)
+
+    ax /= np.linalg.norm(ax)
+    ay = np.cross(n, ax)
+    return np.stack([ax, ay, n], axis=1)[:2]
+
+
+def is_conformal(matrix: np.ndarray) -> bool:
+    """whether `matrix` maps circles to circles of the same radius, i.e. its extrusion is along Z"""
+
+    linear = matrix[:, :2]
+    return bool(np.allclose(linear @ linear.T, np.eye(2)))
+
+
+def to_wcs(points: np.ndarray, matrix: np.ndarray, elevation: Union[float, np.ndarray] = 0.) -> np.ndarray:
+    """map (N, 2) OCS points at `elevation` (a scalar or (N,) array) to (N, 2) WCS points"""
+
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return pts @ matrix[:, :2].T + np.asarray(elevation, dtype=np.float64)[..., None] * matrix[:, 2]
+
+
+def vertices_to_wcs(vertex_lists: Sequence[Sequence[Sequence[float]]], matrix: np.ndarray,
+                    elevations: Sequence[float]) -> List[np.ndarray]:
+    """map the OCS vertices of several entities of one extrusion at once"""
+
+    lengths = [len(vertices) for vertices in vertex_lists]
+    if sum(lengths) == 0:
+        return [np.zeros((0, 2)) for _ in vertex_lists]
+
+    pts = np.concatenate([np.asarray(vertices, dtype=np.float64).reshape(-1, 2) for vertices in vertex_lists])
+    mapped = to_wcs(pts, matrix, np.repeat(np.asarray(elevations, dtype=np.float64), lengths))
+    bounds = np.cumsum([0] + lengths).tolist()
+    return [mapped[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def map_angles(matrix: np.ndarray, start_angle: float, sweep: float) -> Tuple[float, float]:
+    """start angle and sweep (radian, counterclockwise) in WCS of an arc in the OCS of a conformal `matrix`"""
+
+    linear = matrix[:, :2]
+    rotation = math.atan2(linear[1, 0], linear[0, 0])
+    if np.linalg.det(linear) > 0:
+        return start_angle + rotation, sweep
+
+    # 鏡映では向きが逆になるので、終点から反時計回りに描きます
+    return rotation - start_angle - sweep, sweep
+
+
+def map_bbox(bbox: BoundingBox, matrix: np.ndarray, elevation: float = 0.) -> BoundingBox:
+    """bounding box in WCS covering an OCS bounding box"""
+
+    (xmin, ymin), (xmax, ymax) = bbox
+    corners = to_wcs(np.array([(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]), matrix, elevation)
+    (x0, y0), (x1, y1) = corners.min(axis=0), corners.max(axis=0)
+    return (float(x0), float(y0)), (float(x1), float(y1))
+
+
+def flatten_in_ocs(matrix: np.ndarray, elevation: float, flatten: Callable[..., np.ndarray], *args,
+                   tolerance: Optional[float] = None) -> np.ndarray:
+    """flatten a curve in its OCS and map the vertices to WCS. for `Curve`
+
+    the mapping never lengthens a chord error, so the tolerance holds in WCS as well
+    """
+    return to_wcs(flatten(*args, tolerance=tolerance), matrix, elevation)
+
+
+def xyz(point: Sequence[float]) -> Tuple[float, float, float]:
+    """a 2D or 3D point as (x, y, z)"""
+    return float(point[0]), float(point[1]), float(point[2]) if len(point) > 2 else 0.
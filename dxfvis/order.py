@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""draw order of the entities, and batches of ops which keep it
+
+entities are drawn in the order of their layout, or by the sort handles of its SORTENTSTABLE
+(draw order set in CAD) when it has one. `sort_entities` finds this order once, before any op is built.
+
+batching ops of one style into a draw call moves them past the ops in between. two ops may swap
+only if they cannot paint the same pixel, or if they paint it in the same color; fills of one
+`cv2.fillPoly` call must not overlap at all, since overlaps are left as holes. `batch_ops` gives
+each op a level above every earlier op it may not swap with, found on a coarse grid of the canvas,
+and puts it into the highest batch of its style which is still above those. drawing the batches
+level by level gives the same image as drawing the ops in their order.
+"""
+
+import math
+
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from dxfvis.stroke import StrokeWidths
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import Size
+from dxfvis.types import VariableStatus as S
+
+if TYPE_CHECKING:
+    from ezdxf.legacy.graphics import GraphicEntity
+
+
+# cells of the grid along the longer edge of the canvas
+GRID_SIZE = 64
+# pixels added around the bounding boxes for rounding and antialiasing
+PAD_PIXELS = 2
+
+# sort handle '0' is drawn last in CAD
+_LAST = 1 << 64
+
+
+def sort_entities(layout: Iterable['GraphicEntity']) -> Iterable['GraphicEntity']:
+    """entities of `layout` in draw order. the order of the file when it has no SORTENTSTABLE
+
+    entities not in the table are sorted by their own handles, as in CAD. the sort is stable.
+    """
+
+    get_redraw_order = getattr(layout, 'get_redraw_order', None)
+    if get_redraw_order is None:
+        return layout
+
+    try:
+        sort_handles = {handle: _handle_key(sort_handle) for handle, sort_handle in get_redraw_order()}
+    except Exception:  # 壊れた表は無視します
+        return layout
+    if not sort_handles:
+        return layout
+
+    entities = list(layout)
+    try:
+        keys = [sort_handles.get(entity.dxf.handle) or _handle_key(entity.dxf.handle) for entity in entities]
+    except (TypeError, ValueError):
+        return entities
+
+    return [entities[i] for i in sorted(range(len(entities)), key=keys.__getitem__)]
+
+
+def _handle_key(handle: str) -> int:
+    key = int(handle, 16)
+    return _LAST if key == 0 else key
+
+
+def batch_ops(
+        ops: Sequence[Optional[OpenCVOp]],
+        bboxes: Sequence[Optional[BoundingBox]],
+        dxf_space: BoundingBox,
+        canvas_shape: Size,
+        widths: StrokeWidths) -> List[OpenCVOp]:
+    """reorder ops so that the ops of one style are consecutive, without changing the image
+
+    fills of one color which do not overlap are merged into one op. the other batches are left to
+    `stitch_lines` and `merge_ops`, which merge consecutive ops.
+
+    :param ops: drawing operations in draw order. None is skipped.
+    :param bboxes: bounding box of each op in DXF coordinates. None overlaps everything.
+    :param dxf_space: extents of the canvas in DXF coordinates
+    :param canvas_shape: shape of the canvas
+    :param widths: line widths the ops are drawn with
+    """
+
+    pairs = [(op, bbox) for op, bbox in zip(ops, bboxes) if op is not None]
+    if len(pairs) < 2:
+        return [op for op, _ in pairs]
+
+    import cv2
+    from dxfvis.draw_funcs import hatch
+    from dxfvis.draw_funcs import line
+    from dxfvis.draw_funcs import polyline
+
+    # `color` をそのまま塗る関数です. 色を薄めて塗るトーンのハッチは含めません
+    flat_funcs = (cv2.line, cv2.polylines, cv2.fillPoly, cv2.circle, hatch.fill_loops, hatch.pattern_hatch,
+                  line.pattern_line, line.textured_line, polyline.pattern_polyline, polyline.textured_polyline,
+                  polyline._draw_pl_op)
+    ops = [op for op, _ in pairs]
+    color_ids: Dict[Hashable, int] = {}
+    colors = [_color_id(op, color_ids, flat_funcs) for op in ops]
+    fills = [_is_fill(op, (cv2.fillPoly, hatch.fill_loops)) for op in ops]
+    styles: Dict[Hashable, Hashable] = {}
+    keys = [_batch_key(op, widths, is_fill, styles) for op, is_fill in zip(ops, fills)]
+
+    if len(color_ids) == 1 and min(colors) >= 0 and not any(fills):
+        # 一色だけなら順序は画像に影響しません
+        levels = [0] * len(ops)
+    else:
+        rects, n_cells = _cell_rects([bbox for _, bbox in pairs], ops, dxf_space, canvas_shape, widths)
+        levels = _assign_levels(rects, n_cells, colors, fills, keys)
+
+    return _gather(ops, levels, keys, fills)
+
+
+def _color_id(op: OpenCVOp, color_ids: Dict[Hashable, int], flat_funcs: Tuple[Callable, ...]) -> int:
+    """same number for the ops of one color. ops of unknown colors get negative numbers of their own
+
+    :param flat_funcs: functions which paint their `color` keyword as it is. the colors of the others
+        are unknown, e.g. pattern hatches filled with a tone of their color.
+    """
+
+    color = op.kwargs.get('color')
+    tone = op.kwargs.get('tone', (False, S.NO_MAPPING))
+    if color is not None and color[1] is S.NO_MAPPING and op.func in flat_funcs and tone[0] is False:
+        try:
+            return color_ids.setdefault(tuple(color[0]), len(color_ids))
+        except TypeError:
+            pass
+
+    return -1 - id(op)
+
+
+def _is_fill(op: OpenCVOp, fill_funcs: Tuple[Callable, ...]) -> bool:
+    """whether `op` fills a list of polygons in one call, where overlaps are left as holes"""
+
+    return (op.func in fill_funcs and len(op.args) == 1
+            and op.args[0][1] in (S.ARRAY_MAPPING, S.CURVE_MAPPING) and isinstance(op.args[0][0], list)
+            and op.kwargs.keys() == {'color'})
+
+
+def _batch_key(op: OpenCVOp, widths: StrokeWidths, is_fill: bool,
+               styles: Dict[Hashable, Hashable]) -> Optional[Hashable]:
+    """key shared by the ops which can be drawn by one call, or None
+
+    :param styles: cache of the keys by the kwargs as they are, to resolve the lineweights once per style
+    """
+
+    from dxfvis.stitch import _is_plain_line
+
+    if is_fill:
+        kind = ('fill', op.func, op.args[0][1])
+    elif op.merge_arg is not None:
+        kind = (op.func, op.merge_arg, len(op.args),
+                tuple(arg for i, arg in enumerate(op.args) if i != op.merge_arg))
+    elif _is_plain_line(op):
+        kind = ('line',)
+    else:
+        return None
+
+    try:
+        raw = kind + tuple(op.kwargs.items())
+        key = styles.get(raw)
+    except TypeError:
+        raw = None
+        key = None
+
+    if key is None:
+        try:
+            key = kind + tuple(sorted((name, status, _resolve(val, status, widths))
+                                      for name, (val, status) in op.kwargs.items()))
+            hash(key)
+        except TypeError:
+            return None
+
+        if raw is not None:
+            styles[raw] = key
+
+    return key
+
+
+def _resolve(val, status: S, widths: StrokeWidths):
+    if status is S.LINEWEIGHT_MAPPING:
+        return widths.thickness(val)
+    if status is S.DOT_MAPPING:
+        return widths.dot_radius(val)
+
+    return tuple(val) if isinstance(val, list) else val
+
+
+def _pad_pixels(op: OpenCVOp, widths: StrokeWidths) -> float:
+    """pixels an op may paint outside of its bounding box"""
+
+    pad = 0.
+    for val, status in list(op.args) + list(op.kwargs.values()):
+        if status is S.LINEWEIGHT_MAPPING:
+            pad = max(pad, widths.thickness(val) / 2)
+        elif status is S.DOT_MAPPING:
+            pad = max(pad, widths.dot_radius(val))
+
+    thickness = op.kwargs.get('thickness')
+    if thickness is not None and thickness[1] is S.NO_MAPPING and isinstance(thickness[0], (int, float)):
+        pad = max(pad, thickness[0] / 2)
+
+    return pad + PAD_PIXELS
+
+
+def _cell_rects(
+        bboxes: Sequence[Optional[BoundingBox]],
+        ops: Sequence[OpenCVOp],
+        dxf_space: BoundingBox,
+        canvas_shape: Size,
+        widths: StrokeWidths) -> Tuple[List[Tuple[int, int, int, int, int]], int]:
+    """(x0, y0, x1, y1, cells in a row) of the grid cells covered by each op, inclusive, and the number of cells"""
+
+    (xmin, ymin), (xmax, ymax) = dxf_space
+    height, width = canvas_shape[:2]
+    cell = max(max(height, width) / GRID_SIZE, 1.)
+    nx, ny = int(math.ceil(width / cell)), int(math.ceil(height / cell))
+
+    is_known = np.array([bbox is not None for bbox in bboxes])
+    b = np.array([(bbox[0][0], bbox[0][1], bbox[1][0], bbox[1][1]) if bbox is not None else (0., 0., 0., 0.)
+                  for bbox in bboxes], dtype=np.float64).reshape(-1, 4)
+    pads = np.array([_pad_pixels(op, widths) for op in ops], dtype=np.float64)[:, None]
+
+    # 画素単位にしてからセルに落とします. 画像の外はいちばん外側のセルにまとめます
+    scale = np.array([width / (xmax - xmin), height / (ymax - ymin)] * 2)
+    px = (b - [xmin, ymin, xmin, ymin]) * scale + pads * [-1, -1, 1, 1]
+    with np.errstate(invalid='ignore'):
+        cells = np.floor(np.nan_to_num(px / cell, nan=0., posinf=1e9, neginf=-1e9))
+    cells = np.clip(cells, 0, [nx - 1, ny - 1, nx - 1, ny - 1]).astype(np.int64)
+    cells[~is_known] = [0, 0, nx - 1, ny - 1]
+    return [(x0, y0, x1, y1, nx) for x0, y0, x1, y1 in cells.tolist()], nx * ny
+
+
+def _assign_levels(
+        rects: List[Tuple[int, int, int, int, int]],
+        n_cells: int,
+        colors: List[int],
+        fills: List[bool],
+        keys: List[Optional[Hashable]]) -> List[int]:
+    """level of each op, the level of its batch
+
+    each cell keeps the highest level drawn in it with its color, the highest level of the other
+    colors, and the highest level of the fills. an op goes above the levels it may not swap with.
+    """
+
+    top_level = [-1] * n_cells
+    top_color = [None] * n_cells
+    other_level = [-1] * n_cells
+    fill_level = [-1] * n_cells
+
+    levels: List[int] = []
+    last_level: Dict[Hashable, int] = {}
+    for (x0, y0, x1, y1, nx), color, is_fill, key in zip(rects, colors, fills, keys):
+        cells = [c for y in range(y0 * nx, y1 * nx + 1, nx) for c in range(y + x0, y + x1 + 1)]
+
+        conflict = -1
+        for c in cells:
+            level = other_level[c] if top_color[c] == color else top_level[c]
+            if level > conflict:
+                conflict = level
+            if is_fill and fill_level[c] > conflict:
+                conflict = fill_level[c]
+
+        # 同じスタイルの最後のまとまりが衝突より上にあれば、そこに加えます
+        level = last_level.get(key, -1) if key is not None else -1
+        if level <= conflict:
+            level = conflict + 1
+            if key is not None:
+                last_level[key] = level
+
+        levels.append(level)
+        for c in cells:
+            if top_color[c] == color:
+                if level > top_level[c]:
+                    top_level[c] = level
+            elif level > top_level[c]:
+                other_level[c] = top_level[c]
+                top_level[c] = level
+                top_color[c] = color
+            elif level > other_level[c]:
+                other_level[c] = level
+            if is_fill and level > fill_level[c]:
+                fill_level[c] = level
+
+    return levels
+
+
+def _gather(
+        ops: List[OpenCVOp],
+        levels: List[int],
+        keys: List[Optional[Hashable]],
+        fills: List[bool]) -> List[OpenCVOp]:
+    """ops by level, and by batch in each level. the fills of a batch are merged into one op"""
+
+    batches: Dict[Hashable, List[int]] = {}
+    for i, (level, key) in enumerate(zip(levels, keys)):
+        batches.setdefault((level, key) if key is not None else (level, None, i), []).append(i)
+
+    # 同じ段のまとまりは入れ替えられるので、最初のopの順に並べます
+    ordered: List[OpenCVOp] = []
+    for (level, *_), indices in sorted(batches.items(), key=lambda item: (item[0][0], item[1][0])):
+        if fills[indices[0]] and len(indices) > 1:
+            first = ops[indices[0]]
+            polygons = [polygon for i in indices for polygon in ops[i].args[0][0]]
+            ordered.append(OpenCVOp(first.func, args=((polygons, first.args[0][1]),), kwargs=first.kwargs))
+        else:
+            ordered.extend(ops[i] for i in indices)
+
+    return ordered
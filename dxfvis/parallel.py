@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""parse the entities of one large DXF file in several processes
+
+`ezdxf.readfile` parses a file in one thread of pure python. here the ENTITIES section is split
+at the `0` group codes starting entities (see `dxfvis.scan`) into chunks of about the same size,
+and each worker parses one chunk, together with the other sections (header, tables, blocks and
+objects) so that layers, linetypes and blocks resolve as usual, and compiles it into a `Scene`.
+the scenes are joined in the order of the chunks, so the entities are drawn in the order of the file.
+
+every worker parses the other sections again, so this pays off when the entities are most of the file.
+"""
+
+import concurrent.futures
+import io
+import mmap
+import multiprocessing
+import os
+
+from typing import Any
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from dxfvis import scan
+from dxfvis.render import collect_entity_ops
+from dxfvis.render import get_extents
+from dxfvis.scene import Scene
+from dxfvis.scene import compile_ops
+from dxfvis.scene import compile_scene
+from dxfvis.scene import concat_scenes
+from dxfvis.types import BoundingBox
+
+
+# entities of a chunk are at least this many bytes. smaller files are parsed in fewer chunks
+MIN_CHUNK_BYTES = 4 << 20
+
+ByteRange = Tuple[int, int]
+
+
+def compile_scene_parallel(
+        path: str,
+        image_size: int,
+        workers: Optional[int] = None,
+        n_chunks: Optional[int] = None,
+        mp_context: Optional[Any] = None,
+        **filters: Any) -> Scene:
+    """parse and compile a DXF file in a process pool. the same scene as `compile_scene`
+
+    curves are flattened for the extents of each chunk, which are within those of the drawing, so
+    they may have a few more vertices. files whose entities are reordered by a SORTENTSTABLE, and
+    files too small to split, are compiled in this process.
+
+        scene = compile_scene_parallel(path, 4096, workers=32)
+        img = rasterize_scene(scene, 4096)
+
+    :param path: path for an ASCII DXF file
+    :param image_size: maximum edge length of the images the scene is drawn at
+    :param workers: number of processes. `os.cpu_count()` in default.
+    :param n_chunks: number of chunks the entities are split into. one per worker in default.
+    :param mp_context: multiprocessing context of the pool. spawn in default.
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`.
+        they are sent to the workers, so a predicate must be picklable.
+    """
+
+    workers = workers or os.cpu_count() or 1
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        sections = scan.find_sections(mm)
+        if 'ENTITIES' not in sections or 'HEADER' not in sections:
+            return compile_scene(path, image_size, **filters)
+
+        start, stop = sections['ENTITIES']
+        max_chunks = max((stop - start) // MIN_CHUNK_BYTES, 1)
+        n_chunks = min(n_chunks or workers, max_chunks)
+        objects = sections.get('OBJECTS')
+        if objects is not None and scan.find_marker(mm, b'SORTENTSTABLE', *objects) >= 0:
+            # 描画順の表は全体で並べ替えるので、分けられません
+            n_chunks = 1
+        if n_chunks < 2:
+            return compile_scene(path, image_size, **filters)
+
+        header = scan.read_header(mm[slice(*sections['HEADER'])])
+        chunks = scan.split_entities(mm, start, stop, n_chunks)
+
+    head = (0, start)
+    tail = (stop, os.path.getsize(path))
+    encoding = scan.file_encoding(header)
+    version = header.get('$ACADVER')
+    if mp_context is None:
+        mp_context = multiprocessing.get_context('spawn')
+
+    with concurrent.futures.ProcessPoolExecutor(min(workers, len(chunks)), mp_context=mp_context) as pool:
+        futures = [pool.submit(compile_chunk, path, [head, chunk, tail], encoding, version, image_size, filters)
+                   for chunk in chunks]
+        results = [future.result() for future in futures]
+
+    bboxes = [(None, bbox) for _, bbox in results if bbox is not None]
+    return concat_scenes([scene for scene, _ in results], get_extents(bboxes))
+
+
+def compile_chunk(
+        path: str,
+        ranges: List[ByteRange],
+        encoding: str,
+        version: Optional[str],
+        image_size: int,
+        filters: dict) -> Tuple[Scene, Optional[BoundingBox]]:
+    """parse the byte ranges of a file joined together as a drawing, and compile it. run in the workers
+
+    :returns scene, bounding box of the entities drawn or None if there are none
+    """
+
+    import ezdxf
+
+    with open(path, 'rb') as f:
+        parts = []
+        for start, stop in ranges:
+            f.seek(start)
+            parts.append(f.read(stop - start))
+
+    text = b''.join(parts).decode(encoding, errors='ignore')
+    drawing = ezdxf.read(io.StringIO(text), legacy_mode=False, dxfversion=version)
+    _, entity_reps = collect_entity_ops(drawing, **filters)
+    entity_reps = [entity_rep for entity_rep in entity_reps if entity_rep is not None]
+    scene = compile_ops([op for op, _ in entity_reps], get_extents(entity_reps), image_size)
+    if not entity_reps:
+        return scene, None
+
+    # 範囲の補正は全体の範囲で行うので、補正前の範囲を返します
+    xmin = min(bbox[0][0] for _, bbox in entity_reps)
+    ymin = min(bbox[0][1] for _, bbox in entity_reps)
+    xmax = max(bbox[1][0] for _, bbox in entity_reps)
+    ymax = max(bbox[1][1] for _, bbox in entity_reps)
+    return scene, ((xmin, ymin), (xmax, ymax))
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""render large drawings progressively, for interactive previews
+
+the canvas is shown early and refined while the ops are built:
+
+1. preview: the bounding boxes of the entities read so far, in one flat color
+2. refine: the entities with their full shapes, the largest bounding boxes first
+3. final: everything again in drawing order
+
+every pass is limited to about `pass_time` seconds, so the first pixels come within that time after
+the drawing is loaded. the passes are drawn into the same canvas over the given extents, or those of
+the header when no filter is given. otherwise the extents grow with the bounding boxes read and the
+preview is drawn again on a new canvas when they do; the final pass then takes the extents of the
+shapes built, and is the same image as `render_dxf`.
+"""
+
+import math
+import time
+
+from typing import Any
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Union
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from dxfvis import ocs
+from dxfvis.render import build_entity_ops
+from dxfvis.render import draw_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import header_extents
+from dxfvis.render import iter_entities
+from dxfvis.render import load_drawing
+from dxfvis.render import make_entity_filter
+from dxfvis.render import union_bboxes
+from dxfvis.stroke import StrokePolicy
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import merge_ops
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+    from ezdxf.legacy.graphics import GraphicEntity
+
+
+# color of the bounding boxes of the preview
+PREVIEW_COLOR = (128, 128, 128)
+# number of entities built at once while refining
+CHUNK_SIZE = 256
+
+
+class ProgressivePass(NamedTuple):
+    """a pass of `render_progressive`"""
+
+    image: np.ndarray  # the canvas. the same array in every pass, unless the extents change
+    stage: str  # 'preview', 'refine' or 'final'
+    drawn: int  # number of entities drawn with their full shapes
+    total: Optional[int]  # number of entities, None while they are still being read
+
+
+def render_progressive(
+        drawing: Union[str, 'Drawing'],
+        image_size: int,
+        pass_time: float = 0.05,
+        extents: Optional[BoundingBox] = None,
+        stroke: Optional[StrokePolicy] = None,
+        **filters: Any) -> Iterator[ProgressivePass]:
+    """render a dxf file in passes from a coarse preview to the complete image
+
+        for p in render_progressive(drawing, 1024):
+            show(p.image)
+
+    :param drawing: path or object for a DXF file
+    :param image_size: maximum edge length of the image
+    :param pass_time: seconds spent on each pass before it is yielded
+    :param extents: extents of the image in DXF coordinates. $EXTMIN / $EXTMAX of the header in default,
+        when no filter is given. otherwise the extents grow as the entities are read, and are those of
+        `render_dxf` at the end.
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    drawing = load_drawing(drawing)
+    is_drawn = make_entity_filter(drawing, **filters)
+    pending = (entity for entity in iter_entities(drawing) if is_drawn(entity))
+    entities: List['GraphicEntity'] = []
+    boxes: List[Optional[BoundingBox]] = []
+
+    fixed_space = extents
+    if fixed_space is None and all(value is None for value in filters.values()):
+        # ヘッダの範囲は絞り込む前の図面全体の範囲なので、絞り込む時は使いません
+        fixed_space = header_extents(drawing)
+    dxf_space = fixed_space
+    read_space: Optional[BoundingBox] = None
+    canvas = None
+
+    # 1. 読んだ範囲の外接矩形を描きます. 範囲が分からなければ、読みながら広げます
+    shown = 0
+    is_read = False
+    while not is_read:
+        deadline = time.perf_counter() + pass_time
+        is_read = True
+        for entity in pending:
+            entities.append(entity)
+            boxes.append(quick_bbox(entity))
+            if time.perf_counter() > deadline:
+                is_read = False
+                break
+
+        if fixed_space is None:
+            read_space = union_bboxes([read_space] + boxes[shown:])
+            space = get_extents([(None, read_space)] if read_space is not None else [])
+            if space != dxf_space:
+                # 広がった範囲に描き直します
+                dxf_space = space
+                canvas = None
+
+        if canvas is None:
+            canvas = np.zeros(get_image_shape(dxf_space, image_size), dtype=np.float64)
+            shown = 0
+
+        _draw_boxes(canvas, boxes[shown:], dxf_space)
+        shown = len(boxes)
+        yield ProgressivePass(canvas, 'preview', 0, len(entities) if is_read else None)
+
+    widths = (stroke or StrokePolicy()).widths(canvas.shape)
+
+    # 2. 外接矩形の大きいものから形を描きます
+    areas = np.array([-1. if box is None else (box[1][0] - box[0][0]) * (box[1][1] - box[0][1]) for box in boxes])
+    order = np.argsort(-areas, kind='stable')
+    entity_reps: List[Any] = [None] * len(entities)
+    canvas[...] = 0
+    start = 0
+    while start < len(order):
+        deadline = time.perf_counter() + pass_time
+        while start < len(order) and time.perf_counter() <= deadline:
+            chunk = order[start:start + CHUNK_SIZE]
+            reps = build_entity_ops([entities[i] for i in chunk], drawing)
+            for i, rep in zip(chunk, reps):
+                entity_reps[i] = rep
+
+            for op in merge_ops([rep[0] for rep in reps if rep is not None], widths):
+                op(canvas, dxf_space, stroke=widths)
+
+            start += len(chunk)
+
+        if start < len(order):
+            yield ProgressivePass(canvas, 'refine', start, len(entities))
+
+    # 3. 描画順に描き直します
+    reps = [rep for rep in entity_reps if rep is not None]
+    if fixed_space is None and get_extents(reps) != dxf_space:
+        # render_dxf と同じく、形の外接矩形を範囲にします. 円弧は円の外接矩形より小さくなります
+        dxf_space = get_extents(reps)
+        canvas = np.zeros(get_image_shape(dxf_space, image_size), dtype=np.float64)
+        widths = (stroke or StrokePolicy()).widths(canvas.shape)
+
+    final = np.zeros_like(canvas)
+    draw_ops(final, [rep[0] for rep in reps], dxf_space, widths, bboxes=[rep[1] for rep in reps])
+    canvas[...] = final
+    yield ProgressivePass(canvas, 'final', len(entities), len(entities))
+
+
+def quick_bbox(entity: 'GraphicEntity') -> Optional[BoundingBox]:
+    """bounding box of an entity read from its attributes, without building its op. None for the other dxftypes
+
+    arcs take the box of their whole circle, and bulges of polylines are not considered.
+    entities in an OCS are placed in WCS.
+    """
+
+    dxftype = entity.dxftype()
+    try:
+        if dxftype == 'LINE':
+            pts = [entity.dxf.start, entity.dxf.end]
+        elif dxftype in ('CIRCLE', 'ARC'):
+            x, y, z = ocs.xyz(entity.dxf.center)
+            matrix = ocs.ocs_matrix(ocs.get_extrusion(entity))
+            if matrix is not None:
+                (x, y), = ocs.to_wcs([(x, y)], matrix, z)
+
+            r = abs(entity.dxf.radius)
+            return (x - r, y - r), (x + r, y + r)
+        elif dxftype == 'ELLIPSE':
+            (x, y), r = entity.dxf.center[:2], math.hypot(*entity.dxf.major_axis[:2])
+            return (x - r, y - r), (x + r, y + r)
+        elif dxftype == 'LWPOLYLINE':
+            pts = list(entity.get_points('xy'))
+            matrix = ocs.ocs_matrix(ocs.get_extrusion(entity))
+            if matrix is not None and pts:
+                pts = ocs.to_wcs(pts, matrix, entity.get_dxf_attrib('elevation', 0.)).tolist()
+        elif dxftype == 'POLYLINE':
+            pts = [v.dxf.location for v in entity.vertices()]
+        elif dxftype == 'SPLINE':
+            pts = list(entity.get_control_points())
+        elif dxftype == 'POINT':
+            pts = [entity.dxf.location]
+        elif dxftype in ('TEXT', 'MTEXT'):
+            pts = [entity.dxf.insert]
+        else:
+            return None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+    if len(pts) == 0:
+        return None
+
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return (min(xs), min(ys)), (max(xs), max(ys))
+
+
+def _draw_boxes(canvas: np.ndarray, boxes: List[Optional[BoundingBox]], dxf_space: BoundingBox) -> None:
+    """draw the outlines of bounding boxes in one call"""
+
+    boxes = [box for box in boxes if box is not None]
+    if not boxes:
+        return
+
+    b = np.array([(box[0][0], box[0][1], box[1][0], box[1][1]) for box in boxes], dtype=np.float64)
+    corners = b[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 4, 2)
+    # 範囲から大きく外れた矩形は画素座標が溢れないように切り詰めます
+    (xmin, ymin), (xmax, ymax) = dxf_space
+    w, h = xmax - xmin, ymax - ymin
+    corners = np.clip(corners, (xmin - w, ymin - h), (xmax + w, ymax + h))
+    mapped = OpenCVOp._map_array(corners, (xmin, ymin), (xmax, ymax), canvas.shape)
+    cv2.polylines(canvas, list(mapped), True, PREVIEW_COLOR, 1)
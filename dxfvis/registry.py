@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""dxftype -> draw function dispatch
+
+a draw function builds the drawing operation of one entity::
+
+    draw_func(entity, drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]
+
+a batch function builds them for many entities of the same dxftype at once and
+returns one result per entity, in the same order::
+
+    batch_func(entities, drawing) -> List[Optional[Tuple[OpenCVOp, BoundingBox]]]
+
+functions may be registered by their import path ('module:function'), in which case the module
+is loaded on first use. importing the renderer therefore does not import opencv, ezdxf or any
+draw function module.
+"""
+
+import importlib
+
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+
+FuncRef = Union[str, Callable]
+
+_draw_funcs: Dict[str, FuncRef] = {
+    'ARC': 'dxfvis.draw_funcs.arc:draw_arc',
+    'CIRCLE': 'dxfvis.draw_funcs.circle:draw_circle',
+    'LINE': 'dxfvis.draw_funcs.line:draw_line',
+    'POLYLINE': 'dxfvis.draw_funcs.polyline:draw_polyline',
+    'LWPOLYLINE': 'dxfvis.draw_funcs.polyline:draw_lwpolyline',
+    'TEXT': 'dxfvis.draw_funcs.text:draw_text',
+    'POINT': 'dxfvis.draw_funcs.point:draw_point',
+    'MTEXT': 'dxfvis.draw_funcs.mtext:draw_mtext',
+    'ELLIPSE': 'dxfvis.draw_funcs.ellipse:draw_ellipse',
+    'SPLINE': 'dxfvis.draw_funcs.spline:draw_spline',
+    'HATCH': 'dxfvis.draw_funcs.hatch:draw_hatch',
+    'SOLID': 'dxfvis.draw_funcs.solid:draw_solid',
+    'TRACE': 'dxfvis.draw_funcs.solid:draw_solid',
+}
+_batch_funcs: Dict[str, FuncRef] = {
+    'ARC': 'dxfvis.draw_funcs.arc:draw_arcs',
+    'CIRCLE': 'dxfvis.draw_funcs.circle:draw_circles',
+    'LINE': 'dxfvis.draw_funcs.line:draw_lines',
+    'POLYLINE': 'dxfvis.draw_funcs.polyline:draw_polylines',
+    'LWPOLYLINE': 'dxfvis.draw_funcs.polyline:draw_lwpolylines',
+    'ELLIPSE': 'dxfvis.draw_funcs.ellipse:draw_ellipses',
+    'SPLINE': 'dxfvis.draw_funcs.spline:draw_splines',
+    'HATCH': 'dxfvis.draw_funcs.hatch:draw_hatches',
+}
+
+
+def register_draw_func(
+        dxftype: str,
+        draw_func: Optional[FuncRef] = None,
+        batch_func: Optional[FuncRef] = None) -> Callable:
+    """register functions drawing entities of `dxftype`. replaces the functions registered before.
+
+    can be used as a decorator of the draw function::
+
+        @register_draw_func('MLINE')
+        def draw_mline(entity, drawing):
+            ...
+
+    :param dxftype: dxftype such as 'HATCH'
+    :param draw_func: function (or its import path) building the op of one entity
+    :param batch_func: function (or its import path) building the ops of many entities.
+        draw_func is applied to each entity when omitted.
+    """
+
+    dxftype = dxftype.upper()
+    if draw_func is None and batch_func is None:
+        def decorator(func: Callable) -> Callable:
+            register_draw_func(dxftype, func)
+            return func
+
+        return decorator
+
+    if draw_func is not None:
+        _draw_funcs[dxftype] = draw_func
+    if batch_func is not None:
+        _batch_funcs[dxftype] = batch_func
+    elif draw_func is not None:
+        _batch_funcs.pop(dxftype, None)
+
+    return draw_func
+
+
+def unregister_draw_func(dxftype: str) -> None:
+    """stop drawing entities of `dxftype`"""
+
+    dxftype = dxftype.upper()
+    _draw_funcs.pop(dxftype, None)
+    _batch_funcs.pop(dxftype, None)
+
+
+def registered_dxftypes() -> List[str]:
+    """dxftypes which have a draw function"""
+    return sorted(set(_draw_funcs) | set(_batch_funcs))
+
+
+def get_draw_func(dxftype: str) -> Optional[Callable]:
+    """draw function for `dxftype`. None if the dxftype is not registered"""
+    return _resolve(_draw_funcs, dxftype)
+
+
+def get_batch_func(dxftype: str) -> Optional[Callable]:
+    """batch function for `dxftype`. falls back to applying the draw function to each entity"""
+
+    batch_func = _resolve(_batch_funcs, dxftype)
+    if batch_func is not None:
+        return batch_func
+
+    draw_func = get_draw_func(dxftype)
+    if draw_func is None:
+        return None
+
+    def batch_func(entities, drawing):
+        return [draw_func(entity, drawing) for entity in entities]
+
+    return batch_func
+
+
+def _resolve(funcs: Dict[str, FuncRef], dxftype: str) -> Optional[Callable]:
+    func = funcs.get(dxftype)
+    if func is None or callable(func):
+        return func
+
+    module_name, func_name = func.split(':')
+    func = getattr(importlib.import_module(module_name), func_name)
+    funcs[dxftype] = func
+    return func
@@ -1,135 +1,628 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import fnmatch
+import itertools
+import math
 import warnings
 
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Union
 from typing import Optional
+from typing import Sequence
 from typing import Tuple
-from typing import TypeVar
+from typing import TYPE_CHECKING
 
-import cv2
-import ezdxf
 import numpy as np
-from ezdxf.drawing import Drawing
-from ezdxf.legacy.graphics import GraphicEntity
-from ezdxf.legacy.tableentries import Layer
-
-from dxfvis.draw_funcs import draw_arc
-from dxfvis.draw_funcs import draw_circle
-from dxfvis.draw_funcs import draw_line
-from dxfvis.draw_funcs import draw_polyline
-from dxfvis.draw_funcs import draw_lwpolyline
-from dxfvis.draw_funcs import draw_text
-from dxfvis.draw_funcs import draw_point
-from dxfvis.draw_funcs import draw_insert
-from dxfvis.draw_funcs import draw_mtext
-from dxfvis.draw_funcs import draw_ellipse
 
+from dxfvis import registry
+from dxfvis.order import sort_entities
+from dxfvis.scan import valid_extents
+from dxfvis.stroke import StrokePolicy
+from dxfvis.stroke import StrokeWidths
 from dxfvis.types import OpenCVOp
-from dxfvis.types import DXFPoint
-from dxfvis.types import NPPoint
+from dxfvis.types import PickBuffer
+from dxfvis.types import RenderReport
+from dxfvis.types import VariableStatus
+from dxfvis.types import merge_ops
 from dxfvis.types import Size
-from dxfvis.types import Scalar
 from dxfvis.types import BoundingBox
 
+if TYPE_CHECKING:  # ezdxf is imported on first use
+    from dxfvis.budget import BudgetMeter
+    from dxfvis.budget import RenderBudget
+    from ezdxf.drawing import Drawing
+    from ezdxf.legacy.graphics import GraphicEntity
+    from ezdxf.legacy.tableentries import Layer
+    from ezdxf.modern.layouts import Layout
 
-ACCEPTED_DXFTYPES = ['LINE', 'CIRCLE', 'ARC', 'POLYLINE', 'LWPOLYLINE']
+
+EntityPredicate = Callable[['GraphicEntity'], bool]
+EntityRep = Tuple[OpenCVOp, BoundingBox]
+
+# 幅または高さが0の範囲は、長い方の辺のこの割合まで広げます
+MIN_EXTENT_RATIO = 0.01
+# entities read or built between checks of a budget
+BUDGET_BATCH = 4096
 
 
 def render_dxf(
-        drawing: Union[str, Drawing],
+        drawing: Union[str, 'Drawing'],
         image_size: int,
-        is_plain: bool = False) -> np.ndarray:
+        is_plain: bool = False,
+        include_layers: Optional[Sequence[str]] = None,
+        exclude_layers: Optional[Sequence[str]] = None,
+        dxftypes: Optional[Sequence[str]] = None,
+        predicate: Optional[EntityPredicate] = None,
+        report: Optional[RenderReport] = None,
+        stroke: Optional[StrokePolicy] = None,
+        dedup: bool = False,
+        pick: bool = False,
+        budget: Optional['RenderBudget'] = None) -> Union[np.ndarray, Tuple[np.ndarray, PickBuffer]]:
     """render a dxf file and return as numpy array
 
     :param drawing: path or object for a DXF file
     :param image_size: maximum edge length of the image to return. original scales are applied in default.
     :param is_plain: limit the use of advansed properties. better speed & less possibility to encounter unknown errors, instead of less quality.
+    :param include_layers: draw only the layers matching one of these names. glob patterns such as 'WALL*' are
+        accepted and the case is ignored. all layers in default.
+    :param exclude_layers: do not draw the layers matching one of these names or patterns
+    :param dxftypes: draw only the entities of these dxftypes, e.g. ['LINE', 'ARC']. glob patterns are accepted.
+    :param predicate: draw only the entities for which this returns True, e.g. to select handles.
+        called after the other filters.
+    :param report: render in fault-tolerant mode and record the entities skipped into this report.
+        nothing is raised: a file which cannot be read gives a blank image. without a report, errors of
+        the draw functions and OpenCV are raised, and only entities with non-finite or inverted bounding
+        boxes are skipped, with a warning.
+    :param stroke: how lineweights are drawn. widths relative to the image size in default.
+    :param dedup: draw repeated geometry once, and drop lines lying on another line of the same style.
+        the number of entities dropped is counted in `report.duplicates`. see `dxfvis.dedup`
+    :param pick: return (image, `PickBuffer`) instead, where the pick buffer tells the entity under each
+        pixel of the image. its ids are drawn in the same pass, with the same coordinates and line widths.
+    :param budget: limits of the time, the canvas size, the number of ops and the dashes of an entity.
+        a render exceeding one stops cleanly and returns what is drawn, and the budgets exceeded are listed
+        in `report.exceeded` (warned without a report). see `dxfvis.budget`
     """
 
+    meter = None if budget is None else budget.start()
+    if report is not None:
+        try:
+            drawing = load_drawing(drawing)
+        except Exception as e:
+            report.add('load', None, e)
+            canvas = np.zeros(get_image_shape(get_extents([]), image_size), dtype=np.float64)
+            if pick:
+                return canvas, PickBuffer(np.full(canvas.shape[:2], -1, dtype=np.int32), [], [])
+
+            return canvas
+    else:
+        drawing = load_drawing(drawing)
+
+    entities, entity_reps = collect_entity_ops(drawing, include_layers, exclude_layers, dxftypes, predicate, report,
+                                               meter)
+    owners = {id(entity_rep[0]): entity for entity, entity_rep in zip(entities, entity_reps) if entity_rep is not None}
+    bboxes = {id(entity_rep[0]): entity_rep[1] for entity_rep in entity_reps if entity_rep is not None}
+    ops = [entity_rep[0] for entity_rep in entity_reps if entity_rep is not None]
+    dxf_space = get_extents(entity_reps)
+    if dedup:
+        from dxfvis.dedup import dedup_ops
+        ops, removed = dedup_ops(ops, dxf_space)
+        if report is not None:
+            report.duplicates += removed
+
+    if meter is not None:
+        image_size = meter.fit_image_size(dxf_space, image_size, pick=pick)
+
+    if not pick:
+        canvas = rasterize_ops(ops, dxf_space, image_size, report=report, stroke=stroke, meter=meter,
+                               bboxes=[bboxes[id(op)] for op in ops])
+        _report_budget(meter, report)
+        return canvas
+
+    ids = np.full(get_image_shape(dxf_space, image_size)[:2], -1, dtype=np.int32)
+    canvas = rasterize_ops(ops, dxf_space, image_size, report=report, stroke=stroke, pick_buffer=ids, meter=meter,
+                           bboxes=[bboxes[id(op)] for op in ops])
+    _report_budget(meter, report)
+    owners = [owners[id(op)] for op in ops]
+    return canvas, PickBuffer(ids, [entity.dxf.handle for entity in owners], [entity.dxf.layer for entity in owners])
+
+
+def _report_budget(meter: Optional['BudgetMeter'], report: Optional[RenderReport]) -> None:
+    if meter is None or not meter.exceeded:
+        return
+
+    if report is not None:
+        report.exceeded.extend(name for name in meter.exceeded if name not in report.exceeded)
+    else:
+        warnings.warn('render cut by its budget: {}'.format(', '.join(meter.exceeded)), RuntimeWarning)
+
+
+def load_drawing(drawing: Union[str, 'Drawing']) -> 'Drawing':
+    """read a DXF file if a path is given"""
+
     if isinstance(drawing, str):
+        import ezdxf
         drawing = ezdxf.readfile(drawing)
 
-    ops: List[OpenCVOp] = []
+    return drawing
+
+
+def collect_ops(
+        drawing: 'Drawing',
+        include_layers: Optional[Sequence[str]] = None,
+        exclude_layers: Optional[Sequence[str]] = None,
+        dxftypes: Optional[Sequence[str]] = None,
+        predicate: Optional[EntityPredicate] = None,
+        report: Optional[RenderReport] = None) -> Tuple[List[OpenCVOp], BoundingBox]:
+    """build drawing operations for every entity in the modelspace
+
+    entities are grouped by dxftype and each group is built by one call of its batch function.
+    the ops are returned in the order of the entities. entities rejected by the filters
+    (see `render_dxf`) are skipped before any draw function is called.
+
+    :param drawing: object for a DXF file
+    :param report: skip the entities which fail and record them here instead of raising
+
+    :returns drawing operations, extents of the entities drawn
+    """
+
+    _, entity_reps = collect_entity_ops(drawing, include_layers, exclude_layers, dxftypes, predicate, report)
+    ops = [entity_rep[0] for entity_rep in entity_reps if entity_rep is not None]
+    return ops, get_extents(entity_reps)
+
+
+def collect_entity_ops(
+        drawing: 'Drawing',
+        include_layers: Optional[Sequence[str]] = None,
+        exclude_layers: Optional[Sequence[str]] = None,
+        dxftypes: Optional[Sequence[str]] = None,
+        predicate: Optional[EntityPredicate] = None,
+        report: Optional[RenderReport] = None,
+        meter: Optional['BudgetMeter'] = None) -> Tuple[List['GraphicEntity'], List[Optional[EntityRep]]]:
+    """same as `collect_ops`, but keeps the entities
+
+    :param meter: stop reading and building when the time or the number of ops of its budget runs out
+    :returns entities passing the filters, (op, bounding box) of each entity or None if it is not drawn
+    """
+
+    is_drawn = make_entity_filter(drawing, include_layers, exclude_layers, dxftypes, predicate)
+    entities = (entity for entity in iter_entities(drawing, report=report) if is_drawn(entity))
+    if meter is None:
+        entities = list(entities)
+    else:
+        entities = _read_within(entities, meter)
+
+    return entities, build_entity_ops(entities, drawing, report, meter)
+
+
+def _read_within(entities: Iterable['GraphicEntity'], meter: 'BudgetMeter') -> List['GraphicEntity']:
+    """entities read until the time or the number of ops of the budget runs out"""
+
+    from dxfvis.budget import BUILD_SHARE
+    from dxfvis.budget import OPS
+
+    max_ops = meter.budget.max_ops
+    entities = iter(entities)
+    read: List['GraphicEntity'] = []
+    while not meter.is_expired(BUILD_SHARE):
+        batch = list(itertools.islice(entities, BUDGET_BATCH))
+        read.extend(batch)
+        if max_ops is not None and len(read) > max_ops:
+            meter.cut(OPS)
+            del read[max_ops:]
+            break
+        if len(batch) < BUDGET_BATCH:
+            break
+
+    return read
+
+
+def build_entity_ops(
+        entities: Sequence['GraphicEntity'],
+        drawing: 'Drawing',
+        report: Optional[RenderReport] = None,
+        meter: Optional['BudgetMeter'] = None) -> List[Optional[EntityRep]]:
+    """(op, bounding box) of each entity, or None if it is not drawn.
+    entities are grouped by dxftype and each group is built by one call of its batch function
+
+    :param report: skip the entities which fail and record them here instead of raising
+    :param meter: build the groups in batches of `BUDGET_BATCH` and stop when the time of its budget runs out.
+        entities with more dashes than the budget are not drawn.
+    """
+
+    if meter is not None:
+        from dxfvis.budget import BUILD_SHARE
+
+    groups: Dict[str, List[int]] = {}
+    for i, entity in enumerate(entities):
+        groups.setdefault(entity.dxftype(), []).append(i)
+
+    entity_reps: List[Optional[EntityRep]] = [None] * len(entities)
+    for dxftype, indices in groups.items():
+        batch_func = registry.get_batch_func(dxftype)
+        if batch_func is None:
+            continue
+
+        if meter is None:
+            _build_group(batch_func, indices, entities, drawing, report, entity_reps)
+            continue
+
+        for start in range(0, len(indices), BUDGET_BATCH):
+            if meter.is_expired(BUILD_SHARE):
+                return entity_reps
+
+            batch = indices[start:start + BUDGET_BATCH]
+            _build_group(batch_func, batch, entities, drawing, report, entity_reps)
+            for i in batch:
+                if entity_reps[i] is not None and meter.is_too_dashed(entity_reps[i][0]):
+                    if report is not None:
+                        report.add('budget', entities[i], 'more dashes than {}'.format(meter.budget.max_dashes))
+                    entity_reps[i] = None
+
+    return entity_reps
+
+
+def _build_group(
+        batch_func: Callable,
+        indices: List[int],
+        entities: Sequence['GraphicEntity'],
+        drawing: 'Drawing',
+        report: Optional[RenderReport],
+        entity_reps: List[Optional[EntityRep]]) -> None:
+    group = [entities[i] for i in indices]
+    if report is not None:
+        for i, entity_rep in zip(indices, _build_tolerantly(batch_func, group, drawing, report)):
+            entity_reps[i] = entity_rep
+        return
+
+    # 座標が有限でない形は範囲を壊すので、報告がなくても描きません
+    n_invalid = 0
+    for i, entity_rep in zip(indices, batch_func(group, drawing)):
+        if entity_rep is not None and not _is_valid_bbox(entity_rep[1]):
+            entity_rep = None
+            n_invalid += 1
+
+        entity_reps[i] = entity_rep
+
+    if n_invalid:
+        warnings.warn('{} {} entities with invalid coordinates are not drawn'.format(n_invalid, group[0].dxftype()))
+
+
+def _build_tolerantly(
+        batch_func: Callable,
+        entities: List['GraphicEntity'],
+        drawing: 'Drawing',
+        report: RenderReport) -> List[Optional[EntityRep]]:
+    """build the ops of a group, skipping the entities which fail or have no valid bounding box"""
+
+    try:
+        entity_reps = list(batch_func(entities, drawing))
+    except Exception:
+        # 失敗したグループは一つずつ作り直します
+        entity_reps = []
+        for entity in entities:
+            try:
+                entity_reps.append(batch_func([entity], drawing)[0])
+            except Exception as e:
+                report.add('build', entity, e)
+                entity_reps.append(None)
+
+    for i, entity_rep in enumerate(entity_reps):
+        if entity_rep is None:
+            continue
+
+        if not _is_valid_bbox(entity_rep[1]):
+            report.add('extents', entities[i], 'invalid bounding box {}'.format(entity_rep[1]))
+            entity_reps[i] = None
+        elif not _has_finite_points(entity_rep[0]):
+            report.add('build', entities[i], 'non-finite coordinates')
+            entity_reps[i] = None
+
+    return entity_reps
+
+
+def _is_valid_bbox(bbox: BoundingBox) -> bool:
+    try:
+        (xmin, ymin), (xmax, ymax) = bbox[0][:2], bbox[1][:2]
+        # NaN と無限大は和に残ります
+        return math.isfinite(xmin + ymin + xmax + ymax) and xmin <= xmax and ymin <= ymax
+    except (TypeError, ValueError, IndexError):
+        return False
+
+
+def _has_finite_points(op: OpenCVOp) -> bool:
+    """whether the points of `op` are finite. curves are checked through their bounding boxes"""
+
+    values = list(op.args) + list(op.kwargs.values())
+    try:
+        for val, status in values:
+            if status in (VariableStatus.POINT_MAPPING, VariableStatus.SEQUENCE_MAPPING, VariableStatus.ARRAY_MAPPING):
+                if not isinstance(val, list) or status != VariableStatus.ARRAY_MAPPING:
+                    val = [val]
+                if not all(np.isfinite(np.asarray(v, dtype=np.float64)).all() for v in val):
+                    return False
+    except (TypeError, ValueError):
+        return False
+
+    return True
+
+
+def get_extents(entity_reps: Sequence[Optional[EntityRep]]) -> BoundingBox:
+    """extents covering the bounding boxes of `entity_reps`. never empty: an extent of zero width or height
+    (e.g. a single point or a horizontal line) is widened by `MIN_EXTENT_RATIO` of the other edge"""
+
     drawing_xmin = np.inf
     drawing_xmax = -np.inf
     drawing_ymin = np.inf
     drawing_ymax = -np.inf
-    msp = drawing.modelspace()
-    for entity in msp:
-        if entity.dxftype() == 'DIMENSION':
-            if 'geometry' not in entity.dxfattribs():
-                warnings.warn('No block for DIMENSION ENTITY')
-                continue
+    for entity_rep in entity_reps:
+        if entity_rep is None:
+            continue
 
-            block = drawing.blocks.get(entity.dxf.geometry)
-            for entity_ in block:
-                entity_rep = draw_entity(entity_, drawing)
-                if entity_rep is None:
-                    continue
-
-                op, bb = entity_rep
-                ops.append(op)
-                drawing_xmin = min(drawing_xmin, bb[0][0])
-                drawing_xmax = max(drawing_xmax, bb[1][0])
-                drawing_ymin = min(drawing_ymin, bb[0][1])
-                drawing_ymax = max(drawing_ymax, bb[1][1])
-
-        elif entity.dxftype() == 'INSERT':
-            if 'name' not in entity.dxfattribs():
-                warnings.warn('No block for INSERT ENTITY')
-                continue
+        bb = entity_rep[1]
+        drawing_xmin = min(drawing_xmin, bb[0][0])
+        drawing_xmax = max(drawing_xmax, bb[1][0])
+        drawing_ymin = min(drawing_ymin, bb[0][1])
+        drawing_ymax = max(drawing_ymax, bb[1][1])
+
+    if drawing_xmin == np.inf:
+        # 描画するものがない場合は空の画像になります
+        return ((0., 0.), (1., 1.))
+
+    span = max(drawing_xmax - drawing_xmin, drawing_ymax - drawing_ymin)
+    min_extent = span * MIN_EXTENT_RATIO if span > 0 else 1.
+    if drawing_xmax - drawing_xmin < min_extent:
+        pad = (min_extent - (drawing_xmax - drawing_xmin)) / 2
+        drawing_xmin, drawing_xmax = drawing_xmin - pad, drawing_xmax + pad
+    if drawing_ymax - drawing_ymin < min_extent:
+        pad = (min_extent - (drawing_ymax - drawing_ymin)) / 2
+        drawing_ymin, drawing_ymax = drawing_ymin - pad, drawing_ymax + pad
+
+    return ((drawing_xmin, drawing_ymin), (drawing_xmax, drawing_ymax))
 
-            block = drawing.blocks.get(entity.dxf.name)
-            for entity_ in block:
-                entity_rep = draw_entity(entity_, drawing)
-                if entity_rep is None:
-                    continue
 
-                op, bb = entity_rep
-                ops.append(op)
-                drawing_xmin = min(drawing_xmin, bb[0][0])
-                drawing_xmax = max(drawing_xmax, bb[1][0])
-                drawing_ymin = min(drawing_ymin, bb[0][1])
-                drawing_ymax = max(drawing_ymax, bb[1][1])
+def header_extents(drawing: 'Drawing') -> Optional[BoundingBox]:
+    """$EXTMIN / $EXTMAX of the header, widened as `get_extents` does, or None if they are not set
+
+    the header covers every entity of the file, whatever the filters, and may be stale.
+    """
+
+    extents = valid_extents(drawing.header.get('$EXTMIN'), drawing.header.get('$EXTMAX'))
+    return None if extents is None else get_extents([(None, extents)])
+
+
+def union_bboxes(bboxes: Iterable[Optional[BoundingBox]]) -> Optional[BoundingBox]:
+    """bounding box of `bboxes`, or None if there is none. None in `bboxes` is skipped"""
+
+    bboxes = [bbox for bbox in bboxes if bbox is not None]
+    if not bboxes:
+        return None
 
+    return ((min(bbox[0][0] for bbox in bboxes), min(bbox[0][1] for bbox in bboxes)),
+            (max(bbox[1][0] for bbox in bboxes), max(bbox[1][1] for bbox in bboxes)))
+
+
+def iter_entities(
+        drawing: 'Drawing',
+        layout: Optional['Layout'] = None,
+        report: Optional[RenderReport] = None) -> Iterator['GraphicEntity']:
+    """iterate entities of the modelspace, or of `layout`, in draw order (see `dxfvis.order`).
+    DIMENSION and INSERT are replaced with the entities of their blocks
+
+    :param report: record the DIMENSION and INSERT whose block is missing here instead of warning
+    """
+
+    for entity in sort_entities(drawing.modelspace() if layout is None else layout):
+        dxftype = entity.dxftype()
+        if dxftype == 'DIMENSION':
+            yield from _block_entities(drawing, entity, 'geometry', report)
+        elif dxftype == 'INSERT':
+            yield from _block_entities(drawing, entity, 'name', report)
         else:
-            entity_rep = draw_entity(entity, drawing)
-            if entity_rep is None:
-                continue
+            yield entity
+
+
+def _block_entities(
+        drawing: 'Drawing',
+        entity: 'GraphicEntity',
+        key: str,
+        report: Optional[RenderReport]) -> Iterable['GraphicEntity']:
+    """entities of the block `entity` refers to by its attribute `key`"""
+
+    if key not in entity.dxfattribs():
+        message = 'No block for {} ENTITY'.format(entity.dxftype())
+    else:
+        name = entity.get_dxf_attrib(key)
+        block = drawing.blocks.get(name)
+        if block is not None:
+            return sort_entities(block)
+
+        message = 'Block {} is not defined'.format(name)
+
+    if report is None:
+        warnings.warn(message)
+    else:
+        report.add('block', entity, message)
+
+    return ()
+
+
+def get_layer_states(drawing: 'Drawing') -> Dict[str, bool]:
+    """lower-cased layer name -> whether the layer is on"""
+    return {layer.dxf.name.lower(): layer.is_on() for layer in drawing.layers}
 
-            op, bb = entity_rep
-            ops.append(op)
-            drawing_xmin = min(drawing_xmin, bb[0][0])
-            drawing_xmax = max(drawing_xmax, bb[1][0])
-            drawing_ymin = min(drawing_ymin, bb[0][1])
-            drawing_ymax = max(drawing_ymax, bb[1][1])
 
-    # render dxf as an image
-    dxf_space = ((drawing_xmin, drawing_ymin), (drawing_xmax, drawing_ymax))
+def make_entity_filter(
+        drawing: 'Drawing',
+        include_layers: Optional[Sequence[str]] = None,
+        exclude_layers: Optional[Sequence[str]] = None,
+        dxftypes: Optional[Sequence[str]] = None,
+        predicate: Optional[EntityPredicate] = None) -> EntityPredicate:
+    """function telling whether an entity is drawn. see `render_dxf` for the parameters
+
+    the layer patterns are matched once per layer of the layer table, so each entity costs
+    one dictionary lookup. layers turned off are never drawn.
+    """
+
+    include_layers = _lower_patterns(include_layers)
+    exclude_layers = _lower_patterns(exclude_layers)
+    dxftypes = _lower_patterns(dxftypes)
+    if dxftypes is not None:
+        dxftypes = [t.upper() for t in dxftypes]
+
+    def is_layer_drawn(name: str) -> bool:
+        if include_layers is not None and not _match_any(name, include_layers):
+            return False
+
+        return exclude_layers is None or not _match_any(name, exclude_layers)
+
+    layer_table = {name: state and is_layer_drawn(name) for name, state in get_layer_states(drawing).items()}
+    # dxftypes are few, so their results are memoized as they appear
+    type_table: Dict[str, bool] = {}
+
+    def is_drawn(entity: 'GraphicEntity') -> bool:
+        dxftype = entity.dxftype()
+        if dxftypes is not None:
+            accepted = type_table.get(dxftype)
+            if accepted is None:
+                accepted = _match_any(dxftype, dxftypes)
+                type_table[dxftype] = accepted
+
+            if not accepted:
+                return False
+
+        layer = entity.dxf.layer.lower()
+        accepted = layer_table.get(layer)
+        if accepted is None:
+            # 画層テーブルにない画層
+            accepted = is_layer_drawn(layer)
+            layer_table[layer] = accepted
+
+        if not accepted:
+            return False
+
+        return predicate is None or bool(predicate(entity))
+
+    return is_drawn
+
+
+def _lower_patterns(patterns: Optional[Sequence[str]]) -> Optional[List[str]]:
+    if patterns is None:
+        return None
+
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    return [p.lower() for p in patterns]
+
+
+def _match_any(name: str, patterns: Sequence[str]) -> bool:
+    return any(name == p or fnmatch.fnmatchcase(name, p) for p in patterns)
+
+
+def get_image_shape(dxf_space: BoundingBox, image_size: int) -> Size:
+    """shape of the image whose longer edge is `image_size` and covers `dxf_space`"""
+
+    (drawing_xmin, drawing_ymin), (drawing_xmax, drawing_ymax) = dxf_space
     aspect_ratio = (drawing_ymax - drawing_ymin) / (drawing_xmax - drawing_xmin)
-    scale = image_size / max((drawing_ymax - drawing_ymin), (drawing_xmax - drawing_xmin))
     if aspect_ratio > 1:
-        image_shape = (image_size, int(image_size / aspect_ratio), 3)
+        return (image_size, max(int(image_size / aspect_ratio), 1), 3)
     else:
-        image_shape = (int(image_size * aspect_ratio), image_size, 3)
+        return (max(int(image_size * aspect_ratio), 1), image_size, 3)
 
-    canvas = np.zeros(image_shape)
-    # actual drawing
-    for op in ops:
-        if op is None:
-            continue
 
-        op(canvas, dxf_space)
+def rasterize_ops(
+        ops: List[OpenCVOp],
+        dxf_space: BoundingBox,
+        image_size: int,
+        dtype: type = np.float64,
+        report: Optional[RenderReport] = None,
+        stroke: Optional[StrokePolicy] = None,
+        stitch: bool = True,
+        pick_buffer: Optional[np.ndarray] = None,
+        meter: Optional['BudgetMeter'] = None,
+        bboxes: Optional[Sequence[Optional[BoundingBox]]] = None) -> np.ndarray:
+    """draw operations onto a new canvas
+
+    :param ops: drawing operations built by `collect_ops`
+    :param dxf_space: extents of the drawing in DXF coordinates
+    :param image_size: maximum edge length of the image to return
+    :param dtype: dtype of the canvas. colors are drawn in 0 ~ 255 for any dtype.
+    :param report: skip the ops which fail and record them here instead of raising
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param stitch: draw consecutive LINE entities of one style as polylines. see `dxfvis.stitch`
+    :param pick_buffer: (H, W) int32 array of the canvas size. each op is drawn into it as well, with its index in `ops`
+    :param meter: stop drawing when the time of its budget runs out
+    :param bboxes: bounding box of each op. ops of one style are batched where it does not change which
+        one shows on top. see `dxfvis.order`
+    """
+
+    canvas = np.zeros(get_image_shape(dxf_space, image_size), dtype=dtype)
+    # 線の太さは描画ごとに一度だけ解決します
+    widths = (stroke or StrokePolicy()).widths(canvas.shape)
+    draw_ops(canvas, ops, dxf_space, widths, report, stitch, meter, bboxes)
+
+    if pick_buffer is not None:
+        # 番号はopごとに描くため、まとめずに描画順に描きます
+        for index, op in enumerate(ops):
+            if op is None:
+                continue
+            if meter is not None and index % BUDGET_BATCH == 0 and meter.is_expired():
+                break
+
+            try:
+                op(pick_buffer, dxf_space, canvas.shape, color=(index,), stroke=widths)
+            except Exception:
+                if report is None:
+                    raise
 
     return canvas
 
 
+def draw_ops(
+        canvas: np.ndarray,
+        ops: Sequence[Optional[OpenCVOp]],
+        dxf_space: BoundingBox,
+        widths: StrokeWidths,
+        report: Optional[RenderReport] = None,
+        stitch: bool = True,
+        meter: Optional['BudgetMeter'] = None,
+        bboxes: Optional[Sequence[Optional[BoundingBox]]] = None) -> None:
+    """draw operations onto `canvas`, which covers `dxf_space`. see `rasterize_ops`"""
+
+    if bboxes is not None:
+        from dxfvis.order import batch_ops
+        ops = batch_ops(ops, bboxes, dxf_space, canvas.shape, widths)
+
+    if stitch:
+        from dxfvis.stitch import stitch_lines
+        ops = stitch_lines(ops, widths)
+
+    # actual drawing
+    if report is None:
+        for op in merge_ops(ops, widths):
+            if meter is not None and meter.is_expired():
+                break
+
+            op(canvas, dxf_space, stroke=widths)
+    else:
+        for op in merge_ops(ops, widths):
+            if meter is not None and meter.is_expired():
+                break
+
+            try:
+                op(canvas, dxf_space, stroke=widths)
+            except Exception as e:
+                report.add('draw', None, '{}: {}: {}'.format(getattr(op.func, '__name__', op.func), type(e).__name__, e))
+
+
 def draw_entity(
-        obj: GraphicEntity,
-        drawing: Drawing) -> Optional[Tuple[OpenCVOp, BoundingBox]]:
+        obj: 'GraphicEntity',
+        drawing: 'Drawing') -> Optional[Tuple[OpenCVOp, BoundingBox]]:
     """DXFファイル上のEntityをキャンバスに描画します
 
     :param obj: 描画対象のエンティティ
@@ -142,36 +635,19 @@ def draw_entity(
         * DXFファイル上でエンティティが非表示の場合・フォーマットが非対応の場合には描画を行いません。
     """
 
-    if drawing.layers.has_entry(obj.dxf.layer):
-        layer: Layer = drawing.layers.get(obj.dxf.layer)
-        if not layer.is_on():
-            return None
+    from dxfvis import util
 
-        layer_params = layer.dxfattribs()
-    else:
-        layer_params = {}
+    layer: Optional['Layer'] = util.get_table_entry(drawing.layers, obj.dxf.layer)
+    if layer is not None and not layer.is_on():
+        return None
 
     dxftype = obj.dxftype()
-    if dxftype not in ACCEPTED_DXFTYPES:
-        return None
+    draw_func = registry.get_draw_func(dxftype)
+    if draw_func is not None:
+        return draw_func(obj, drawing)
 
-    if dxftype == 'ARC':
-        return draw_arc(obj, drawing)
-    elif dxftype == 'CIRCLE':
-        return draw_circle(obj, drawing)
-    elif dxftype == 'LINE':
-        return draw_line(obj, drawing)
-    elif dxftype == 'POLYLINE':
-        return draw_polyline(obj, drawing)
-    elif dxftype == 'LWPOLYLINE':
-        return draw_lwpolyline(obj, drawing)
-    elif dxftype == 'TEXT':
-        return draw_text(obj, drawing)
-    elif dxftype == 'POINT':
-        return draw_point(obj, drawing)
-    elif dxftype == 'MTEXT':
-        return draw_mtext(obj, drawing)
-    elif dxftype == 'ELLIPSE':
-        return draw_ellipse(obj, drawing)
-    else:
-        return None
+    batch_func = registry.get_batch_func(dxftype)
+    if batch_func is not None:
+        return batch_func([obj], drawing)[0]
+
+    return None
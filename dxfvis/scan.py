@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""read what a DXF file holds without loading it
+
+`probe` scans the group codes of an ASCII DXF file for the header variables, the layer names and
+the number of entities of each dxftype. only the HEADER section and the LAYER table are parsed as
+tags; the other sections are skipped by searching for their ENDSEC, and the entities are counted
+by searching for the `0` group codes starting them, so their bodies are never parsed. the file is
+memory-mapped and searched in chunks, which runs at about the speed of reading it.
+"""
+
+import collections
+import math
+import mmap
+import os
+import re
+
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from dxfvis.types import BoundingBox
+
+
+# header extents beyond this are not set
+UNSET_EXTENT = 1e19
+# bytes of the entities searched at once
+CHUNK_SIZE = 1 << 24
+
+_BINARY_SENTINEL = b'AutoCAD Binary DXF'
+# `0` group code and the dxftype of an entity, after a line break
+_ENTITY_START = re.compile(rb'\n[ \t]*0[ \t]*\r?\n([A-Za-z_][A-Za-z0-9_]*)')
+_DXFTYPE = rb'([A-Za-z_][A-Za-z0-9_]*)'
+# entities which belong to the entity before them
+_SUBENTITIES = (b'VERTEX', b'ATTRIB', b'SEQEND')
+# R2007 (AC1021) and later are written in UTF-8
+_UTF8_VERSION = 'AC1021'
+
+
+class DrawingProbe(NamedTuple):
+    """what `probe` reads from a DXF file"""
+
+    version: Optional[str]  # $ACADVER, e.g. 'AC1024'
+    extents: Optional['BoundingBox']  # $EXTMIN / $EXTMAX, None if they are not set
+    insunits: Optional[int]  # $INSUNITS, e.g. 4 for millimeters
+    layers: List[str]  # names in the LAYER table
+    counts: Dict[str, int]  # dxftype -> number of entities in the ENTITIES section
+    size: int  # bytes of the file
+
+    @property
+    def n_entities(self) -> int:
+        """number of entities in the ENTITIES section, including VERTEX, ATTRIB and SEQEND"""
+        return sum(self.counts.values())
+
+
+def probe(path: str) -> DrawingProbe:
+    """read the extents, units, layer names and entity counts of a DXF file without loading it
+
+        info = probe(path)
+        if info.n_entities > 10 ** 6:
+            ...  # render in tiles
+
+    the counts are those of the ENTITIES section: entities of both modelspace and paperspace, and
+    not the entities of blocks. INSERT is counted once however large its block is.
+
+    :param path: path for an ASCII DXF file
+    """
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            raise ValueError('{} is empty'.format(path))
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(_BINARY_SENTINEL)] == _BINARY_SENTINEL:
+                raise ValueError('binary DXF is not supported: {}'.format(path))
+
+            sections = find_sections(mm)
+            header = read_header(mm[slice(*sections['HEADER'])]) if 'HEADER' in sections else {}
+            encoding = file_encoding(header)
+            layers = _read_layers(mm[slice(*sections['TABLES'])], encoding) if 'TABLES' in sections else []
+            counts = count_entities(mm, *sections['ENTITIES']) if 'ENTITIES' in sections else {}
+
+    return DrawingProbe(
+        version=header.get('$ACADVER'),
+        extents=valid_extents(header.get('$EXTMIN'), header.get('$EXTMAX')),
+        insunits=header.get('$INSUNITS'),
+        layers=layers,
+        counts={name.decode('ascii'): n for name, n in counts.items()},
+        size=size)
+
+
+def find_sections(data) -> Dict[str, Tuple[int, int]]:
+    """name -> (start, stop) of the tags in each section, between `2 <name>` and `0 ENDSEC`"""
+
+    sections: Dict[str, Tuple[int, int]] = {}
+    pos = 0
+    while True:
+        start = find_marker(data, b'SECTION', pos)
+        if start < 0:
+            return sections
+
+        # 2 / 名前 の2行を読み飛ばします
+        lines = []
+        stop = start
+        for _ in range(3):
+            stop = data.find(b'\n', stop) + 1
+            if stop == 0:
+                return sections
+            lines.append(stop)
+
+        name = data[lines[1]:lines[2]].strip().decode('ascii', errors='replace')
+        end = find_marker(data, b'ENDSEC', lines[2])
+        if end < 0:
+            # 閉じていない最後のセクションはファイルの終わりまでです
+            sections[name] = (lines[2], len(data))
+            return sections
+
+        sections[name] = (lines[2], _line_start(data, end - 1))
+        pos = end
+
+
+def find_marker(data, word: bytes, start: int = 0, stop: Optional[int] = None) -> int:
+    """position of the first line `word` following a `0` group code, or -1"""
+
+    stop = len(data) if stop is None else stop
+    pos = start
+    while True:
+        p = data.find(word, pos, stop)
+        if p < 0:
+            return -1
+
+        pos = p + len(word)
+        if p > 0 and data[p - 1:p] != b'\n':
+            continue
+        if pos < stop and data[pos:pos + 1] not in (b'\r', b'\n', b' ', b'\t'):
+            continue
+        if p == 0 or data[_line_start(data, p - 1):p].strip() != b'0':
+            continue
+
+        return p
+
+
+def _line_start(data, pos: int) -> int:
+    """start of the line before the line break at `pos`"""
+    return data.rfind(b'\n', 0, pos) + 1
+
+
+def count_entities(data, start: int, stop: int) -> Dict[bytes, int]:
+    """dxftype -> number of `0` group codes followed by it in `data[start:stop]`"""
+
+    pattern = _entity_pattern(data, start, stop)
+    counts: Dict[bytes, int] = collections.Counter()
+    # 範囲の最初の行の前に改行があるものとして探します
+    pos = max(start - 1, 0)
+    while pos < stop:
+        end = min(pos + CHUNK_SIZE, stop)
+        if end < stop:
+            # `0` の行の直後では区切りません
+            end = data.find(b'\n', end, stop)
+            while end >= 0 and data[_line_start(data, end):end].strip() == b'0':
+                end = data.find(b'\n', end + 1, stop)
+            if end < 0:
+                end = stop
+
+        counts.update(pattern.findall(data, pos, end))
+        pos = end
+
+    return dict(counts)
+
+
+def split_entities(data, start: int, stop: int, n_chunks: int) -> List[Tuple[int, int]]:
+    """split `data[start:stop]` of an ENTITIES section into up to `n_chunks` ranges of about the same size
+
+    ranges start at the `0` group code of an entity. VERTEX, ATTRIB and SEQEND stay with the POLYLINE
+    or INSERT they follow.
+    """
+
+    pattern = _entity_pattern(data, start, stop)
+    bounds = [start]
+    for k in range(1, n_chunks):
+        pos = max(start + (stop - start) * k // n_chunks, bounds[-1]) - 1
+        for m in pattern.finditer(data, pos, stop):
+            if m.group(1) not in _SUBENTITIES:
+                if m.start() + 1 > bounds[-1]:
+                    bounds.append(m.start() + 1)
+                break
+
+    bounds.append(stop)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _entity_pattern(data, start: int, stop: int):
+    """pattern of the `0` group codes starting entities in `data[start:stop]`
+
+    writers put the group codes in one format, e.g. '  0' right-aligned. the format of the first
+    line is searched as it is, which skips the other lines much faster than a pattern.
+    """
+
+    first = data[start:data.find(b'\n', start, stop) + 1]
+    if first.strip() == b'0':
+        return re.compile(b'\n' + re.escape(first) + _DXFTYPE)
+
+    return _ENTITY_START
+
+
+def iter_tags(data: bytes) -> Iterator[Tuple[int, bytes]]:
+    """(group code, value) of the tags in `data`, which starts at a group code"""
+
+    lines = data.splitlines()
+    for i in range(0, len(lines) - 1, 2):
+        try:
+            code = int(lines[i])
+        except ValueError:
+            raise ValueError('invalid group code {!r}'.format(lines[i])) from None
+
+        yield code, lines[i + 1]
+
+
+def read_header(data: bytes) -> Dict[str, object]:
+    """$ACADVER, $DWGCODEPAGE, $INSUNITS, $EXTMIN and $EXTMAX of the HEADER section, if present"""
+
+    header: Dict[str, object] = {}
+    name = None
+    for code, value in iter_tags(data):
+        if code == 9:
+            name = value.strip().decode('ascii', errors='replace')
+        elif name in ('$ACADVER', '$DWGCODEPAGE'):
+            header[name] = value.strip().decode('ascii', errors='replace')
+        elif name == '$INSUNITS' and code == 70:
+            header[name] = int(value)
+        elif name in ('$EXTMIN', '$EXTMAX') and code in (10, 20, 30):
+            point = header.setdefault(name, [0., 0., 0.])
+            point[code // 10 - 1] = float(value)
+
+    return header
+
+
+def file_encoding(header: Dict[str, object]) -> str:
+    """codec of the strings of a file. ANSI_932 is cp932"""
+
+    if str(header.get('$ACADVER', '')) >= _UTF8_VERSION:
+        return 'utf-8'
+
+    codepage = str(header.get('$DWGCODEPAGE', 'ANSI_1252'))
+    if codepage.upper().startswith('ANSI_'):
+        encoding = 'cp' + codepage[5:]
+        try:
+            ''.encode(encoding)
+            return encoding
+        except LookupError:
+            pass
+
+    return 'cp1252'
+
+
+def _read_layers(data: bytes, encoding: str) -> List[str]:
+    """names of the records of the LAYER table in the TABLES section"""
+
+    layers: List[str] = []
+    table = None
+    is_record = False
+    for code, value in iter_tags(data):
+        if code == 0:
+            value = value.strip()
+            if value == b'TABLE':
+                table = None
+            is_record = table == b'LAYER' and value == b'LAYER'
+        elif code == 2 and table is None:
+            table = value.strip()
+        elif code == 2 and is_record:
+            layers.append(value.decode(encoding, errors='replace'))
+            is_record = False
+
+    return layers
+
+
+def valid_extents(extmin, extmax) -> Optional['BoundingBox']:
+    """((xmin, ymin), (xmax, ymax)) of header extents, or None if they are not set"""
+
+    try:
+        (xmin, ymin), (xmax, ymax) = extmin[:2], extmax[:2]
+        values = [float(v) for v in (xmin, ymin, xmax, ymax)]
+    except (TypeError, ValueError):
+        return None
+
+    if not all(math.isfinite(v) and abs(v) < UNSET_EXTENT for v in values) or xmin > xmax or ymin > ymax:
+        return None
+
+    return (values[0], values[1]), (values[2], values[3])
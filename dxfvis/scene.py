@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""drawing operations compiled into flat numpy arrays
+
+plain lines, polylines, curves, fills and points become paths in a few arrays, which are cheap
+to store, to share between processes (see `dxfvis.shared`) and to draw: all vertices are mapped
+at once and consecutive paths of one style are drawn by one opencv call. ops which cannot be
+expressed as paths (patterns, pattern hatches, custom draw functions) are kept as they are and
+drawn in their place.
+
+vertices are stored in float32 relative to a float64 origin at the center of the extents, which
+halves their memory and keeps georeferenced drawings (coordinates around 1e6 ~ 1e7) precise: the
+error is span * 2^-25 at most, far below a subpixel at any size the scene is drawn at.
+"""
+
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from dxfvis import stroke as _stroke
+from dxfvis import tessellate
+from dxfvis.draw_funcs.hatch import fill_loops
+from dxfvis.draw_funcs.polyline import _draw_pl_op
+from dxfvis.render import collect_ops
+from dxfvis.render import get_image_shape
+from dxfvis.render import load_drawing
+from dxfvis.stroke import StrokePolicy
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import Size
+from dxfvis.types import SUBPIXEL_SHIFT
+from dxfvis.types import VariableStatus as S
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+
+
+# kinds of paths
+PATH_OPEN = 0  # polyline
+PATH_CLOSED = 1  # closed polyline
+PATH_FILL = 2  # filled polygon. consecutive fills of the same op are filled together, inner ones as holes
+PATH_DOT = 3  # filled circle at the first vertex, of the dot radius of its lineweight
+
+
+class Scene(object):
+    """drawing operations of a drawing as arrays
+
+    path i has the vertices origin + coords[offsets[i]:offsets[i + 1]] in DXF units. rows of `runs` are
+    (first path, last path + 1, index of `extras` or -1): the paths are drawn, then the extra op.
+    """
+
+    # names of the array attributes
+    ARRAYS = ('coords', 'offsets', 'kinds', 'styles', 'op_ids', 'colors', 'lineweights', 'runs')
+
+    coords: np.ndarray  # (V, 2) float32, relative to `origin`
+    offsets: np.ndarray  # (P + 1,) int64
+    kinds: np.ndarray  # (P,) uint8, PATH_*
+    styles: np.ndarray  # (P,) int32, row of `colors` and `lineweights`
+    op_ids: np.ndarray  # (P,) int32, index of the op the path was built from
+    colors: np.ndarray  # (C, 3) float64
+    lineweights: np.ndarray  # (C,) int32, DXF lineweight in 1/100 mm. see `dxfvis.stroke`
+    runs: np.ndarray  # (R, 3) int64
+    extents: BoundingBox
+    extras: List[OpenCVOp]
+    origin: Tuple[float, float]  # in DXF units
+
+    def __init__(self, arrays: Dict[str, np.ndarray], extents: BoundingBox, extras: List[OpenCVOp],
+                 origin: Tuple[float, float]) -> None:
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+        self.extents = extents
+        self.extras = extras
+        self.origin = origin
+
+    @property
+    def n_paths(self) -> int:
+        return len(self.kinds)
+
+    def bboxes(self) -> np.ndarray:
+        """(P, 4) bounding boxes of the paths as xmin, ymin, xmax, ymax in DXF units"""
+
+        if self.n_paths == 0:
+            return np.zeros((0, 4))
+
+        starts = self.offsets[:-1]
+        bboxes = np.concatenate([np.minimum.reduceat(self.coords, starts), np.maximum.reduceat(self.coords, starts)],
+                                axis=1).astype(np.float64)
+        return bboxes + np.tile(self.origin, 2)
+
+
+def compile_scene(drawing: Union[str, 'Drawing'], image_size: int, **filters: Any) -> Scene:
+    """build the ops of a drawing and compile them into a `Scene`
+
+    :param drawing: path or object for a DXF file
+    :param image_size: maximum edge length of the images the scene is drawn at. curves are flattened for it.
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    drawing = load_drawing(drawing)
+    ops, dxf_space = collect_ops(drawing, **filters)
+    return compile_ops(ops, dxf_space, image_size)
+
+
+def compile_ops(ops: List[OpenCVOp], dxf_space: BoundingBox, image_size: int) -> Scene:
+    """compile ops built by `collect_ops` into a `Scene`"""
+
+    width = get_image_shape(dxf_space, image_size)[1]
+    tolerance = tessellate.TOLERANCE * (dxf_space[1][0] - dxf_space[0][0]) / width
+
+    paths: List[np.ndarray] = []
+    kinds: List[int] = []
+    styles: List[int] = []
+    op_ids: List[int] = []
+    style_index: Dict[Tuple[Tuple[float, ...], int], int] = {}
+    runs: List[Tuple[int, int, int]] = []
+    extras: List[OpenCVOp] = []
+    start = 0
+    for op_id, op in enumerate(ops):
+        compiled = _compile_op(op, tolerance)
+        if compiled is None:
+            runs.append((start, len(paths), len(extras)))
+            extras.append(op)
+            start = len(paths)
+            continue
+
+        kind, pts_list, color, lineweight = compiled
+        style = style_index.setdefault((tuple(color), lineweight), len(style_index))
+        for pts in pts_list:
+            pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+            if len(pts) == 0:
+                continue
+
+            paths.append(pts)
+            kinds.append(kind)
+            styles.append(style)
+            op_ids.append(op_id)
+
+    if start < len(paths) or not runs:
+        runs.append((start, len(paths), -1))
+
+    (xmin, ymin), (xmax, ymax) = dxf_space
+    origin = (float(xmin + xmax) / 2, float(ymin + ymax) / 2)
+    lengths = np.array([len(p) for p in paths], dtype=np.int64)
+    arrays = {
+        'coords': (np.concatenate(paths) - origin).astype(np.float32) if paths else np.zeros((0, 2), dtype=np.float32),
+        'offsets': np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+        'kinds': np.array(kinds, dtype=np.uint8),
+        'styles': np.array(styles, dtype=np.int32),
+        'op_ids': np.array(op_ids, dtype=np.int32),
+        'colors': np.array([color for color, _ in style_index], dtype=np.float64).reshape(-1, 3),
+        'lineweights': np.array([lineweight for _, lineweight in style_index], dtype=np.int32),
+        'runs': np.array(runs, dtype=np.int64).reshape(-1, 3),
+    }
+    return Scene(arrays, dxf_space, extras, origin)
+
+
+def concat_scenes(scenes: Sequence[Scene], extents: BoundingBox) -> Scene:
+    """join scenes into one covering `extents`. the scenes are drawn one after another, in their order"""
+
+    (xmin, ymin), (xmax, ymax) = extents
+    origin = (float(xmin + xmax) / 2, float(ymin + ymax) / 2)
+    style_index: Dict[Tuple[Tuple[float, ...], int], int] = {}
+    parts: Dict[str, List[np.ndarray]] = {name: [] for name in Scene.ARRAYS if name not in ('colors', 'lineweights')}
+    parts['offsets'].append(np.zeros(1, dtype=np.int64))
+    extras: List[OpenCVOp] = []
+    n_vertices = n_paths = n_ops = 0
+    for scene in scenes:
+        # 原点の差は float64 で足してから float32 に戻します
+        shift = np.subtract(scene.origin, origin)
+        parts['coords'].append((scene.coords.astype(np.float64) + shift).astype(np.float32))
+        parts['offsets'].append(scene.offsets[1:] + n_vertices)
+        parts['kinds'].append(scene.kinds)
+        remap = np.array([style_index.setdefault((tuple(color), lineweight), len(style_index))
+                          for color, lineweight in zip(scene.colors.tolist(), scene.lineweights.tolist())],
+                         dtype=np.int32)
+        parts['styles'].append(remap[scene.styles] if len(remap) > 0 else scene.styles)
+        parts['op_ids'].append(scene.op_ids + n_ops)
+        runs = scene.runs.copy()
+        runs[:, :2] += n_paths
+        runs[:, 2] = np.where(runs[:, 2] >= 0, runs[:, 2] + len(extras), -1)
+        parts['runs'].append(runs)
+        extras.extend(scene.extras)
+
+        n_vertices += len(scene.coords)
+        n_paths += scene.n_paths
+        n_ops += int(scene.op_ids.max()) + 1 if scene.n_paths > 0 else 0
+
+    arrays = {
+        'coords': np.concatenate(parts['coords']) if scenes else np.zeros((0, 2), dtype=np.float32),
+        'offsets': np.concatenate(parts['offsets']).astype(np.int64),
+        'kinds': np.concatenate(parts['kinds'] or [np.zeros(0)]).astype(np.uint8),
+        'styles': np.concatenate(parts['styles'] or [np.zeros(0)]).astype(np.int32),
+        'op_ids': np.concatenate(parts['op_ids'] or [np.zeros(0)]).astype(np.int32),
+        'colors': np.array([color for color, _ in style_index], dtype=np.float64).reshape(-1, 3),
+        'lineweights': np.array([lineweight for _, lineweight in style_index], dtype=np.int32),
+        'runs': np.concatenate(parts['runs'] or [np.array([(0, 0, -1)])]).astype(np.int64).reshape(-1, 3),
+    }
+    return Scene(arrays, extents, extras, origin)
+
+
+def _compile_op(op: OpenCVOp, tolerance: float) -> Optional[Tuple[int, List[np.ndarray], Tuple, int]]:
+    """(kind, vertex arrays, color, lineweight) of an op, or None if it is not a plain shape"""
+
+    kwargs = op.kwargs
+    color = kwargs.get('color', ((255, 255, 255), S.NO_MAPPING))[0]
+    if len(color) != 3:
+        return None
+
+    if op.func is cv2.line and op.args[0][1] == S.POINT_MAPPING:
+        return PATH_OPEN, [np.array([op.args[0][0][:2], op.args[1][0][:2]])], color, _lineweight(kwargs)
+    elif op.func is cv2.polylines and op.args[0][1] in (S.CURVE_MAPPING, S.SUBPIXEL_MAPPING):
+        kind = PATH_CLOSED if op.args[1][0] else PATH_OPEN
+        return kind, [curve.points(tolerance) for curve in op.args[0][0]], color, _lineweight(kwargs)
+    elif op.func is _draw_pl_op and 'draw_func' not in kwargs:
+        kind = PATH_CLOSED if kwargs.get('is_closed', (False,))[0] else PATH_OPEN
+        return kind, [np.array([v[:2] for v in op.args[0][0]])], color, _lineweight(kwargs)
+    elif op.func is cv2.fillPoly and op.args[0][1] == S.ARRAY_MAPPING:
+        return PATH_FILL, list(op.args[0][0]), color, 0
+    elif op.func is fill_loops:
+        return PATH_FILL, [curve.points(tolerance) for curve in op.args[0][0]], color, 0
+    elif op.func is cv2.circle and kwargs.get('thickness', (None,))[0] == -1 and op.args[1][1] == S.DOT_MAPPING:
+        return PATH_DOT, [np.array([op.args[0][0][:2]])], color, int(op.args[1][0])
+
+    return None
+
+
+def _lineweight(kwargs: Dict[str, Tuple[Any, S]]) -> int:
+    """lineweight of a stroked op. widths given as constants are drawn with the default lineweight"""
+
+    val, status = kwargs.get('thickness', (_stroke.DEFAULT, S.CONSTANT_MAPPING))
+    return int(val) if status == S.LINEWEIGHT_MAPPING else _stroke.DEFAULT
+
+
+def rasterize_scene(scene: Scene, image_size: int, dtype: type = np.float64,
+                    stroke: Optional[StrokePolicy] = None) -> np.ndarray:
+    """draw a scene onto a new canvas. see `rasterize_ops`"""
+
+    shape = get_image_shape(scene.extents, image_size)
+    canvas = np.zeros(shape, dtype=dtype)
+    draw_scene(canvas, scene, stroke=stroke)
+    return canvas
+
+
+def draw_scene(canvas: np.ndarray, scene: Scene, canvas_shape: Optional[Size] = None,
+               stroke: Optional[StrokePolicy] = None) -> None:
+    """draw a scene onto `canvas`, which covers the extents of the scene
+
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    """
+
+    if canvas_shape is None:
+        canvas_shape = canvas.shape
+
+    widths = (stroke or StrokePolicy()).widths(canvas_shape)
+
+    (xmin, ymin), (xmax, ymax) = scene.extents
+    (x0, y0) = scene.origin
+    height, width = canvas.shape[:2]
+    # 原点からの座標を固定小数点の画素座標にするアフィン変換を float64 で一度だけ求め、頂点にまとめて掛けます
+    unit = 1 << SUBPIXEL_SHIFT
+    sx = width / (xmax - xmin) * unit
+    sy = height / (ymax - ymin) * unit
+    tx = ((x0 - xmin) * width / (xmax - xmin) - 0.5) * unit
+    ty = (height - (y0 - ymin) * height / (ymax - ymin) + 0.5) * unit
+    mapped = np.empty(scene.coords.shape, dtype=np.int32)
+    mapped[:, 0] = np.rint(np.multiply(scene.coords[:, 0], sx, dtype=np.float64) + tx)
+    mapped[:, 1] = np.rint(ty - np.multiply(scene.coords[:, 1], sy, dtype=np.float64))
+    paths = np.split(mapped, scene.offsets[1:-1]) if scene.n_paths > 0 else []
+
+    kinds = scene.kinds
+    styles = scene.styles
+    # 種類・色 (塗りつぶしは元のop) が変わる位置で区切ります
+    fills = np.where(kinds == PATH_FILL, scene.op_ids, -1)
+    breaks = np.flatnonzero((np.diff(kinds) != 0) | (np.diff(styles) != 0) | (np.diff(fills) != 0)) + 1
+
+    for start, stop, extra in scene.runs:
+        bounds = [start] + [int(b) for b in breaks[(breaks > start) & (breaks < stop)]] + [stop]
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            if first < last:
+                _draw_group(canvas, paths[first:last], int(kinds[first]), tuple(scene.colors[styles[first]]),
+                            int(scene.lineweights[styles[first]]), widths)
+
+        if extra >= 0:
+            scene.extras[extra](canvas, scene.extents, canvas_shape, stroke=widths)
+
+
+def _draw_group(canvas, paths, kind, color, lineweight, widths) -> None:
+    if kind == PATH_OPEN or kind == PATH_CLOSED:
+        cv2.polylines(canvas, paths, kind == PATH_CLOSED, color, widths.thickness(lineweight), cv2.LINE_8, SUBPIXEL_SHIFT)
+    elif kind == PATH_FILL:
+        cv2.fillPoly(canvas, paths, color, cv2.LINE_8, SUBPIXEL_SHIFT)
+    else:
+        radius = widths.dot_radius(lineweight) << SUBPIXEL_SHIFT
+        for pts in paths:
+            cv2.circle(canvas, (int(pts[0, 0]), int(pts[0, 1])), radius, color, -1, cv2.LINE_8, SUBPIXEL_SHIFT)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""minimal HTTP server rendering dxf files under a root directory
+
+usage::
+
+    python -m dxfvis.server --root ./drawings --port 8080
+    curl 'http://127.0.0.1:8080/render?path=plan.dxf&size=1024' -o plan.png
+
+responses are PNG images. a full queue is answered with 503 and a timeout with 504.
+"""
+
+import argparse
+import asyncio
+import os
+import urllib.parse
+
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+from dxfvis.encode import render_dxf_to_bytes
+from dxfvis.service import QueueFullError
+from dxfvis.service import RenderService
+from dxfvis.service import request_key
+
+
+MAX_IMAGE_SIZE = 16384
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error', 503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+class RenderServer(object):
+    """serve `GET /render?path=...&size=...[&plain=1]` from a `RenderService`"""
+
+    def __init__(self, service: RenderService, root: str) -> None:
+        self.service = service
+        self.root = os.path.realpath(root)
+
+    def _resolve(self, path: str) -> Optional[str]:
+        """map a request path onto a file under the root. None if it escapes the root"""
+
+        full = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([full, self.root]) != self.root:
+            return None
+
+        return full
+
+    async def handle(self, method: str, target: str) -> Tuple[int, Dict[str, str], bytes]:
+        """process one request and return status, headers and body"""
+
+        if method != 'GET':
+            return 405, {}, b''
+
+        url = urllib.parse.urlsplit(target)
+        if url.path != '/render':
+            return 404, {}, b''
+
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            path = query['path'][0]
+            image_size = int(query.get('size', ['1024'])[0])
+            is_plain = query.get('plain', ['0'])[0] in ('1', 'true')
+        except (KeyError, ValueError):
+            return 400, {}, b'path and an integer size are required'
+
+        if not 0 < image_size <= MAX_IMAGE_SIZE:
+            return 400, {}, 'size must be in 1..{}'.format(MAX_IMAGE_SIZE).encode()
+
+        full = self._resolve(path)
+        if full is None or not os.path.isfile(full):
+            return 404, {}, b''
+
+        key = request_key(full, image_size, is_plain, 'png')
+        try:
+            body = await self.service.run(key, render_dxf_to_bytes, full, image_size, is_plain)
+        except QueueFullError:
+            return 503, {'Retry-After': '1'}, b''
+        except asyncio.TimeoutError:
+            return 504, {}, b''
+        except Exception as e:
+            return 500, {}, repr(e).encode()
+
+        return 200, {'Content-Type': 'image/png'}, body
+
+    async def __call__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while True:  # headers are not used
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) != 3:
+                status, headers, body = 400, {}, b''
+            else:
+                status, headers, body = await self.handle(parts[0], parts[1])
+
+            head = ['HTTP/1.1 {} {}'.format(status, REASONS.get(status, '')),
+                    'Content-Length: {}'.format(len(body)),
+                    'Connection: close']
+            head.extend('{}: {}'.format(k, v) for k, v in headers.items())
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(
+        root: str,
+        host: str = '127.0.0.1',
+        port: int = 8080,
+        max_workers: Optional[int] = None,
+        max_queue: int = 64,
+        timeout: Optional[float] = 60.) -> None:
+    """run the server until cancelled"""
+
+    service = RenderService(max_workers=max_workers, max_queue=max_queue, timeout=timeout)
+    async with service:
+        server = await asyncio.start_server(RenderServer(service, root), host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--root', default='.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--max-queue', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=60.)
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.root, args.host, args.port, args.workers, args.max_queue, args.timeout))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
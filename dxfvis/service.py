@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""asyncio front-end for rendering in a bounded process pool"""
+
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import weakref
+
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from dxfvis.render import render_dxf
+
+
+class QueueFullError(RuntimeError):
+    """raised when a request is rejected because too many renders are queued"""
+
+
+class RenderService(object):
+    """run render jobs in a bounded process pool without blocking the event loop
+
+    * at most `max_workers` jobs run at the same time. the rest wait in a queue
+    * jobs beyond `max_queue` (running + waiting) are rejected with `QueueFullError`
+    * concurrent requests with the same key share one job. each of them gets its own array
+    * a request that times out or is cancelled leaves the job to the other waiters,
+      and the job itself is cancelled when nobody waits for it anymore
+    * a job keeps its worker and counts toward `max_queue` until its worker is done with it.
+      a job cancelled while running in a worker is not awaited, but holds them until it finishes there
+    """
+
+    def __init__(
+            self,
+            max_workers: Optional[int] = None,
+            max_queue: int = 64,
+            timeout: Optional[float] = None,
+            mp_context: Optional[Any] = None) -> None:
+        """
+        :param max_workers: number of worker processes. `os.cpu_count()` in default.
+        :param max_queue: maximum number of jobs running or waiting at the same time
+        :param timeout: default timeout in seconds for each request
+        :param mp_context: multiprocessing context of the pool. spawn in default.
+        """
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        if mp_context is None:
+            mp_context = multiprocessing.get_context('spawn')
+
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=mp_context)
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._jobs: Dict[Hashable, Tuple[asyncio.Task, list]] = {}
+        # 待たれなくなっても、ワーカーで実行中のジョブは数えます
+        self._n_jobs = 0
+
+    @property
+    def queue_length(self) -> int:
+        """number of jobs running or waiting, including the cancelled jobs still running in a worker"""
+        return self._n_jobs
+
+    async def run(
+            self,
+            key: Optional[Hashable],
+            func: Callable[..., Any],
+            *args: Any,
+            timeout: Optional[float] = None) -> Any:
+        """run `func(*args)` in the pool and wait for its result
+
+        :param key: requests with an equal key running concurrently share one job. None disables sharing.
+            an array result is copied for every request but the last one to receive it.
+        :param func: picklable function to run in a worker process
+        :param timeout: timeout in seconds. the service default in default.
+        """
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+
+        if key is None:
+            key = object()
+
+        if key in self._jobs:
+            task, waiters = self._jobs[key]
+        else:
+            if self._n_jobs >= self.max_queue:
+                raise QueueFullError('{} renders are already queued'.format(self._n_jobs))
+
+            submitted: list = []
+            task = asyncio.ensure_future(self._execute(func, args, submitted))
+            waiters = []
+            self._jobs[key] = (task, waiters)
+            self._n_jobs += 1
+            task.add_done_callback(functools.partial(self._forget, key, submitted))
+
+        token = object()
+        waiters.append(token)
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+            if len(waiters) > 1 and isinstance(result, np.ndarray):
+                # 同じ配列を渡すと書き換えが他の要求に及ぶので、最後に受け取る要求以外には複製を渡します
+                result = result.copy()
+            return result
+        finally:
+            waiters.remove(token)
+            if not waiters and not task.done():
+                task.cancel()
+
+    async def _execute(self, func: Callable[..., Any], args: Tuple[Any, ...], submitted: list) -> Any:
+        """run a job in a slot. the slot is released when the worker is done with the job, not when this returns
+
+        :param submitted: the future of the executor is appended to this once the job is submitted
+        """
+
+        loop = asyncio.get_running_loop()
+        await self._slots.acquire()
+        try:
+            future = self._executor.submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        submitted.append(future)
+        future.add_done_callback(functools.partial(self._finish_threadsafe, loop))
+        # cancelling this await drops a job that has not started yet.
+        # a job already running in a worker finishes there and its result is discarded.
+        return await asyncio.wrap_future(future)
+
+    def _finish_threadsafe(self, loop: asyncio.AbstractEventLoop, future: concurrent.futures.Future) -> None:
+        """called by the executor when a worker is done with a job"""
+
+        try:
+            loop.call_soon_threadsafe(self._finish)
+        except RuntimeError:
+            pass  # the loop is closed
+
+    def _finish(self) -> None:
+        self._slots.release()
+        self._n_jobs -= 1
+
+    def _forget(self, key: Hashable, submitted: list, task: asyncio.Task) -> None:
+        if self._jobs.get(key, (None,))[0] is task:
+            del self._jobs[key]
+
+        if not submitted:
+            # 実行される前に終わったジョブ
+            self._n_jobs -= 1
+
+        if not task.cancelled():
+            task.exception()  # mark as retrieved
+
+    async def render(
+            self,
+            drawing: str,
+            image_size: int,
+            is_plain: bool = False,
+            timeout: Optional[float] = None,
+            **filters: Any) -> np.ndarray:
+        """render a dxf file in the pool. see `render_dxf` for the parameters.
+        a predicate in `filters` must be picklable, i.e. a function defined at module level"""
+
+        func = functools.partial(render_dxf, **filters) if filters else render_dxf
+        filters_key = _filters_key(filters)
+        # ハッシュできないフィルタの要求は共有しません
+        key = None if filters_key is None else request_key(drawing, image_size, is_plain, filters_key)
+        return await self.run(key, func, os.fspath(drawing), image_size, is_plain, timeout=timeout)
+
+    def close(self, wait: bool = True) -> None:
+        for task, _ in list(self._jobs.values()):
+            task.cancel()
+
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    async def __aenter__(self) -> 'RenderService':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.close(wait=False)
+
+
+def request_key(path: str, *params: Hashable) -> Hashable:
+    """identify a render request. includes mtime so edited files are not shared with older jobs"""
+
+    path = os.path.abspath(os.fspath(path))
+    try:
+        stat = os.stat(path)
+        version: Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        version = (0, 0)
+
+    return (path, version) + params
+
+
+def _filters_key(filters: Dict[str, Any]) -> Optional[Hashable]:
+    """hashable key of the filters, or None if a value cannot be hashed"""
+
+    key = []
+    for name, value in sorted(filters.items()):
+        if isinstance(value, (list, tuple, set)):
+            try:
+                value = tuple(sorted(value))
+            except TypeError:
+                # 並べられない値は、集合ならそのまま、列なら順序ごと比べます
+                value = frozenset(value) if isinstance(value, set) else tuple(value)
+
+        key.append((name, value))
+
+    key = tuple(key)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+
+_default_services: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, RenderService]' = weakref.WeakKeyDictionary()
+
+
+def get_default_service() -> RenderService:
+    """service used by `render_dxf_async`. one per event loop"""
+
+    loop = asyncio.get_running_loop()
+    service = _default_services.get(loop)
+    if service is None:
+        service = RenderService()
+        _default_services[loop] = service
+
+    return service
+
+
+async def render_dxf_async(
+        drawing: str,
+        image_size: int,
+        is_plain: bool = False,
+        timeout: Optional[float] = None,
+        **filters: Any) -> np.ndarray:
+    """render a dxf file in a worker process and return as numpy array
+
+    :param drawing: path for a DXF file
+    :param image_size: maximum edge length of the image to return
+    :param is_plain: see `render_dxf`
+    :param timeout: timeout in seconds. `asyncio.TimeoutError` is raised when exceeded.
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    return await get_default_service().render(drawing, image_size, is_plain, timeout=timeout, **filters)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""hand compiled scenes between processes through shared memory
+
+the arrays of a `Scene` are copied into one shared memory block and a small `SceneHandle`
+(the block name and the layout of the arrays) is what travels between processes. the
+receiving process maps the arrays in place, so they are neither pickled nor copied.
+`render_pipeline` builds a two-stage pipeline on top of it: parser processes compile scenes
+while rasterizer processes draw the scenes compiled before.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import multiprocessing
+import os
+import pickle
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+from typing import Any
+from typing import Iterable
+from typing import Iterator
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+
+from dxfvis.scene import Scene
+from dxfvis.scene import compile_scene
+from dxfvis.scene import rasterize_scene
+from dxfvis.types import BoundingBox
+
+
+# arrays are aligned to this many bytes in the block
+ALIGNMENT = 64
+
+
+class SceneHandle(NamedTuple):
+    """picklable reference to a scene in shared memory"""
+
+    name: str  # name of the shared memory block
+    arrays: Tuple[Tuple[str, str, Tuple[int, ...], int], ...]  # (attribute, dtype, shape, byte offset)
+    extras: Tuple[int, int]  # byte offset and size of the pickled extra ops
+    extents: BoundingBox
+    origin: Tuple[float, float]  # origin of the coordinates. see `Scene`
+
+
+def share_scene(scene: Scene) -> SceneHandle:
+    """copy a scene into a new shared memory block
+
+    the block stays until `unlink_scene` is called with the handle, by this or any other process.
+    """
+
+    extras = pickle.dumps(scene.extras, protocol=pickle.HIGHEST_PROTOCOL)
+    layout = []
+    size = 0
+    for name in Scene.ARRAYS:
+        array = getattr(scene, name)
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+    extras_range = (size, len(extras))
+    size += len(extras)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for name, dtype, shape, offset in layout:
+            np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = getattr(scene, name)
+
+        shm.buf[extras_range[0]:extras_range[0] + len(extras)] = extras
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+
+    shm.close()
+    return SceneHandle(shm.name, tuple(layout), extras_range, scene.extents, scene.origin)
+
+
+@contextlib.contextmanager
+def open_scene(handle: SceneHandle) -> Iterator[Scene]:
+    """map a shared scene. its arrays are views into the block and are valid inside the `with` block only"""
+
+    shm = _attach(handle.name)
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+              for name, dtype, shape, offset in handle.arrays}
+    offset, size = handle.extras
+    scene = Scene(arrays, handle.extents, pickle.loads(shm.buf[offset:offset + size]), handle.origin)
+    del arrays
+    try:
+        yield scene
+    finally:
+        # ビューが残っているとブロックを閉じられません
+        for name in Scene.ARRAYS:
+            setattr(scene, name, None)
+
+        shm.close()
+
+
+def unlink_scene(handle: SceneHandle) -> None:
+    """free the shared memory block of a scene"""
+
+    shm = shared_memory.SharedMemory(name=handle.name)
+    shm.close()
+    shm.unlink()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    # 開くだけのプロセスの resource tracker がブロックを消さないようにします
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def compile_shared_scene(path: str, image_size: int, filters: Optional[dict] = None) -> SceneHandle:
+    """parse and compile a DXF file into shared memory. the first stage of `render_pipeline`"""
+    return share_scene(compile_scene(path, image_size, **(filters or {})))
+
+
+def rasterize_shared_scene(handle: SceneHandle, image_size: int) -> np.ndarray:
+    """draw a shared scene onto a new canvas. the second stage of `render_pipeline`"""
+
+    with open_scene(handle) as scene:
+        return rasterize_scene(scene, image_size)
+
+
+def render_pipeline(
+        paths: Iterable[str],
+        image_size: int,
+        parse_workers: Optional[int] = None,
+        raster_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        mp_context: Optional[Any] = None,
+        **filters: Any) -> Iterator[Tuple[str, np.ndarray]]:
+    """render many DXF files with parsing and rasterization in separate process pools
+
+    a file is drawn as soon as it is compiled while the next files are parsed, so the throughput is
+    bounded by the slower stage rather than by the sum of both. results are yielded in input order.
+
+    :param paths: DXF files to render
+    :param image_size: maximum edge length of the images
+    :param parse_workers: number of parser processes. most of `os.cpu_count()` in default.
+    :param raster_workers: number of rasterizer processes. a quarter of `os.cpu_count()` in default.
+    :param max_pending: maximum number of files in flight, which bounds the shared memory in use.
+        twice the number of workers in default.
+    :param mp_context: multiprocessing context of the pools. spawn in default.
+    :param filters: include_layers, exclude_layers and dxftypes. see `render_dxf`
+
+    :returns iterator of (path, image)
+    """
+
+    cpu_count = os.cpu_count() or 1
+    raster_workers = raster_workers or max(cpu_count // 4, 1)
+    parse_workers = parse_workers or max(cpu_count - raster_workers, 1)
+    max_pending = max_pending or 2 * (parse_workers + raster_workers)
+    if mp_context is None:
+        mp_context = multiprocessing.get_context('spawn')
+
+    with concurrent.futures.ProcessPoolExecutor(parse_workers, mp_context=mp_context) as parsers, \
+            concurrent.futures.ProcessPoolExecutor(raster_workers, mp_context=mp_context) as rasterizers:
+        pending: collections.deque = collections.deque()
+        paths = iter(paths)
+        try:
+            while True:
+                while len(pending) < max_pending:
+                    path = next(paths, None)
+                    if path is None:
+                        break
+
+                    parsed = parsers.submit(compile_shared_scene, path, image_size, filters)
+                    pending.append((path, parsed, _chain(parsed, rasterizers, image_size)))
+
+                if not pending:
+                    break
+
+                path, _, future = pending.popleft()
+                yield path, future.result()
+        finally:
+            # 途中で止めた場合は始まっていない解析を取り消します. 共有メモリは描画後・失敗時に解放されます
+            for _, parsed, _ in pending:
+                parsed.cancel()
+
+
+def _chain(parsed: concurrent.futures.Future, rasterizers: concurrent.futures.Executor,
+           image_size: int) -> concurrent.futures.Future:
+    """future of the image drawn by `rasterizers` from the scene `parsed` is compiling"""
+
+    result: concurrent.futures.Future = concurrent.futures.Future()
+
+    def settle(future: concurrent.futures.Future) -> None:
+        if future.cancelled():
+            result.cancel()
+        elif future.exception() is not None:
+            result.set_exception(future.exception())
+        else:
+            result.set_result(future.result())
+
+    def on_rasterized(future: concurrent.futures.Future, handle: SceneHandle) -> None:
+        unlink_scene(handle)
+        settle(future)
+
+    def on_parsed(future: concurrent.futures.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            settle(future)
+            return
+
+        handle = future.result()
+        try:
+            rasterized = rasterizers.submit(rasterize_shared_scene, handle, image_size)
+        except RuntimeError as e:  # the pool is shut down
+            unlink_scene(handle)
+            result.set_exception(e)
+            return
+
+        rasterized.add_done_callback(lambda f: on_rasterized(f, handle))
+
+    parsed.add_done_callback(on_parsed)
+    return result
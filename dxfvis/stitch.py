@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""stitch LINE entities meeting at their endpoints into polylines
+
+exported plans are often made of many separate LINE entities, each drawn by its own `cv2.line`
+call. consecutive plain line ops of the same style are chained here into polylines, and drawn
+by one `cv2.polylines` call per run. endpoints are grouped by their quantized coordinates and
+the chains are ordered with pointer jumping, so the pass runs in numpy without a python loop
+over the segments.
+"""
+
+import math
+
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import cv2
+import numpy as np
+
+from dxfvis import stroke as _stroke
+from dxfvis.types import OpenCVOp
+from dxfvis.types import VariableStatus as S
+from dxfvis.types import _is_same_kwargs
+
+
+# endpoints closer than this ratio of the extents are joined in default
+RELATIVE_TOLERANCE = 1e-9
+# runs shorter than this are drawn as they are
+MIN_RUN = 2
+
+_PLAIN_KWARGS = {'color', 'thickness', 'lineType'}
+
+
+def stitch_lines(
+        ops: Sequence[Optional[OpenCVOp]],
+        stroke: Optional['_stroke.StrokeWidths'] = None,
+        tolerance: Optional[float] = None) -> List[OpenCVOp]:
+    """replace runs of consecutive plain `cv2.line` ops of one style with a `cv2.polylines` op
+
+    only neighbours are stitched, so the result is drawn in the same order as `ops`.
+    None in `ops` is skipped.
+
+    :param ops: drawing operations built by `collect_ops`
+    :param stroke: line widths the ops are drawn with. lines drawn with the same width are stitched together.
+    :param tolerance: endpoints closer than this (in DXF units) are joined. relative to the extents of each run in default.
+    """
+
+    stitched: List[OpenCVOp] = []
+    run: List[OpenCVOp] = []
+    for op in ops:
+        if op is None:
+            continue
+
+        is_plain = _is_plain_line(op)
+        if is_plain and (not run or _is_same_kwargs(run[0], op, stroke)):
+            run.append(op)
+            continue
+
+        _flush(stitched, run, tolerance)
+        run = [op] if is_plain else []
+        if not is_plain:
+            stitched.append(op)
+
+    _flush(stitched, run, tolerance)
+    return stitched
+
+
+def _is_plain_line(op: OpenCVOp) -> bool:
+    return (op.func is cv2.line and op.args[0][1] == S.POINT_MAPPING and op.args[1][1] == S.POINT_MAPPING
+            and op.kwargs.keys() <= _PLAIN_KWARGS)
+
+
+def _flush(stitched: List[OpenCVOp], run: List[OpenCVOp], tolerance: Optional[float]) -> None:
+    if len(run) < MIN_RUN:
+        stitched.extend(run)
+        return
+
+    segments = np.array([(op.args[0][0][:2], op.args[1][0][:2]) for op in run], dtype=np.float64)
+    vertices, offsets = chain_segments(segments, tolerance)
+    offsets = offsets.tolist()
+    chains = [vertices[start:stop] for start, stop in zip(offsets[:-1], offsets[1:])]
+    stitched.append(OpenCVOp(cv2.polylines,
+                             args=((chains, S.ARRAY_MAPPING), (False, S.NO_MAPPING)),
+                             kwargs=dict(run[0].kwargs),
+                             merge_arg=0))
+
+
+def chain_segments(segments: np.ndarray, tolerance: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """chain segments meeting at their endpoints into polylines
+
+    an endpoint shared by exactly two segments joins them. at endpoints shared by more segments the
+    chains stop, and closed loops are cut at one of their vertices, so every segment is in exactly one chain.
+
+    :param segments: (N, 2, 2) array of (start, end) points
+    :param tolerance: endpoints closer than this are joined. relative to the extents in default.
+    :returns (V, 2) vertices of the chains and (C + 1,) offsets of the chains in the vertices
+    """
+
+    n_ends = 2 * len(segments)
+    if n_ends == 0:
+        return np.zeros((0, 2)), np.zeros(1, dtype=np.int64)
+
+    # 端点 k は線分 k // 2 の始点 (偶数) または終点 (奇数) です
+    pts = segments.reshape(-1, 2)
+    ends = np.arange(n_ends)
+    mate = _mate_ends(pts, tolerance)
+
+    # 閉じた鎖は端点番号が最小の頂点で切ります. 逆向きの鎖と合わせて最小のものを選びます
+    succ = mate[ends ^ 1]
+    is_cycle, low = _find_cycles(succ)
+    cuts = ends[is_cycle & (np.minimum(low, low[ends ^ 1]) == ends)]
+    mate[mate[cuts]] = -1
+    mate[cuts] = -1
+
+    # 各端点から鎖の終わりまでの距離と終わりの端点を求めます
+    succ = mate[ends ^ 1]
+    tail, dist = _rank(succ)
+
+    # 鎖は両方向に辿られるので、終わりの端点番号が小さい方向だけを残します
+    kept = ends[tail < tail[ends ^ 1]]
+    kept = kept[np.lexsort((-dist[kept], tail[kept]))]
+    stops = np.flatnonzero(np.diff(tail[kept]) != 0) + 1
+    stops = np.append(stops, len(kept))
+
+    vertices = np.insert(pts[kept], stops, pts[kept[stops - 1] ^ 1], axis=0)
+    offsets = np.concatenate([[0], stops + np.arange(1, len(stops) + 1)]).astype(np.int64)
+    return vertices, offsets
+
+
+def _mate_ends(pts: np.ndarray, tolerance: Optional[float]) -> np.ndarray:
+    """the other end at the same point for endpoints shared by exactly two segments, otherwise -1"""
+
+    origin = pts.min(axis=0)
+    if tolerance is None:
+        tolerance = max(float((pts.max(axis=0) - origin).max()), 1.) * RELATIVE_TOLERANCE
+
+    # 量子化した座標で並べ、同じ座標の端点をまとめます
+    keys = np.floor((pts - origin) / tolerance + 0.5).astype(np.int64)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    keys = keys[order]
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = np.any(keys[1:] != keys[:-1], axis=1)
+    firsts = np.flatnonzero(is_first)
+    counts = np.diff(np.append(firsts, len(order)))
+
+    pairs = firsts[counts == 2]
+    mate = np.full(len(order), -1, dtype=np.int64)
+    mate[order[pairs]] = order[pairs + 1]
+    mate[order[pairs + 1]] = order[pairs]
+    return mate
+
+
+def _find_cycles(succ: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """whether each element is on a cycle of `succ`, and the smallest element reachable from it"""
+
+    low = np.arange(len(succ))
+    nxt = succ.copy()
+    for _ in range(_n_jumps(len(succ))):
+        has = np.flatnonzero(nxt >= 0)
+        if len(has) == 0:
+            break
+
+        low[has] = np.minimum(low[has], low[nxt[has]])
+        nxt[has] = nxt[nxt[has]]
+
+    return nxt >= 0, low
+
+
+def _rank(succ: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """last element and the number of steps to it, following `succ` (-1 at the end) from each element"""
+
+    reach = np.where(succ >= 0, succ, np.arange(len(succ)))
+    dist = (succ >= 0).astype(np.int64)
+    nxt = succ.copy()
+    for _ in range(_n_jumps(len(succ))):
+        has = np.flatnonzero(nxt >= 0)
+        if len(has) == 0:
+            break
+
+        forward = nxt[has]
+        reach[has] = reach[forward]
+        dist[has] += dist[forward]
+        nxt[has] = nxt[forward]
+
+    return reach, dist
+
+
+def _n_jumps(n: int) -> int:
+    return max(int(math.ceil(math.log2(max(n, 2)))) + 1, 1)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""line widths: DXF lineweights (group code 370, in 1/100 mm) -> pixels
+
+ops keep the lineweight of their entity (`VariableStatus.LINEWEIGHT_MAPPING`), and a render maps
+it to pixels through one `StrokeWidths`, which resolves each lineweight once. lineweights drawn
+with the same width are merged into one call by `merge_ops`, so widths also act as batching keys.
+"""
+
+import functools
+
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+
+Size = Tuple[int, ...]
+
+# special lineweights
+BYLAYER = -1
+BYBLOCK = -2
+DEFAULT = -3
+# lineweight drawn for DEFAULT ($LWDEFAULT of AutoCAD)
+DEFAULT_LINEWEIGHT = 25
+
+# 既定では、既定の線の太さを画像の長辺の1/700 (点の半径は1/900) で描画します
+_LINE_DIVISOR = 700
+_DOT_DIVISOR = 900
+
+
+class StrokePolicy(object):
+    """how lineweights are drawn
+
+    in default, widths follow the image size: the default lineweight is drawn max(H, W) / 700 pixels
+    wide and the others in proportion. with `px_per_mm`, lineweights are drawn at that print scale.
+    """
+
+    def __init__(
+            self,
+            px_per_mm: Optional[float] = None,
+            min_width: int = 1,
+            max_width: Optional[int] = None,
+            default_lineweight: int = DEFAULT_LINEWEIGHT) -> None:
+        """
+        :param px_per_mm: pixels per millimeter of lineweight. relative to the image size in default.
+        :param min_width: width of the thinnest lines (lineweight 0) in pixels
+        :param max_width: upper limit of widths in pixels
+        :param default_lineweight: lineweight of DEFAULT (and BYBLOCK), in 1/100 mm
+        """
+        self.px_per_mm = px_per_mm
+        self.min_width = min_width
+        self.max_width = max_width
+        self.default_lineweight = default_lineweight
+
+    def widths(self, canvas_shape: Size, scale: int = 1) -> 'StrokeWidths':
+        """widths for a canvas of `canvas_shape`
+
+        :param scale: multiply the widths by this, for canvases in sub-pixel units
+        """
+        return StrokeWidths(self, canvas_shape, scale)
+
+    def width(self, lineweight: int, canvas_shape: Size, dot: bool = False) -> float:
+        """line width (or dot radius) in pixels before rounding"""
+
+        if lineweight < 0:
+            lineweight = self.default_lineweight
+
+        divisor = _DOT_DIVISOR if dot else _LINE_DIVISOR
+        if self.px_per_mm is None:
+            return max(canvas_shape[:2]) * lineweight / (DEFAULT_LINEWEIGHT * divisor)
+
+        return lineweight / 100 * self.px_per_mm * _LINE_DIVISOR / divisor
+
+
+class StrokeWidths(object):
+    """widths of one render. each lineweight is resolved once"""
+
+    def __init__(self, policy: StrokePolicy, canvas_shape: Size, scale: int = 1) -> None:
+        self.policy = policy
+        self.canvas_shape = canvas_shape
+        self.scale = scale
+        self._thickness: Dict[int, int] = {}
+        self._dot_radius: Dict[int, int] = {}
+
+    def thickness(self, lineweight: int) -> int:
+        """line width in pixels"""
+
+        thickness = self._thickness.get(lineweight)
+        if thickness is None:
+            thickness = self._clip(int(self.policy.width(lineweight, self.canvas_shape)))
+            self._thickness[lineweight] = thickness
+
+        return thickness
+
+    def dot_radius(self, lineweight: int) -> int:
+        """radius of dots (POINT and 0 length dashes) in pixels"""
+
+        radius = self._dot_radius.get(lineweight)
+        if radius is None:
+            radius = self._clip(int(self.policy.width(lineweight, self.canvas_shape, dot=True)))
+            self._dot_radius[lineweight] = radius
+
+        return radius
+
+    def _clip(self, width: int) -> int:
+        width = max(width, self.policy.min_width)
+        if self.policy.max_width is not None:
+            width = min(width, self.policy.max_width)
+
+        return width * self.scale
+
+
+_default_policy = StrokePolicy()
+
+
+@functools.lru_cache(maxsize=64)
+def _default_widths(max_size: int) -> StrokeWidths:
+    return _default_policy.widths((max_size, max_size))
+
+
+def default_widths(canvas_shape: Size) -> StrokeWidths:
+    """widths of the default policy for a canvas of `canvas_shape`"""
+    return _default_widths(max(canvas_shape[:2]))
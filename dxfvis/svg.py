@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""export dxf files as SVG, from the same drawing operations as the raster renderer
+
+the document is written while the ops are built, `ENTITY_CHUNK` entities at a time, and is never
+held in memory; the extents are known before, from the header or a pass over the bounding boxes of
+the entities drawn when they are filtered.
+a block is written once as a `<symbol>` and placed with `<use>` for each INSERT/DIMENSION referring
+to it, and consecutive pieces of the same style are merged into one `<path>`. coordinates are written
+as integers in units of 1/`quantization` pixel.
+"""
+
+import itertools
+import warnings
+
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import TextIO
+from typing import Tuple
+from typing import Union
+from typing import TYPE_CHECKING
+
+import cv2
+import numpy as np
+
+from dxfvis import util
+from dxfvis.draw_funcs.hatch import fill_loops
+from dxfvis.draw_funcs.hatch import hatch_segments
+from dxfvis.draw_funcs.hatch import pattern_hatch
+from dxfvis.draw_funcs.line import pattern_line
+from dxfvis.draw_funcs.line import textured_line
+from dxfvis.draw_funcs.polyline import _draw_pl_op
+from dxfvis.draw_funcs.polyline import pattern_polyline
+from dxfvis.draw_funcs.polyline import textured_polyline
+from dxfvis.order import sort_entities
+from dxfvis.progressive import quick_bbox
+from dxfvis.render import build_entity_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import header_extents
+from dxfvis.render import load_drawing
+from dxfvis.render import make_entity_filter
+from dxfvis.render import union_bboxes
+from dxfvis.stroke import StrokePolicy
+from dxfvis.stroke import StrokeWidths
+from dxfvis.types import BoundingBox
+from dxfvis.types import OpenCVOp
+from dxfvis.types import Size
+from dxfvis.types import VariableStatus as S
+from dxfvis.types import merge_ops
+
+if TYPE_CHECKING:
+    from ezdxf.drawing import Drawing
+    from ezdxf.legacy.graphics import GraphicEntity
+
+
+# a <path> is written out when its data grows over this many characters
+MAX_PATH_LENGTH = 65536
+# number of LINE entities mapped and formatted at once
+LINE_CHUNK = 8192
+# number of entities built and written at once
+ENTITY_CHUNK = 32768
+
+
+def write_svg(
+        drawing: Union[str, 'Drawing'],
+        file: Union[str, TextIO],
+        image_size: int = 1024,
+        quantization: int = 8,
+        background: Optional[Tuple[int, int, int]] = (0, 0, 0),
+        stroke: Optional[StrokePolicy] = None,
+        extents: Optional[BoundingBox] = None,
+        **filters: Any) -> None:
+    """write a dxf file as SVG
+
+    the drawing is written in an image of `image_size` pixels. line widths, patterns and hatches
+    follow the raster output. the ops are built and written `ENTITY_CHUNK` entities at a time, so
+    the memory does not grow with the number of entities.
+    convert the result with a standard tool (e.g. cairosvg, inkscape) to get PDF.
+
+    :param drawing: path or object for a DXF file
+    :param file: path or text file to write to
+    :param image_size: maximum edge length of the image in pixels
+    :param quantization: coordinates are rounded to 1/quantization pixel
+    :param background: RGB color of the background. None for transparent.
+    :param stroke: how lineweights are drawn. see `render_dxf`
+    :param extents: extents of the image in DXF coordinates. $EXTMIN / $EXTMAX of the header in default,
+        when no filter is given. otherwise the bounding boxes of the entities drawn are read first,
+        without keeping their ops.
+    :param filters: include_layers, exclude_layers, dxftypes and predicate. see `render_dxf`
+    """
+
+    drawing = load_drawing(drawing)
+    is_drawn = make_entity_filter(drawing, **filters)
+    blocks = _used_blocks(drawing, is_drawn)
+    if extents is None and all(value is None for value in filters.values()):
+        # ヘッダの範囲は絞り込む前の図面全体の範囲なので、絞り込む時は使いません
+        extents = header_extents(drawing)
+    dxf_space = extents or _scan_extents(drawing, is_drawn, blocks)
+    height, width = get_image_shape(dxf_space, image_size)[:2]
+    # 線の太さは画像の画素で決め、座標と同じ単位 (1/quantization 画素) で書き出します
+    widths = (stroke or StrokePolicy()).widths((height, width), scale=quantization)
+
+    if isinstance(file, str):
+        with open(file, 'w', encoding='utf-8') as f:
+            _write_document(f, drawing, is_drawn, blocks, dxf_space, (height, width), quantization, background, widths)
+    else:
+        _write_document(file, drawing, is_drawn, blocks, dxf_space, (height, width), quantization, background, widths)
+
+
+def _walk(drawing: 'Drawing', is_drawn: Callable[['GraphicEntity'], bool]) -> Iterator[Union['GraphicEntity', str]]:
+    """entities of the modelspace drawn in draw order (see `dxfvis.order`), and the block name of each INSERT/DIMENSION"""
+
+    for entity in sort_entities(drawing.modelspace()):
+        dxftype = entity.dxftype()
+        if dxftype not in ('INSERT', 'DIMENSION'):
+            if is_drawn(entity):
+                yield entity
+            continue
+
+        key = 'name' if dxftype == 'INSERT' else 'geometry'
+        if key not in entity.dxfattribs():
+            warnings.warn('No block for {} ENTITY'.format(dxftype))
+            continue
+
+        yield entity.get_dxf_attrib(key)
+
+
+def _used_blocks(drawing: 'Drawing', is_drawn: Callable[['GraphicEntity'], bool]) -> Dict[str, List['GraphicEntity']]:
+    """block name -> entities of the block drawn, in draw order, for the blocks referred to from the modelspace"""
+
+    blocks: Dict[str, List['GraphicEntity']] = {}
+    for entity in sort_entities(drawing.modelspace()):
+        dxftype = entity.dxftype()
+        if dxftype not in ('INSERT', 'DIMENSION'):
+            continue
+
+        name = entity.get_dxf_attrib('name' if dxftype == 'INSERT' else 'geometry', None)
+        if name is not None and name not in blocks:
+            block = drawing.blocks.get(name)
+            blocks[name] = [] if block is None else [e for e in sort_entities(block) if is_drawn(e)]
+
+    return blocks
+
+
+def _scan_extents(
+        drawing: 'Drawing',
+        is_drawn: Callable[['GraphicEntity'], bool],
+        blocks: Dict[str, List['GraphicEntity']]) -> BoundingBox:
+    """extents of the entities drawn. the boxes are read from the attributes where `quick_bbox` can,
+    and the other entities are built in chunks whose ops are dropped"""
+
+    boxes: List[Optional[BoundingBox]] = []
+    chunk: List['GraphicEntity'] = []
+    entities = itertools.chain((item for item in _walk(drawing, is_drawn) if not isinstance(item, str)),
+                               *blocks.values())
+    for entity in entities:
+        box = quick_bbox(entity)
+        if box is not None:
+            boxes.append(box)
+        else:
+            chunk.append(entity)
+
+        if len(chunk) >= ENTITY_CHUNK or len(boxes) >= ENTITY_CHUNK:
+            # 範囲だけを残します
+            boxes = [union_bboxes(boxes + [rep[1] for rep in build_entity_ops(chunk, drawing) if rep is not None])]
+            chunk = []
+
+    boxes.extend(rep[1] for rep in build_entity_ops(chunk, drawing) if rep is not None)
+    return get_extents([(None, box) for box in boxes if box is not None])
+
+
+def _write_document(file, drawing, is_drawn, blocks, dxf_space, shape, quantization, background, widths) -> None:
+    height, width = shape
+    writer = _PathWriter(file, quantization)
+    virtual_shape = (height * quantization, width * quantization)
+
+    def write_entities(entities: List['GraphicEntity']) -> None:
+        for i in range(0, len(entities), ENTITY_CHUNK):
+            reps = build_entity_ops(entities[i:i + ENTITY_CHUNK], drawing)
+            _write_ops(writer, [rep[0] for rep in reps if rep is not None], dxf_space, virtual_shape, widths)
+
+    file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    file.write('<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+               'width="{}" height="{}" viewBox="0 0 {} {}">\n'.format(width, height, virtual_shape[1], virtual_shape[0]))
+    if background is not None:
+        file.write('<rect width="100%" height="100%" fill="{}"/>\n'.format(_hex(background)))
+
+    file.write('<g stroke-linecap="round" stroke-linejoin="round" fill-rule="evenodd">\n')
+
+    # 使われるブロックを一度だけ書き出します
+    ids = {}
+    used = [name for name, entities in blocks.items() if entities]
+    if used:
+        file.write('<defs>\n')
+        for name in used:
+            ids[name] = 'b{}'.format(len(ids))
+            file.write('<symbol id="{}" overflow="visible">\n'.format(ids[name]))
+            write_entities(blocks[name])
+            writer.flush()
+            file.write('</symbol>\n')
+
+        file.write('</defs>\n')
+
+    chunk: List['GraphicEntity'] = []
+    for item in _walk(drawing, is_drawn):
+        if not isinstance(item, str):
+            chunk.append(item)
+            if len(chunk) >= ENTITY_CHUNK:
+                write_entities(chunk)
+                chunk = []
+        elif item in ids:
+            write_entities(chunk)
+            chunk = []
+            writer.write('<use xlink:href="#{}"/>\n'.format(ids[item]))
+
+    write_entities(chunk)
+    writer.flush()
+    file.write('</g>\n</svg>\n')
+
+
+class _PathWriter(object):
+    """merge consecutive path data of the same style into one <path> element"""
+
+    def __init__(self, file: TextIO, scale: int) -> None:
+        self.file = file
+        self.scale = scale
+        self.style: Optional[str] = None
+        self.chunks: List[str] = []
+        self.length = 0
+
+    def add(self, style: str, data: str) -> None:
+        if style != self.style:
+            self.flush()
+            self.style = style
+
+        self.chunks.append(data)
+        self.length += len(data)
+        if self.length > MAX_PATH_LENGTH:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.chunks:
+            self.file.write('<path {} d="{}"/>\n'.format(self.style, ''.join(self.chunks)))
+            self.chunks = []
+            self.length = 0
+
+    def write(self, text: str) -> None:
+        self.flush()
+        self.file.write(text)
+
+    def stroke(self, color, thickness, pattern: Optional[Sequence[float]] = None) -> str:
+        style = 'fill="none" stroke="{}" stroke-width="{}"'.format(_hex(color), max(int(thickness), 1))
+        if pattern is not None:
+            dashes = _dasharray(pattern)
+            if dashes is not None:
+                style += ' stroke-dasharray="{}"'.format(dashes)
+
+        return style
+
+
+def _write_ops(writer: _PathWriter, ops: List[OpenCVOp], dxf_space: BoundingBox, shape: Size,
+               widths: StrokeWidths) -> None:
+    """write ops mapped onto a canvas of `shape`, with line widths in the units of `shape`"""
+
+    ops = merge_ops(ops, widths)
+    i = 0
+    while i < len(ops):
+        op = ops[i]
+        if op.func is cv2.line and _is_plain_line(op):
+            # 同じ色・太さの線分をまとめて書き出します
+            j = i + 1
+            while j < len(ops) and ops[j].func is cv2.line and ops[j].kwargs == op.kwargs and _is_plain_line(ops[j]):
+                j += 1
+
+            _write_lines(writer, ops[i:j], dxf_space, shape, widths)
+            i = j
+            continue
+
+        write_func = _writers.get(op.func)
+        if write_func is None:
+            warnings.warn('{} is not exported to SVG'.format(getattr(op.func, '__name__', op.func)))
+        else:
+            args, kwargs = op.map_args(shape, dxf_space, subpixel=False, stroke=widths)
+            write_func(writer, *args, **kwargs)
+
+        i += 1
+
+
+def _is_plain_line(op: OpenCVOp) -> bool:
+    return op.args[0][1] == S.POINT_MAPPING and op.args[1][1] == S.POINT_MAPPING
+
+
+def _write_lines(writer: _PathWriter, ops: List[OpenCVOp], dxf_space: BoundingBox, shape: Size,
+                 widths: StrokeWidths) -> None:
+    """write cv2.line ops of the same style, mapping their points at once"""
+
+    _, kwargs = ops[0].map_args(shape, dxf_space, subpixel=False, stroke=widths)
+    style = writer.stroke(kwargs['color'], kwargs.get('thickness', 1))
+    extmin, extmax = dxf_space
+    for i in range(0, len(ops), LINE_CHUNK):
+        chunk = ops[i:i + LINE_CHUNK]
+        pts = np.array([(op.args[0][0][:2], op.args[1][0][:2]) for op in chunk], dtype=np.float64)
+        mapped = OpenCVOp._map_array(pts, extmin, extmax, shape)
+        writer.add(style, ('M%d %dL%d %d' * len(chunk)) % tuple(mapped.ravel().tolist()))
+
+
+def _path_data(polylines: Sequence[np.ndarray], is_closed: bool = False) -> str:
+    """path data of polylines in canvas coordinates"""
+
+    polylines = [p for p in polylines if len(p) > 0]
+    if not polylines:
+        return ''
+
+    end = 'Z' if is_closed else ''
+    fmt = ''.join('M%d %d' + ' %d %d' * (len(p) - 1) + end for p in polylines)
+    return fmt % tuple(np.concatenate(polylines).reshape(-1).tolist())
+
+
+def _dasharray(pattern: Sequence[float]) -> Optional[str]:
+    """stroke-dasharray of a DXF pattern (total length, then + for lines, - for blanks and 0 for dots).
+    dots are drawn as dashes of zero length with round caps"""
+
+    dashes: List[float] = []
+    for p in pattern[1:]:
+        is_blank = p < 0
+        if len(dashes) % 2 == int(is_blank):
+            dashes.append(abs(p))
+        elif dashes:
+            dashes[-1] += abs(p)
+        else:
+            # 空白から始まるパターン
+            dashes.extend([0, abs(p)])
+
+    if len(dashes) % 2 == 1:
+        dashes.append(0)
+
+    if sum(dashes[1::2]) <= 0:
+        return None
+
+    return ' '.join('{:d}'.format(int(round(d))) for d in dashes)
+
+
+def _hex(color: Sequence[float]) -> str:
+    return '#{:02x}{:02x}{:02x}'.format(*[min(max(int(c), 0), 255) for c in (tuple(color) * 3)[:3]])
+
+
+def _write_line(writer, pt1, pt2, color, thickness=1, lineType=None, shift=0):
+    writer.add(writer.stroke(color, thickness), 'M%d %dL%d %d' % (pt1[0], pt1[1], pt2[0], pt2[1]))
+
+
+def _write_polylines(writer, pts, isClosed, color, thickness=1, lineType=None, shift=0):
+    writer.add(writer.stroke(color, thickness), _path_data(pts, isClosed))
+
+
+def _write_fill(writer, pts, color, lineType=None, shift=0, offset=None):
+    writer.add('fill="{}"'.format(_hex(color)), _path_data(pts, True))
+
+
+def _write_circle(writer, center, radius, color, thickness=1, lineType=None, shift=0):
+    x, y = center[0], center[1]
+    if thickness < 0:
+        # 塗りつぶした円は丸い端点を持つ長さ0の線として書き出します
+        writer.add('fill="none" stroke="{}" stroke-width="{}"'.format(_hex(color), max(2 * radius, 1)), 'M%d %dh0' % (x, y))
+    else:
+        writer.add(writer.stroke(color, thickness),
+                   'M%d %da%d %d 0 1 0 %d 0a%d %d 0 1 0 %d 0' % (x - radius, y, radius, radius, 2 * radius, radius, radius, -2 * radius))
+
+
+def _write_pl_op(writer, vertices, color, thickness, is_closed=False, draw_func=cv2.line, **kwargs):
+    pts = np.array(vertices, dtype=np.int64).reshape(-1, 2)
+    if draw_func is cv2.line:
+        writer.add(writer.stroke(color, thickness), _path_data([pts], is_closed))
+        return
+
+    if draw_func is textured_line:
+        pattern = util.approx_pattern_string(kwargs['pattern_string'], kwargs['pattern_length'])
+    else:
+        pattern = kwargs['pattern']
+
+    # _draw_pl_op と同じく、パターンは各辺の終点側の頂点から始まります
+    segments = [np.stack([pts[i], pts[i - 1]]) for i in range(1, len(pts))]
+    if is_closed and len(pts) > 1:
+        segments.append(np.stack([pts[0], pts[-1]]))
+
+    writer.add(writer.stroke(color, thickness, pattern), _path_data(segments))
+
+
+def _write_pattern_line(writer, pt1, pt2, pattern, color=(255, 255, 255), thickness=10, dot_radius=4):
+    writer.add(writer.stroke(color, thickness, pattern), 'M%d %dL%d %d' % (pt1[0], pt1[1], pt2[0], pt2[1]))
+
+
+def _write_textured_line(writer, pt1, pt2, pattern_string, pattern_length, color=(255, 255, 255), thickness=10, font=None):
+    pattern = util.approx_pattern_string(pattern_string, pattern_length)
+    _write_pattern_line(writer, pt1, pt2, pattern, color, thickness)
+
+
+def _write_pattern_polyline(writer, vertices, pattern, is_closed=False, color=(255, 255, 255), thickness=10, dot_radius=4):
+    writer.add(writer.stroke(color, thickness, pattern), _path_data([vertices], is_closed))
+
+
+def _write_textured_polyline(writer, vertices, pattern_string, pattern_length, is_closed=False,
+                             color=(255, 255, 255), thickness=10):
+    pattern = util.approx_pattern_string(pattern_string, pattern_length)
+    _write_pattern_polyline(writer, vertices, pattern, is_closed, color, thickness)
+
+
+def _write_fill_loops(writer, loops, color=(255, 255, 255)):
+    _write_fill(writer, loops, color)
+
+
+def _write_pattern_hatch(writer, loops, base_points, pattern_lines, px_per_unit, color=(255, 255, 255),
+                         thickness=1, tone=True):
+    # 線を描くか塗りつぶすかは画像の画素で判断します
+    scale = writer.scale
+    segments, coverage = hatch_segments(
+        [loop / scale for loop in loops], base_points / scale, pattern_lines, px_per_unit / scale, thickness / scale)
+    if segments is None:
+        style = 'fill="{}"'.format(_hex(color))
+        if tone and coverage < 1:
+            style += ' fill-opacity="{:.3f}"'.format(coverage)
+
+        writer.add(style, _path_data(loops, True))
+    elif len(segments) > 0:
+        writer.add(writer.stroke(color, thickness), _path_data(list(np.rint(segments * scale))))
+
+
+_writers: Dict[Callable, Callable] = {
+    cv2.line: _write_line,
+    cv2.polylines: _write_polylines,
+    cv2.fillPoly: _write_fill,
+    cv2.circle: _write_circle,
+    _draw_pl_op: _write_pl_op,
+    pattern_line: _write_pattern_line,
+    textured_line: _write_textured_line,
+    pattern_polyline: _write_pattern_polyline,
+    textured_polyline: _write_textured_polyline,
+    fill_loops: _write_fill_loops,
+    pattern_hatch: _write_pattern_hatch,
+}
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+"""flatten curves (arcs, ellipses, bulges, NURBS splines) into vertex arrays
+
+the number of vertices is chosen from a chord-error tolerance, so a curve drawn at thumbnail size
+gets only a few vertices while the same curve in a large image stays smooth. ops keep a `Curve`
+and flatten it when they are drawn, with the tolerance of `TOLERANCE` pixels converted to DXF units.
+"""
+
+import math
+
+from typing import Callable
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+import numpy as np
+
+
+# maximum distance between a curve and its chords in pixels
+TOLERANCE = 0.5
+# limits of the vertex count of one curve (per arc of a bulged polyline)
+MIN_SEGMENTS = 1
+MAX_SEGMENTS = 4096
+
+
+class Curve(object):
+    """curve flattened on demand. the results are cached per tolerance
+
+    tolerances are rounded down to quarter octaves, so renders at nearby scales share vertices::
+
+        curve = Curve(flatten_ellipse, center, major_axis, ratio, 0, 2 * math.pi)
+        points = curve.points(0.01)  # (N, 2) float64 in DXF units
+    """
+
+    def __init__(self, func: Callable[..., np.ndarray], *args) -> None:
+        self.func = func
+        self.args = args
+        self._cache: Dict[Optional[int], np.ndarray] = {}
+        self._bbox = None
+
+    def points(self, tolerance: Optional[float]) -> np.ndarray:
+        """vertices whose chord error does not exceed `tolerance` (in DXF units). None for a coarse, fixed resolution"""
+
+        if tolerance is None or not 0 < tolerance < math.inf:
+            key = None
+            tolerance = None
+        else:
+            key = math.floor(math.log2(tolerance) * 4)
+            tolerance = 2 ** (key / 4)
+
+        pts = self._cache.get(key)
+        if pts is None:
+            pts = self.func(*self.args, tolerance=tolerance)
+            self._cache[key] = pts
+
+        return pts
+
+    def bbox(self) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+        """bounding box of the curve"""
+
+        if self._bbox is None:
+            # a coarse flattening is enough to find the extents
+            pts = self.points(None)
+            if len(pts) == 0:
+                self._bbox = ((0., 0.), (0., 0.))
+            else:
+                xmin, ymin = pts.min(axis=0)
+                xmax, ymax = pts.max(axis=0)
+                self._bbox = ((float(xmin), float(ymin)), (float(xmax), float(ymax)))
+
+        return self._bbox
+
+
+def arc_segments(radius: float, sweep: float, tolerance: Optional[float]) -> int:
+    """number of chords approximating an arc of `radius` and `sweep` (radian) within `tolerance`
+
+    `tolerance` of None gives a fixed resolution of 64 segments per turn"""
+
+    sweep = abs(sweep)
+    if tolerance is None:
+        n = math.ceil(sweep / (2 * math.pi) * 64)
+    elif radius <= tolerance:
+        n = MIN_SEGMENTS
+    else:
+        # a chord spanning `step` deviates from the arc by radius * (1 - cos(step / 2))
+        step = 2 * math.acos(1 - tolerance / radius)
+        n = math.ceil(sweep / step)
+
+    return int(min(max(n, MIN_SEGMENTS), MAX_SEGMENTS))
+
+
+def flatten_arc(
+        center: Sequence[float],
+        radius: float,
+        start_angle: float,
+        sweep: float,
+        tolerance: Optional[float] = None) -> np.ndarray:
+    """円弧を頂点の配列に変換します. 角度はラジアンで、`sweep` が負の場合は時計回りです"""
+
+    n = arc_segments(radius, sweep, tolerance)
+    angles = start_angle + np.arange(n + 1) * (sweep / n)
+    pts = np.empty((n + 1, 2))
+    pts[:, 0] = np.cos(angles)
+    pts[:, 1] = np.sin(angles)
+    pts *= radius
+    pts += center[:2]
+    return pts
+
+
+def arc_bbox(
+        center: Sequence[float],
+        radius: float,
+        start_angle: float,
+        sweep: float) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """bounding box of an arc. angles in radian"""
+
+    if sweep < 0:
+        start_angle, sweep = start_angle + sweep, -sweep
+
+    # 端点と、弧に含まれる軸方向の極値
+    angles = [start_angle, start_angle + sweep]
+    first = math.ceil(start_angle / (math.pi / 2))
+    angles.extend(k * math.pi / 2 for k in range(first, first + 4) if k * math.pi / 2 <= start_angle + sweep)
+    xs = [center[0] + radius * math.cos(a) for a in angles]
+    ys = [center[1] + radius * math.sin(a) for a in angles]
+    return (min(xs), min(ys)), (max(xs), max(ys))
+
+
+def flatten_ellipse(
+        center: Sequence[float],
+        major_axis: Sequence[float],
+        ratio: float,
+        start_param: float,
+        end_param: float,
+        tolerance: Optional[float] = None) -> np.ndarray:
+    """楕円弧を頂点の配列に変換します. パラメータはラジアンで、常に反時計回りです"""
+
+    sweep = (end_param - start_param) % (2 * math.pi)
+    if sweep == 0:
+        sweep = 2 * math.pi
+
+    major = np.asarray(major_axis[:2], dtype=np.float64)
+    minor = np.array([-major[1], major[0]]) * ratio
+    # パラメータで等分した点の弦の誤差は最大で a·Δt²/8 なので、長軸の長さを半径とする円と同じ数で足ります
+    n = arc_segments(float(np.hypot(*major)), sweep, tolerance)
+    params = start_param + np.linspace(0, sweep, n + 1)
+    return np.asarray(center[:2], dtype=np.float64) + np.outer(np.cos(params), major) + np.outer(np.sin(params), minor)
+
+
+def flatten_bulges(
+        vertices: Sequence[Sequence[float]],
+        bulges: Sequence[float],
+        is_closed: bool = False,
+        tolerance: Optional[float] = None) -> np.ndarray:
+    """bulge付きのポリラインを頂点の配列に変換します. `bulges[i]` は i 番目の頂点から始まる辺の値です"""
+
+    pts = np.asarray(vertices, dtype=np.float64)[:, :2]
+    bulges = np.asarray(bulges, dtype=np.float64)
+    if len(pts) < 2:
+        return pts
+
+    ends = np.roll(pts, -1, axis=0)
+    n_edges = len(pts) if is_closed else len(pts) - 1
+    result = []
+    for i in range(n_edges):
+        result.append(pts[i:i + 1])
+        if bulges[i] != 0:
+            result.append(bulge_arc(pts[i], ends[i], bulges[i], tolerance)[1:-1])
+
+    result.append(ends[n_edges - 1:n_edges])
+    return np.concatenate(result)
+
+
+def bulge_arc(
+        start: Sequence[float],
+        end: Sequence[float],
+        bulge: float,
+        tolerance: Optional[float] = None) -> np.ndarray:
+    """bulge付きの辺を始点・終点を含む頂点の配列に変換します"""
+
+    start = np.asarray(start, dtype=np.float64)[:2]
+    end = np.asarray(end, dtype=np.float64)[:2]
+    chord = end - start
+    length = float(np.hypot(*chord))
+    if length == 0:
+        return np.array([start, end])
+
+    # bulge = tan(sweep / 4). 正の場合は反時計回り
+    sweep = 4 * math.atan(bulge)
+    radius = length / (2 * math.sin(abs(sweep) / 2))
+    normal = np.array([-chord[1], chord[0]]) / length
+    center = (start + end) / 2 + normal * (length / 2) / math.tan(sweep / 2)
+    start_angle = math.atan2(start[1] - center[1], start[0] - center[0])
+    pts = flatten_arc(center, radius, start_angle, sweep, tolerance)
+    pts[0] = start
+    pts[-1] = end
+    return pts
+
+
+def flatten_spline(
+        control_points: Sequence[Sequence[float]],
+        knots: Sequence[float],
+        degree: int,
+        weights: Optional[Sequence[float]] = None,
+        tolerance: Optional[float] = None) -> np.ndarray:
+    """NURBSスプラインを頂点の配列に変換します
+
+    the vertex count is estimated from the second differences of the control polygon, which
+    bound the curvature of each knot span.
+    """
+
+    ctrl = np.asarray(control_points, dtype=np.float64).reshape(-1, np.shape(control_points)[-1])[:, :2]
+    n_ctrl = len(ctrl)
+    if n_ctrl < 2 or degree < 1:
+        return ctrl
+
+    degree = min(degree, n_ctrl - 1)
+    knots = np.asarray(knots, dtype=np.float64)
+    if len(knots) != n_ctrl + degree + 1:
+        # 不正なノットは一様なものに置き換えます
+        knots = np.concatenate([np.zeros(degree), np.linspace(0, 1, n_ctrl - degree + 1), np.ones(degree)])
+
+    if weights is None or len(weights) != n_ctrl:
+        weights = np.ones(n_ctrl)
+    else:
+        weights = np.asarray(weights, dtype=np.float64)
+
+    t_min = knots[degree]
+    t_max = knots[n_ctrl]
+    n_spans = max(1, int(np.count_nonzero(np.diff(knots[degree:n_ctrl + 1]) > 0)))
+    if tolerance is None:
+        per_span = 8
+    else:
+        second_diff = np.diff(ctrl, n=2, axis=0) if n_ctrl > 2 else np.zeros((1, 2))
+        bound = degree * (degree - 1) * float(np.hypot(second_diff[:, 0], second_diff[:, 1]).max())
+        per_span = math.ceil(math.sqrt(bound / (8 * tolerance))) if bound > 0 else 1
+
+    n = int(min(max(per_span * n_spans, MIN_SEGMENTS), MAX_SEGMENTS))
+    params = np.linspace(t_min, t_max, n + 1)
+    basis = _bspline_basis(params, knots, degree, n_ctrl) * weights
+    return basis @ ctrl / basis.sum(axis=1, keepdims=True)
+
+
+def _bspline_basis(params: np.ndarray, knots: np.ndarray, degree: int, n_ctrl: int) -> np.ndarray:
+    """(len(params), n_ctrl)のB-spline基底関数の値. Cox-de Boorの漸化式をまとめて計算します"""
+
+    # 0次: params が属するノット区間. 終端は最後の有効な区間に含めます
+    spans = np.nonzero(np.diff(knots[degree:n_ctrl + 1]) > 0)[0] + degree
+    span = np.searchsorted(knots, params, side='right') - 1
+    span = np.clip(span, degree, spans.max() if len(spans) > 0 else n_ctrl - 1)
+    n_basis = len(knots) - 1
+    basis = np.zeros((len(params), n_basis))
+    basis[np.arange(len(params)), span] = 1.
+
+    t = params[:, None]
+    for p in range(1, degree + 1):
+        left = knots[:n_basis - p]
+        right = knots[p + 1:n_basis + 1]
+        denom_a = knots[p:n_basis] - left
+        denom_b = right - knots[1:n_basis - p + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            a = np.where(denom_a > 0, (t - left) / denom_a, 0.)
+            b = np.where(denom_b > 0, (right - t) / denom_b, 0.)
+
+        basis = a * basis[:, :n_basis - p] + b * basis[:, 1:n_basis - p + 1]
+
+    return basis[:, :n_ctrl]
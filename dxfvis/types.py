@@ -1,18 +1,26 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import math
+
 from enum import Enum
 
 from typing import Any
 from typing import Callable
 from typing import Dict
+from typing import List
 from typing import NamedTuple
+from typing import Optional
 from typing import Sequence
 from typing import Tuple
 from typing import TypeVar
+from typing import Union
 
 import numpy as np
 
+from dxfvis import stroke as _stroke
+from dxfvis import tessellate
+
 
 DXFPoint = Tuple[float, float]
 BoundingBox = Tuple[DXFPoint, DXFPoint]
@@ -26,6 +34,15 @@ class VariableStatus(Enum):
     CONSTANT_MAPPING = 2
     POINT_MAPPING = 3
     SEQUENCE_MAPPING = 4
+    ARRAY_MAPPING = 5  # (N, 2) array of points, or a list of them. mapped at once with numpy
+    CURVE_MAPPING = 6  # tessellate.Curve, or a list of them. flattened at the canvas scale, then mapped as ARRAY
+    SUBPIXEL_MAPPING = 7  # same as CURVE_MAPPING, in fixed point with SUBPIXEL_SHIFT fractional bits
+    LINEWEIGHT_MAPPING = 8  # DXF lineweight (1/100 mm) -> line width in pixels by the stroke policy of the render
+    DOT_MAPPING = 9  # DXF lineweight (1/100 mm) -> dot radius in pixels by the stroke policy of the render
+
+
+# fractional bits of the points mapped with SUBPIXEL_MAPPING. pass as `shift` to opencv
+SUBPIXEL_SHIFT = 4
 
 
 class OpenCVOp(object):
@@ -34,63 +51,99 @@ class OpenCVOp(object):
     func: Callable[..., Any]
     args: Sequence[Tuple[Any, VariableStatus]]
     kwargs: Dict[str, Tuple[Any, VariableStatus]]
+    merge_arg: Optional[int]
 
-    def __init__(self, func, args, kwargs):
+    def __init__(self, func, args, kwargs, merge_arg=None):
+        """
+        :param merge_arg: index of a list argument. consecutive ops which differ only in this argument
+            are drawn by one call with the lists concatenated (see `merge_ops`)
+        """
         self.func = func
         self.args = args
         self.kwargs = kwargs
+        self.merge_arg = merge_arg
 
-    def __call__(self, img: np.ndarray, op_space: Tuple[DXFPoint, DXFPoint]) -> None:
-        """ call opencv function with the scale into consideration """
-        # map args
-        args = []
-        for val, status in self.args:
-            if status == VariableStatus.CONSTANT_MAPPING:
-                args.append(self._map_constant(val, op_space[0], op_space[1], img.shape))
-            elif status == VariableStatus.POINT_MAPPING:
-                args.append(self._map_point(val, op_space[0], op_space[1], img.shape))
-            elif status == VariableStatus.SEQUENCE_MAPPING:
-                if hasattr(val[0], '__len__'):
-                    val = tuple([self._map_point(v, op_space[0], op_space[1], img.shape) for v in val])
-                else:
-                    val = tuple([self._map_constant(v, op_space[0], op_space[1], img.shape) for v in val])
-                args.append(val)
-            else:
-                args.append(val)
-
-        kwargs = {}
-        for key, (val, status) in self.kwargs.items():
-            if status == VariableStatus.CONSTANT_MAPPING:
-                kwargs[key] = self._map_constant(val, op_space[0], op_space[1], img.shape)
-            elif status == VariableStatus.POINT_MAPPING:
-                kwargs[key] = self._map_point(val, op_space[0], op_space[1], img.shape)
-            elif status == VariableStatus.SEQUENCE_MAPPING:
-                val = kwargs[key]
-                if hasattr(val[0], '__len__'):
-                    val = tuple([self._map_point(v, op_space[0], op_space[1], img.shape) for v in val])
-                else:
-                    val = tuple([self._map_constant(v, op_space[0], op_space[1], img.shape) for v in val])
-
-                kwargs[key] = val
-            else:
-                kwargs[key] = val
+    def __call__(
+            self,
+            img: np.ndarray,
+            op_space: Tuple[DXFPoint, DXFPoint],
+            canvas_shape: Optional[Size] = None,
+            color: Optional[Tuple[Scalar, ...]] = None,
+            stroke: Optional['_stroke.StrokeWidths'] = None) -> None:
+        """ call opencv function with the scale into consideration
+
+        :param img: canvas to draw on
+        :param op_space: DXF coordinates covered by `img`
+        :param canvas_shape: shape of the whole image when `img` is a part of it. decides line widths.
+        :param color: draw flat in this color instead of the color of the entity, e.g. for masks.
+            tones (`tone` keyword) are disabled as well.
+        :param stroke: line widths of the render. the default policy for `canvas_shape` in default.
+        """
+        args, kwargs = self.map_args(img.shape, op_space, canvas_shape, color, stroke=stroke)
+        self.func(img, *args, **kwargs)
 
-        # linewidthおよびdot radius は画像の大きさに応じてここで入れ直す
-        if 'thickness' in kwargs.keys():
-            ideal_thickness = int(max(img.shape) / 700)
-            if ideal_thickness == 0:
-                ideal_thickness = 1
+    def map_args(
+            self,
+            img_shape: Size,
+            op_space: Tuple[DXFPoint, DXFPoint],
+            canvas_shape: Optional[Size] = None,
+            color: Optional[Tuple[Scalar, ...]] = None,
+            subpixel: bool = True,
+            stroke: Optional['_stroke.StrokeWidths'] = None) -> Tuple[List[Any], Dict[str, Any]]:
+        """arguments of `func` (without the canvas) mapped onto a canvas of `img_shape`.
+        see `__call__` for the parameters
 
-            kwargs['thickness'] = ideal_thickness
+        :param subpixel: False maps SUBPIXEL_MAPPING to whole units and drops the `shift` keyword,
+            for backends other than opencv
+        """
+        if stroke is None:
+            stroke = _stroke.default_widths(img_shape if canvas_shape is None else canvas_shape)
 
-        if 'dot_radius' in kwargs.keys():
-            ideal_r = int(max(img.shape) / 900)
-            if ideal_r == 0:
-                ideal_r = 1
+        args = [self._map_value(val, status, op_space, img_shape, subpixel, stroke) for val, status in self.args]
+        kwargs = {key: self._map_value(val, status, op_space, img_shape, subpixel, stroke)
+                  for key, (val, status) in self.kwargs.items()}
+        if not subpixel:
+            kwargs.pop('shift', None)
 
-            kwargs['dot_radius'] = ideal_r
+        # 線の太さを定数で指定するopは、既定の線の太さで描画します. 塗りつぶし(-1)などマッピングしない値はそのまま使います
+        if 'thickness' in kwargs.keys() and self.kwargs['thickness'][1] == VariableStatus.CONSTANT_MAPPING:
+            kwargs['thickness'] = stroke.thickness(_stroke.DEFAULT)
 
-        self.func(img, *args, **kwargs)
+        if 'dot_radius' in kwargs.keys() and self.kwargs['dot_radius'][1] == VariableStatus.CONSTANT_MAPPING:
+            kwargs['dot_radius'] = stroke.dot_radius(_stroke.DEFAULT)
+
+        if color is not None:
+            kwargs['color'] = color
+            if 'tone' in kwargs:
+                kwargs['tone'] = False
+
+        return args, kwargs
+
+    @classmethod
+    def _map_value(cls, val: Any, status: VariableStatus, op_space: Tuple[DXFPoint, DXFPoint], shape: Size,
+                   subpixel: bool = True, stroke: Optional['_stroke.StrokeWidths'] = None) -> Any:
+        extmin, extmax = op_space
+        if status == VariableStatus.CONSTANT_MAPPING:
+            return cls._map_constant(val, extmin, extmax, shape)
+        elif status == VariableStatus.POINT_MAPPING:
+            return cls._map_point(val, extmin, extmax, shape)
+        elif status == VariableStatus.SEQUENCE_MAPPING:
+            if hasattr(val[0], '__len__'):
+                return tuple([cls._map_point(v, extmin, extmax, shape) for v in val])
+            else:
+                return tuple([cls._map_constant(v, extmin, extmax, shape) for v in val])
+        elif status == VariableStatus.ARRAY_MAPPING:
+            return cls._map_array(val, extmin, extmax, shape)
+        elif status == VariableStatus.CURVE_MAPPING:
+            return cls._map_curve(val, extmin, extmax, shape)
+        elif status == VariableStatus.SUBPIXEL_MAPPING:
+            return cls._map_curve(val, extmin, extmax, shape, SUBPIXEL_SHIFT if subpixel else None)
+        elif status == VariableStatus.LINEWEIGHT_MAPPING:
+            return (stroke or _stroke.default_widths(shape)).thickness(val)
+        elif status == VariableStatus.DOT_MAPPING:
+            return (stroke or _stroke.default_widths(shape)).dot_radius(val)
+        else:
+            return val
 
     @staticmethod
     def _map_point(pt: DXFPoint, extmin: DXFPoint, extmax: DXFPoint, canvas_shape: Size) -> NPPoint:
@@ -102,11 +155,79 @@ class OpenCVOp(object):
         : param canvas_shape: キャンバスの大きさ
         """
         x, y = pt[:2]
-        new_x = int((x - extmin[0]) / (extmax[0] - extmin[0]) * canvas_shape[1])
-        new_y = int((y - extmin[1]) / (extmax[1] - extmin[1]) * canvas_shape[0])
+        new_x = math.floor((x - extmin[0]) / (extmax[0] - extmin[0]) * canvas_shape[1])
+        new_y = math.floor((y - extmin[1]) / (extmax[1] - extmin[1]) * canvas_shape[0])
         new_y = canvas_shape[0] - new_y
         return (new_x, new_y)
 
+    @staticmethod
+    def _map_array(
+            pts: Union[np.ndarray, List[np.ndarray]],
+            extmin: DXFPoint,
+            extmax: DXFPoint,
+            canvas_shape: Size) -> Union[np.ndarray, List[np.ndarray]]:
+        """DXFファイル上の座標の配列をまとめてキャンバスのものにmapします. `_map_point` と同じ結果になります
+
+        : param pts: (N, 2)の座標の配列、またはそのリスト
+        : param extmin: DXFファイルの最小端
+        : param extmax: DXFファイルの最大端
+        : param canvas_shape: キャンバスの大きさ
+        """
+        if isinstance(pts, list):
+            # まとめてmapしてから分けます
+            if len(pts) < 2:
+                return [OpenCVOp._map_array(p, extmin, extmax, canvas_shape) for p in pts]
+
+            pts = [np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in pts]
+            bounds = np.cumsum([0] + [len(p) for p in pts]).tolist()
+            mapped = OpenCVOp._map_array(np.concatenate(pts), extmin, extmax, canvas_shape)
+            return [mapped[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        pts = np.asarray(pts, dtype=np.float64)
+        mapped = np.empty(pts.shape[:-1] + (2,), dtype=np.int32)
+        mapped[..., 0] = np.floor((pts[..., 0] - extmin[0]) / (extmax[0] - extmin[0]) * canvas_shape[1])
+        mapped[..., 1] = canvas_shape[0] - np.floor((pts[..., 1] - extmin[1]) / (extmax[1] - extmin[1]) * canvas_shape[0])
+        return mapped
+
+    @staticmethod
+    def _map_curve(
+            curve: Union['tessellate.Curve', List['tessellate.Curve']],
+            extmin: DXFPoint,
+            extmax: DXFPoint,
+            canvas_shape: Size,
+            shift: Optional[int] = None) -> Union[np.ndarray, List[np.ndarray]]:
+        """曲線をキャンバスの縮尺に応じた頂点数で折れ線にし、キャンバスの座標にmapします
+
+        : param curve: 曲線、またはそのリスト. リストはまとめてmapします
+        : param extmin: DXFファイルの最小端
+        : param extmax: DXFファイルの最大端
+        : param canvas_shape: キャンバスの大きさ
+        : param shift: 指定した場合、この小数ビット数の固定小数点でmapします
+        """
+        tolerance = tessellate.TOLERANCE * (extmax[0] - extmin[0]) / canvas_shape[1]
+        if isinstance(curve, list):
+            if len(curve) == 0:
+                return []
+
+            pts = [c.points(tolerance) for c in curve]
+            lengths = np.cumsum([len(p) for p in pts])[:-1]
+            pts = np.concatenate(pts)
+        else:
+            pts = curve.points(tolerance)
+
+        if shift is None:
+            mapped = OpenCVOp._map_array(pts, extmin, extmax, canvas_shape)
+        else:
+            # _map_point は切り捨てるため、画素の中心に合わせて0.5画素ずらします
+            scale = np.array([canvas_shape[1] / (extmax[0] - extmin[0]), -canvas_shape[0] / (extmax[1] - extmin[1])])
+            offset = np.array([-extmin[0] * scale[0] - 0.5, canvas_shape[0] - extmin[1] * scale[1] + 0.5])
+            mapped = np.rint((pts * scale + offset) * (1 << shift)).astype(np.int32)
+
+        if isinstance(curve, list):
+            return np.split(mapped, lengths)
+
+        return mapped
+
     @staticmethod
     def _map_constant(const: Scalar, extmin: DXFPoint, extmax: DXFPoint, canvas_shape: Size) -> Scalar:
         """DXFファイル上の定数をキャンバスのものにmapします
@@ -120,3 +241,151 @@ class OpenCVOp(object):
         scale = canvas_shape[1] / (extmax[0] - extmin[0])
         const_ = const * scale
         return const_type(const_)
+
+
+def merge_ops(ops: Sequence[Optional[OpenCVOp]], stroke: Optional['_stroke.StrokeWidths'] = None) -> List[OpenCVOp]:
+    """merge consecutive ops which differ only in their `merge_arg` into one op
+
+    only neighbours are merged, so the result is drawn in the same order as `ops`.
+    None in `ops` is skipped.
+
+    :param stroke: line widths the ops are drawn with. ops whose lineweights are drawn with the
+        same width are merged as well.
+    """
+
+    merged: List[OpenCVOp] = []
+    copied = set()
+    for op in ops:
+        if op is None:
+            continue
+
+        prev = merged[-1] if merged else None
+        if op.merge_arg is None or prev is None or not _is_mergeable(prev, op, stroke):
+            merged.append(op)
+            continue
+
+        if id(prev) not in copied:
+            args = list(prev.args)
+            args[prev.merge_arg] = (list(args[prev.merge_arg][0]), args[prev.merge_arg][1])
+            prev = OpenCVOp(prev.func, args, prev.kwargs, prev.merge_arg)
+            merged[-1] = prev
+            copied.add(id(prev))
+
+        prev.args[prev.merge_arg][0].extend(op.args[op.merge_arg][0])
+
+    return merged
+
+
+def _is_mergeable(op1: OpenCVOp, op2: OpenCVOp, stroke: Optional['_stroke.StrokeWidths'] = None) -> bool:
+    if op1.func is not op2.func or op1.merge_arg != op2.merge_arg or len(op1.args) != len(op2.args):
+        return False
+
+    for i, (arg1, arg2) in enumerate(zip(op1.args, op2.args)):
+        if i != op1.merge_arg and arg1 != arg2:
+            return False
+
+    return _is_same_kwargs(op1, op2, stroke)
+
+
+def _is_same_kwargs(op1: OpenCVOp, op2: OpenCVOp, stroke: Optional['_stroke.StrokeWidths'] = None) -> bool:
+    """whether two ops are drawn in the same style"""
+
+    if op1.kwargs == op2.kwargs:
+        return True
+
+    if stroke is None or op1.kwargs.keys() != op2.kwargs.keys():
+        return False
+
+    # 線の太さは描画される画素数で比べます
+    for key, (val1, status1) in op1.kwargs.items():
+        val2, status2 = op2.kwargs[key]
+        if status1 != status2:
+            return False
+        if status1 == VariableStatus.LINEWEIGHT_MAPPING:
+            if stroke.thickness(val1) != stroke.thickness(val2):
+                return False
+        elif val1 != val2:
+            return False
+
+    return True
+
+
+class EntityWarning(NamedTuple):
+    """an entity which could not be drawn, or an op which failed"""
+
+    # 'load' (reading the file), 'block' (missing block of an INSERT or DIMENSION), 'build' (draw function),
+    # 'extents' (invalid bounding box), 'budget' (cut by a budget) or 'draw' (opencv)
+    stage: str
+    handle: Optional[str]
+    dxftype: Optional[str]
+    layer: Optional[str]
+    message: str
+
+
+class RenderReport(object):
+    """problems met by a render. passing one to `render_dxf` renders in fault-tolerant mode,
+    where entities which fail are skipped and recorded here instead of raising
+
+        report = RenderReport()
+        img = render_dxf(path, 1024, report=report)
+        for w in report.warnings:
+            print(w.handle, w.dxftype, w.message)
+    """
+
+    warnings: List[EntityWarning]
+    duplicates: int  # number of entities dropped by `render_dxf(dedup=True)`
+    exceeded: List[str]  # budgets exceeded by `render_dxf(budget=...)`. the image is partial if any
+
+    def __init__(self) -> None:
+        self.warnings = []
+        self.duplicates = 0
+        self.exceeded = []
+
+    def __len__(self) -> int:
+        return len(self.warnings)
+
+    def add(self, stage: str, entity: Any, error: Union[str, BaseException]) -> None:
+        """record a failure of `entity` (an ezdxf entity, or None if it is not known)"""
+
+        handle = dxftype = layer = None
+        if entity is not None:
+            try:
+                handle = entity.dxf.handle
+                dxftype = entity.dxftype()
+                layer = entity.dxf.layer
+            except Exception:
+                pass
+
+        if isinstance(error, BaseException):
+            error = '{}: {}'.format(type(error).__name__, error)
+
+        self.warnings.append(EntityWarning(stage, handle, dxftype, layer, error))
+
+    @property
+    def skipped(self) -> List[str]:
+        """handles of the entities which were not drawn"""
+        return [w.handle for w in self.warnings if w.handle is not None]
+
+
+class PickBuffer(NamedTuple):
+    """entity under each pixel, drawn by `render_dxf(pick=True)` together with the image
+
+        img, picks = render_dxf(path, 1024, pick=True)
+        hit = picks.pick(x, y)  # (handle, layer) of the topmost entity, or None
+    """
+
+    ids: np.ndarray  # (H, W) int32, index of the topmost entity drawn on the pixel, -1 for the background
+    handles: List[Optional[str]]  # index -> handle. entities of blocks have the handles of the block definition
+    layers: List[str]  # index -> layer
+
+    def pick(self, x: int, y: int) -> Optional[Tuple[Optional[str], str]]:
+        """(handle, layer) of the entity at column `x` and row `y` of the image, or None"""
+
+        if not (0 <= y < self.ids.shape[0] and 0 <= x < self.ids.shape[1]):
+            return None
+
+        index = int(self.ids[y, x])
+        if index < 0:
+            return None
+
+        return self.handles[index], self.layers[index]
@@ -1,9 +1,33 @@
 #!/usr/bin/env python
 # -*- coding:utf-8 -*-
 
+import weakref
+
 import cv2
 import numpy as np
 
+from dxfvis import stroke
+
+
+# table -> (number of entries, lower-cased name -> entry). ezdxf looks table entries up by a linear scan
+_table_indices = weakref.WeakKeyDictionary()
+
+
+def get_table_entry(table, name):
+    """get an entry of a table (layers, linetypes, ...) by name. None if not found.
+    the table is indexed on first use and reindexed when entries are added"""
+
+    index = _table_indices.get(table)
+    if index is None or index[0] != len(table):
+        entries = {}
+        for entry in table:
+            entries.setdefault(entry.dxf.name.lower(), entry)
+
+        index = (len(table), entries)
+        _table_indices[table] = index
+
+    return index[1].get(name.lower())
+
 
 def get_color(entity, drawing):
     """get color of an entity"""
@@ -14,8 +38,8 @@ def get_color(entity, drawing):
     if color == 0:  # BYBLOCK
         color = (255, 255, 255)
     elif color == 256:  # BYLAYER
-        layer = drawing.layers.get(entity.dxf.layer)
-        color = layer.dxf.color
+        layer = get_table_entry(drawing.layers, entity.dxf.layer)
+        color = 7 if layer is None else layer.dxf.color
 
     if isinstance(color, int):
         color = _acadcolor2rgb(color)
@@ -23,19 +47,58 @@ def get_color(entity, drawing):
     return color
 
 
+def get_styles(entities, drawing):
+    """get (color, linetype, lineweight) of entities.
+    entities sharing layer, color, linetype and lineweight attributes are resolved only once"""
+
+    resolved = {}
+    styles = []
+    for entity in entities:
+        key = (entity.dxf.layer, entity.get_dxf_attrib('color', None), entity.get_dxf_attrib('linetype', None),
+               _lineweight_attrib(entity))
+        style = resolved.get(key)
+        if style is None:
+            style = (get_color(entity, drawing), get_linetype(entity, drawing), get_lineweight(entity, drawing))
+            resolved[key] = style
+
+        styles.append(style)
+
+    return styles
+
+
 def get_linewidth(entity, drawing):
-    """(!deprecated) get line width of an entity"""
+    """(!deprecated) get line width of an entity. use `get_lineweight`"""
     return 3
 
 
+def get_lineweight(entity, drawing):
+    """get lineweight of an entity in 1/100 mm. BYLAYER is resolved with the layer table.
+    BYBLOCK and DEFAULT are returned as `stroke.DEFAULT`, drawn with the default lineweight"""
+
+    lineweight = _lineweight_attrib(entity)
+    if lineweight == stroke.BYLAYER:
+        layer = get_table_entry(drawing.layers, entity.dxf.layer)
+        lineweight = stroke.DEFAULT if layer is None else _lineweight_attrib(layer)
+
+    if lineweight < 0:
+        return stroke.DEFAULT
+
+    return lineweight
+
+
+def _lineweight_attrib(entity):
+    try:
+        return entity.get_dxf_attrib('lineweight', stroke.BYLAYER)
+    except AttributeError:  # R12
+        return stroke.BYLAYER
+
+
 def get_linetype(entity, drawing):
     """get line type of an entity"""
 
     ent_params = entity.dxfattribs()
-    if drawing.layers.has_entry(entity.dxf.layer):
-        layer_params = drawing.layers.get(entity.dxf.layer).dxfattribs()
-    else:
-        layer_params = {}
+    layer = get_table_entry(drawing.layers, entity.dxf.layer)
+    layer_params = {} if layer is None else layer.dxfattribs()
 
     if 'linetype' in ent_params.keys():
         linetype_repr = ent_params['linetype']
@@ -46,11 +109,11 @@ def get_linetype(entity, drawing):
             if linetype_repr_ is None:
                 linetype = None
             else:
-                linetype = drawing.linetypes.get(linetype_repr_)
+                linetype = get_table_entry(drawing.linetypes, linetype_repr_)
         else:
-            linetype = drawing.linetypes.get(linetype_repr)
+            linetype = get_table_entry(drawing.linetypes, linetype_repr)
     elif 'linetype' in layer_params.keys():
-        linetype = drawing.linetypes.get(layer_params['linetype'])
+        linetype = get_table_entry(drawing.linetypes, layer_params['linetype'])
     else:
         linetype = None
 
@@ -158,7 +221,11 @@ def scale_linetype_length(values):
 
 
 def _acadcolor2rgb(acadcolor):
-    assert acadcolor > 0 and acadcolor < 250
+    # 負の値は非表示の画層の色です. 0 (BYBLOCK), 256 (BYLAYER) および範囲外の値は7 (白) として扱います
+    acadcolor = abs(acadcolor)
+    if not 0 < acadcolor < 256:
+        acadcolor = 7
+
     color_index = {
         1: (255, 0, 0),
         2: (255, 255, 0),
@@ -409,5 +476,11 @@ def _acadcolor2rgb(acadcolor):
         229: (76, 38, 66),
         239: (76, 38, 57),
         249: (76, 38, 47),
+        250: (51, 51, 51),
+        251: (91, 91, 91),
+        252: (132, 132, 132),
+        253: (173, 173, 173),
+        254: (214, 214, 214),
+        255: (255, 255, 255),
     }
     return color_index[acadcolor]
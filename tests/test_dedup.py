@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import cv2
+
+from dxfvis.dedup import dedup_ops
+from dxfvis.types import OpenCVOp
+from dxfvis.types import VariableStatus as S
+
+
+DXF_SPACE = ((0., 0.), (10., 10.))
+
+
+def _line_op(pt1, pt2, color=(255, 255, 255)):
+    return OpenCVOp(cv2.line,
+                    args=((pt1, S.POINT_MAPPING), (pt2, S.POINT_MAPPING)),
+                    kwargs={'color': (color, S.NO_MAPPING), 'thickness': (1, S.NO_MAPPING)})
+
+
+def _circle_op(center, radius, color=(255, 255, 255)):
+    return OpenCVOp(cv2.circle,
+                    args=((center, S.POINT_MAPPING), (radius, S.CONSTANT_MAPPING)),
+                    kwargs={'color': (color, S.NO_MAPPING), 'thickness': (1, S.NO_MAPPING)})
+
+
+def test_reversed_duplicate():
+    a = _line_op((0, 0), (10, 0))
+    b = _line_op((10, 0), (0, 0))
+    ops, removed = dedup_ops([a, b], DXF_SPACE)
+    # 後に描かれる方が残ります
+    assert removed == 1
+    assert ops == [b]
+
+
+def test_collinear_covered_segment():
+    long = _line_op((0, 0), (10, 10))
+    short = _line_op((2, 2), (5, 5))
+    assert dedup_ops([short, long], DXF_SPACE) == ([long], 1)
+    assert dedup_ops([long, short], DXF_SPACE) == ([long], 1)
+
+
+def test_touching_and_overlapping_segments_are_kept():
+    ops = [_line_op((0, 0), (5, 0)), _line_op((5, 0), (10, 0)), _line_op((3, 1), (8, 1)), _line_op((0, 1), (4, 1))]
+    assert dedup_ops(ops, DXF_SPACE) == (ops, 0)
+
+
+def test_other_style_is_kept():
+    ops = [_line_op((0, 0), (10, 0)), _line_op((2, 0), (5, 0), color=(0, 0, 255))]
+    assert dedup_ops(ops, DXF_SPACE) == (ops, 0)
+
+
+def test_near_miss_tolerance():
+    long = _line_op((0, 0), (10, 0))
+    short = _line_op((2, 1e-3), (5, 1e-3))
+    assert dedup_ops([short, long], DXF_SPACE, tolerance=1e-6) == ([short, long], 0)
+    assert dedup_ops([short, long], DXF_SPACE, tolerance=1e-2) == ([long], 1)
+
+
+def test_parallel_segment_is_kept():
+    ops = [_line_op((0, 0), (10, 0)), _line_op((2, 0.5), (5, 0.5))]
+    assert dedup_ops(ops, DXF_SPACE) == (ops, 0)
+
+
+def test_duplicated_shapes():
+    a = _circle_op((5, 5), 2)
+    b = _circle_op((5, 5), 2)
+    c = _circle_op((5, 5), 3)
+    ops, removed = dedup_ops([a, c, b], DXF_SPACE)
+    assert removed == 1
+    assert ops == [c, b]
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import io
+
+import cv2
+import ezdxf
+import numpy as np
+
+from benchmarks.generate import make_case
+from dxfvis.encode import write_png_tiled
+from dxfvis.render import render_dxf
+
+
+def _read_png(data: bytes) -> np.ndarray:
+    return cv2.cvtColor(cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def _tiled(drawing, image_size: int, tile_height: int) -> np.ndarray:
+    f = io.BytesIO()
+    write_png_tiled(drawing, f, image_size, tile_height=tile_height)
+    return _read_png(f.getvalue())
+
+
+def _is_near(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """whether the color of each pixel of `a` is found on the pixel or a neighbour of it in `b`"""
+
+    padded = np.pad(b, ((1, 1), (1, 1), (0, 0)))
+    found = np.zeros(a.shape[:2], dtype=bool)
+    for dy in range(3):
+        for dx in range(3):
+            found |= (padded[dy:dy + a.shape[0], dx:dx + a.shape[1]] == a).all(axis=2)
+
+    return found
+
+
+def test_single_strip_is_render_dxf():
+    drawing = make_case('mixed', 2000)
+    expected = render_dxf(drawing, 512).astype(np.uint8)
+
+    assert np.array_equal(_tiled(drawing, 512, 4096), expected)
+
+
+def test_strips_differ_from_render_dxf_within_tolerance():
+    drawing = make_case('mixed', 5000)
+    expected = render_dxf(drawing, 1024).astype(np.uint8)
+    actual = _tiled(drawing, 1024, 100)
+
+    # 帯ごとに切り取られた線は、切り口から引き直されるので帯の中でも1画素ずれます
+    diff = (actual != expected).any(axis=2)
+    assert diff.mean() < 0.005
+    # ずれた画素のほとんどは、隣の画素にもう一方の色があります. 残りは線の交わる所です
+    far = diff & ~(_is_near(actual, expected) & _is_near(expected, actual))
+    assert far.mean() < 1e-4
+
+
+def test_thick_lines_are_drawn_into_the_strips_they_spill_into():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    msp.add_line((0, 0), (100, 100))
+    for i in range(10):
+        # 線の太さの分だけ、外接矩形の外の帯にもはみ出します
+        msp.add_line((10, 5 + i * 9.3), (90, 5 + i * 9.3), dxfattribs={'lineweight': 200, 'color': 1 + i % 6})
+
+    expected = render_dxf(drawing, 256).astype(np.uint8)
+    actual = _tiled(drawing, 256, 7)
+    diff = (actual != expected).any(axis=2)
+    # 水平線は切り取っても同じ画素になります. 斜めの線の分だけずれます
+    assert not diff[:, :20].any() and not diff[:, -20:].any()
+    assert diff.sum() < 64
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import random
+
+import ezdxf
+import numpy as np
+
+from dxfvis.order import batch_ops
+from dxfvis.order import sort_entities
+from dxfvis.render import collect_entity_ops
+from dxfvis.render import draw_ops
+from dxfvis.render import get_extents
+from dxfvis.render import get_image_shape
+from dxfvis.render import render_dxf
+from dxfvis.stroke import StrokePolicy
+
+
+def _overlapping_drawing(seed: int = 0):
+    """solids and lines of a few colors, piled on each other"""
+
+    rng = random.Random(seed)
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    for _ in range(300):
+        color = rng.choice([1, 3, 5])
+        x, y = rng.uniform(0, 90), rng.uniform(0, 90)
+        if rng.random() < 0.4:
+            w, h = rng.uniform(2, 20), rng.uniform(2, 20)
+            msp.add_solid([(x, y), (x + w, y), (x, y + h), (x + w, y + h)], dxfattribs={'color': color})
+        else:
+            msp.add_line((x, y), (x + rng.uniform(-10, 10), y + rng.uniform(-10, 10)), dxfattribs={'color': color})
+
+    return drawing
+
+
+def test_batch_ops_keeps_image():
+    drawing = _overlapping_drawing()
+    _, entity_reps = collect_entity_ops(drawing)
+    ops = [rep[0] for rep in entity_reps]
+    bboxes = [rep[1] for rep in entity_reps]
+    dxf_space = get_extents(entity_reps)
+    shape = get_image_shape(dxf_space, 256)
+    widths = StrokePolicy().widths(shape)
+
+    expected = np.zeros(shape)
+    for op in ops:
+        op(expected, dxf_space, stroke=widths)
+
+    batched = batch_ops(ops, bboxes, dxf_space, shape, widths)
+    assert len(batched) < len(ops)
+
+    actual = np.zeros(shape)
+    draw_ops(actual, ops, dxf_space, widths, bboxes=bboxes)
+    assert np.array_equal(actual, expected)
+
+
+def test_batch_ops_never_merges_overlapping_fills():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    # 同じ色の重なる塗りつぶしを一つの fillPoly で描くと、重なりが穴になります
+    msp.add_solid([(0, 0), (10, 0), (0, 10), (10, 10)], dxfattribs={'color': 1})
+    msp.add_solid([(5, 5), (15, 5), (5, 15), (15, 15)], dxfattribs={'color': 1})
+    msp.add_solid([(20, 0), (25, 0), (20, 5), (25, 5)], dxfattribs={'color': 1})
+    _, entity_reps = collect_entity_ops(drawing)
+    dxf_space = get_extents(entity_reps)
+    shape = get_image_shape(dxf_space, 128)
+    widths = StrokePolicy().widths(shape)
+
+    batched = batch_ops([rep[0] for rep in entity_reps], [rep[1] for rep in entity_reps], dxf_space, shape, widths)
+    assert sorted(len(op.args[0][0]) for op in batched) == [1, 2]
+
+    canvas = np.zeros(shape)
+    draw_ops(canvas, [rep[0] for rep in entity_reps], dxf_space, widths, bboxes=[rep[1] for rep in entity_reps])
+    # 重なりの中心は塗られたままです
+    assert canvas[shape[0] - 1 - int(7.5 / 25 * shape[0]), int(7.5 / 25 * shape[1])].any()
+
+
+def test_sort_entities_follows_sortentstable():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    a, b, c, d = [msp.add_line((0, i), (1, i)) for i in range(4)]
+    # '0' は最後に描かれ、表にない d は自身のハンドルで並びます
+    msp.set_redraw_order([(a.dxf.handle, '5'), (b.dxf.handle, '0'), (c.dxf.handle, '2')])
+    assert int(d.dxf.handle, 16) > 5
+
+    assert [e.dxf.handle for e in sort_entities(msp)] == [e.dxf.handle for e in (c, a, d, b)]
+
+
+def test_sort_entities_keeps_file_order_without_table():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    lines = [msp.add_line((0, i), (1, i)) for i in range(3)]
+
+    assert [e.dxf.handle for e in sort_entities(msp)] == [e.dxf.handle for e in lines]
+
+
+def test_render_draws_by_sortentstable():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    red = msp.add_solid([(0, 0), (10, 0), (0, 10), (10, 10)], dxfattribs={'color': 1})
+    msp.add_solid([(0, 0), (10, 0), (0, 10), (10, 10)], dxfattribs={'color': 3})
+    center = (32, 32)
+
+    # 後に書かれた緑が上になります
+    img = render_dxf(drawing, 64)
+    assert tuple(img[center]) == (0, 255, 0)
+
+    msp.set_redraw_order([(red.dxf.handle, '0')])
+    img = render_dxf(drawing, 64)
+    assert tuple(img[center]) == (255, 0, 0)
+
+
+def test_batch_ops_keeps_lines_above_tone_hatch():
+    drawing = ezdxf.new('R2010')
+    msp = drawing.modelspace()
+    msp.add_line((-20, 0), (-20, 30), dxfattribs={'color': 1})
+    # 線の間隔が2画素ほどなので、色を薄めて塗りつぶされます
+    hatch = msp.add_hatch(color=1)
+    hatch.set_pattern_fill('ANSI31', color=1)
+    hatch.set_pattern_definition([[45, (0, 0), (-0.3, 0.3), []]])
+    with hatch.edit_boundary() as boundary:
+        boundary.add_polyline_path([(0, 0), (30, 0), (30, 30), (0, 30)])
+    msp.add_line((0, 15), (30, 15), dxfattribs={'color': 1})
+
+    _, entity_reps = collect_entity_ops(drawing)
+    ops = [rep[0] for rep in entity_reps]
+    bboxes = [rep[1] for rep in entity_reps]
+    dxf_space = get_extents(entity_reps)
+    shape = get_image_shape(dxf_space, 256)
+    widths = StrokePolicy().widths(shape)
+
+    batched = batch_ops(ops, bboxes, dxf_space, shape, widths)
+    assert [op.func.__name__ for op in batched] == ['line', 'pattern_hatch', 'line']
+
+    expected = np.zeros(shape)
+    for op in ops:
+        op(expected, dxf_space, stroke=widths)
+
+    actual = np.zeros(shape)
+    draw_ops(actual, ops, dxf_space, widths, bboxes=bboxes)
+    assert np.array_equal(actual, expected)
+    # 上の線は薄めた塗りの上に元の色で残ります
+    assert actual[shape[0] // 2].max() == 255
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import collections
+import io
+import mmap
+import multiprocessing
+import random
+
+import ezdxf
+import numpy as np
+
+from dxfvis import parallel
+from dxfvis import scan
+from dxfvis.scene import compile_scene
+from dxfvis.scene import rasterize_scene
+
+
+def _save_drawing(path: str, n: int = 400, seed: int = 0, curves: bool = True) -> None:
+    """lines, circles, 2D polylines (POLYLINE / VERTEX / SEQEND) and nested INSERTs with ATTRIBs
+
+    :param curves: False draws squares instead of circles, in the modelspace and in the blocks
+    """
+
+    rng = random.Random(seed)
+    drawing = ezdxf.new('R2010')
+    inner = drawing.blocks.new('INNER')
+    if curves:
+        inner.add_circle((0, 0), 1)
+    else:
+        inner.add_lwpolyline([(-1, -1), (1, -1), (1, 1), (-1, 1)], dxfattribs={'closed': True})
+    inner.add_line((-1, -1), (1, 1))
+    outer = drawing.blocks.new('OUTER')
+    outer.add_blockref('INNER', (2, 2))
+    outer.add_lwpolyline([(0, 0), (3, 0), (3, 3)])
+    outer.add_attdef('TAG', (0, 0))
+
+    msp = drawing.modelspace()
+    for i in range(n):
+        x, y = rng.uniform(0, 100), rng.uniform(0, 100)
+        kind = i % 4
+        if kind == 0:
+            msp.add_line((x, y), (x + rng.uniform(-10, 10), y + rng.uniform(-10, 10)), dxfattribs={'color': 1 + i % 7})
+        elif kind == 1:
+            r = rng.uniform(0.5, 5)
+            if curves:
+                msp.add_circle((x, y), r)
+            else:
+                msp.add_lwpolyline([(x - r, y - r), (x + r, y - r), (x + r, y + r), (x - r, y + r)])
+        elif kind == 2:
+            msp.add_polyline2d([(x + rng.uniform(-5, 5), y + rng.uniform(-5, 5)) for _ in range(rng.randint(2, 6))])
+        else:
+            insert = msp.add_blockref('OUTER', (x, y))
+            insert.add_attrib('TAG', str(i), (x, y))
+
+    drawing.saveas(path)
+
+
+def test_split_entities_starts_every_chunk_at_an_entity(tmp_path):
+    path = str(tmp_path / 'chunks.dxf')
+    _save_drawing(path)
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[:]
+
+    sections = scan.find_sections(data)
+    start, stop = sections['ENTITIES']
+    chunks = scan.split_entities(data, start, stop, 7)
+    assert len(chunks) == 7
+    assert chunks[0][0] == start and chunks[-1][1] == stop
+    assert all(a[1] == b[0] for a, b in zip(chunks[:-1], chunks[1:]))
+
+    counts = collections.Counter()
+    for chunk_start, chunk_stop in chunks:
+        # 区切りは `0` の行の先頭で、VERTEX / ATTRIB / SEQEND の前では区切りません
+        code, dxftype = data[chunk_start:chunk_stop].split(b'\n', 2)[:2]
+        assert code.strip() == b'0'
+        assert dxftype.strip() not in (b'VERTEX', b'ATTRIB', b'SEQEND')
+
+        # 前後のセクションとつないだものは、そのまま読める図面になります
+        text = (data[:start] + data[chunk_start:chunk_stop] + data[stop:]).decode('utf-8')
+        drawing = ezdxf.read(io.StringIO(text), legacy_mode=False)
+        counts.update(entity.dxftype() for entity in drawing.modelspace())
+
+    expected = collections.Counter(entity.dxftype() for entity in ezdxf.readfile(path).modelspace())
+    assert counts == expected
+
+
+def _compile_in_chunks(path: str, monkeypatch):
+    monkeypatch.setattr(parallel, 'MIN_CHUNK_BYTES', 1024)
+    return parallel.compile_scene_parallel(path, 512, workers=4, mp_context=multiprocessing.get_context('fork'))
+
+
+def test_parallel_scene_is_the_serial_scene(tmp_path, monkeypatch):
+    path = str(tmp_path / 'parallel.dxf')
+    _save_drawing(path, curves=False)
+
+    scene = _compile_in_chunks(path, monkeypatch)
+    expected = compile_scene(path, 512)
+
+    # チャンクごとに描画の区切りが一つあります
+    assert len(scene.runs) == 4
+    assert scene.extents == expected.extents
+    assert np.array_equal(scene.kinds, expected.kinds)
+    assert np.array_equal(rasterize_scene(scene, 512), rasterize_scene(expected, 512))
+
+
+def test_parallel_scene_flattens_curves_for_the_chunks(tmp_path, monkeypatch):
+    path = str(tmp_path / 'curves.dxf')
+    _save_drawing(path)
+
+    scene = _compile_in_chunks(path, monkeypatch)
+    expected = compile_scene(path, 512)
+
+    # 円は各チャンクの範囲で折れ線にするので、頂点が少し多くなることがあります
+    assert scene.extents == expected.extents
+    assert np.array_equal(scene.kinds, expected.kinds)
+    assert len(expected.coords) <= len(scene.coords) < len(expected.coords) * 1.1
+    diff = (rasterize_scene(scene, 512) != rasterize_scene(expected, 512)).any(axis=2)
+    assert diff.mean() < 0.01
+
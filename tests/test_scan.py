@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import collections
+import os
+
+import ezdxf
+import pytest
+
+from dxfvis import scan
+
+
+def _save_drawing(path: str) -> None:
+    """entities with VERTEX, ATTRIB and SEQEND, on a few layers, and a block"""
+
+    drawing = ezdxf.new('R2010')
+    drawing.header['$INSUNITS'] = 6
+    for name in ('WALL', 'DOOR'):
+        drawing.layers.new(name)
+
+    block = drawing.blocks.new('TAGGED')
+    block.add_circle((0, 0), 1)
+    block.add_attdef('TAG', (0, 0))
+
+    msp = drawing.modelspace()
+    for i in range(20):
+        msp.add_line((0, i), (10, i), dxfattribs={'layer': 'WALL'})
+        msp.add_circle((i, 0), 1, dxfattribs={'layer': 'DOOR'})
+        msp.add_polyline2d([(i, 0), (i + 1, 1), (i + 2, 0)][:2 + i % 2])
+        msp.add_lwpolyline([(i, 5), (i + 1, 6)])
+        msp.add_text('T{}'.format(i), dxfattribs={'insert': (i, 9)})
+        if i % 4 == 0:
+            insert = msp.add_blockref('TAGGED', (i, 20))
+            insert.add_attrib('TAG', str(i), (i, 20))
+
+    drawing.saveas(path)
+
+
+def test_probe_counts_match_ezdxf(tmp_path):
+    path = str(tmp_path / 'probe.dxf')
+    _save_drawing(path)
+    drawing = ezdxf.readfile(path)
+    msp = drawing.modelspace()
+
+    info = scan.probe(path)
+    expected = collections.Counter(entity.dxftype() for entity in msp)
+    polylines = [entity for entity in msp if entity.dxftype() == 'POLYLINE']
+    inserts = [entity for entity in msp if entity.dxftype() == 'INSERT']
+    # 頂点と属性は親のエンティティとは別に数えます. ブロックの中身は数えません
+    expected['VERTEX'] = sum(len(list(polyline.vertices())) for polyline in polylines)
+    expected['ATTRIB'] = sum(len(list(insert.attribs())) for insert in inserts)
+    expected['SEQEND'] = len(polylines) + len(inserts)
+
+    assert info.counts == dict(expected)
+    assert info.n_entities == sum(expected.values())
+    assert info.version == drawing.dxfversion
+    assert info.insunits == 6
+    assert info.layers == [layer.dxf.name for layer in drawing.layers]
+    assert info.size == os.path.getsize(path)
+
+
+def test_probe_reads_header_extents(tmp_path):
+    path = str(tmp_path / 'extents.dxf')
+    drawing = ezdxf.new('R2010')
+    drawing.modelspace().add_line((0, 0), (1, 1))
+    drawing.saveas(path)
+    # ezdxf は範囲を設定しないので、未設定の値 (1e20) のままです
+    assert scan.probe(path).extents is None
+
+    drawing.header['$EXTMIN'] = (-5, 2, 0)
+    drawing.header['$EXTMAX'] = (30, 40, 0)
+    drawing.saveas(path)
+    assert scan.probe(path).extents == ((-5., 2.), (30., 40.))
+
+
+def test_probe_rejects_empty_files(tmp_path):
+    path = tmp_path / 'empty.dxf'
+    path.write_bytes(b'')
+
+    with pytest.raises(ValueError):
+        scan.probe(str(path))
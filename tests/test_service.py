@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import asyncio
+import multiprocessing
+import time
+
+import ezdxf
+import numpy as np
+import pytest
+
+from dxfvis.service import QueueFullError
+from dxfvis.service import RenderService
+
+
+def _service(**kwargs) -> RenderService:
+    # テストではワーカーの起動を速くするため fork で作ります
+    return RenderService(mp_context=multiprocessing.get_context('fork'), **kwargs)
+
+
+async def _wait_idle(service: RenderService, timeout: float = 10.) -> None:
+    deadline = time.monotonic() + timeout
+    while service.queue_length > 0 and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+
+def test_rejects_jobs_beyond_max_queue():
+    async def main():
+        service = _service(max_workers=1, max_queue=2)
+        try:
+            jobs = [asyncio.ensure_future(service.run(key, time.sleep, 0.3)) for key in ('a', 'b')]
+            await asyncio.sleep(0)
+            assert service.queue_length == 2
+
+            with pytest.raises(QueueFullError):
+                await service.run('c', time.sleep, 0.3)
+
+            # 同じキーの要求は新しいジョブにならないので受け付けます
+            await asyncio.gather(service.run('a', time.sleep, 0.3), *jobs)
+            await _wait_idle(service)
+            assert service.queue_length == 0
+        finally:
+            service.close()
+
+    asyncio.run(main())
+
+
+def test_coalesced_requests_get_their_own_arrays(tmp_path):
+    drawing = ezdxf.new('R2010')
+    drawing.modelspace().add_line((0, 0), (10, 10))
+    path = str(tmp_path / 'line.dxf')
+    drawing.saveas(path)
+
+    async def main():
+        service = _service(max_workers=1, max_queue=1)
+        try:
+            # 一つのジョブを共有するので、max_queue=1 でも三つとも受け付けます
+            images = await asyncio.gather(*[service.render(path, 64) for _ in range(3)])
+        finally:
+            service.close()
+
+        return images
+
+    images = asyncio.run(main())
+    assert images[0].any()
+    assert all(np.array_equal(image, images[0]) for image in images)
+    assert len({id(image) for image in images}) == 3
+
+    images[0][...] = 0
+    assert images[1].any() and images[2].any()
+
+
+def test_timeout_keeps_slot_until_the_worker_is_done():
+    async def main():
+        service = _service(max_workers=1, max_queue=1)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await service.run(None, time.sleep, 0.5, timeout=0.05)
+
+            # 実行中のジョブはワーカーが終わるまで数えます
+            assert service.queue_length == 1
+            with pytest.raises(QueueFullError):
+                await service.run(None, time.sleep, 0.)
+
+            await _wait_idle(service)
+            assert service.queue_length == 0
+            assert await service.run(None, abs, -1) == 1
+        finally:
+            service.close()
+
+    asyncio.run(main())
+
+
+def test_job_is_cancelled_when_the_last_waiter_leaves():
+    async def main():
+        service = _service(max_workers=1, max_queue=4)
+        try:
+            running = asyncio.ensure_future(service.run('running', time.sleep, 0.5))
+            await asyncio.sleep(0)
+
+            # 待っている要求が一つでも残れば、ジョブは続きます
+            first = asyncio.ensure_future(service.run('queued', abs, -2, timeout=0.05))
+            second = asyncio.ensure_future(service.run('queued', abs, -2))
+            with pytest.raises(asyncio.TimeoutError):
+                await first
+            assert 'queued' in service._jobs
+
+            # 最後の要求が離れると、まだ始まっていないジョブは取り消されます
+            with pytest.raises(asyncio.TimeoutError):
+                await service.run('dropped', abs, -3, timeout=0.05)
+            await asyncio.sleep(0.01)
+            assert 'dropped' not in service._jobs
+            assert service.queue_length == 2
+
+            assert await second == 2
+            await running
+            await _wait_idle(service)
+            assert service.queue_length == 0
+        finally:
+            service.close()
+
+    asyncio.run(main())
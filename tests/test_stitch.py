@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+import cv2
+import numpy as np
+
+from dxfvis.stitch import chain_segments
+from dxfvis.stitch import stitch_lines
+from dxfvis.stroke import StrokePolicy
+from dxfvis.types import OpenCVOp
+from dxfvis.types import VariableStatus as S
+
+
+def _chains(segments, tolerance=None):
+    vertices, offsets = chain_segments(np.array(segments, dtype=np.float64), tolerance)
+    return [vertices[start:stop].tolist() for start, stop in zip(offsets[:-1], offsets[1:])]
+
+
+def _edges(chains):
+    """segments of the chains, without their direction"""
+    return sorted(tuple(sorted(map(tuple, chain[i:i + 2]))) for chain in chains for i in range(len(chain) - 1))
+
+
+def _line_op(pt1, pt2, color=(255, 255, 255)):
+    return OpenCVOp(cv2.line,
+                    args=((pt1, S.POINT_MAPPING), (pt2, S.POINT_MAPPING)),
+                    kwargs={'color': (color, S.NO_MAPPING), 'thickness': (1, S.NO_MAPPING)})
+
+
+def test_open_chain():
+    chains = _chains([((0, 0), (1, 0)), ((1, 0), (1, 1)), ((1, 1), (2, 1))])
+    assert len(chains) == 1
+    assert chains[0] in ([[0, 0], [1, 0], [1, 1], [2, 1]], [[2, 1], [1, 1], [1, 0], [0, 0]])
+
+
+def test_closed_loop():
+    square = [((0, 0), (1, 0)), ((1, 0), (1, 1)), ((1, 1), (0, 1)), ((0, 1), (0, 0))]
+    chains = _chains(square)
+    # 閉じた鎖は一つの頂点で切られ、始点に戻ります
+    assert len(chains) == 1
+    assert len(chains[0]) == 5
+    assert chains[0][0] == chains[0][-1]
+    assert _edges(chains) == _edges([[list(a), list(b)] for a, b in square])
+
+
+def test_t_junction():
+    segments = [((0, 0), (1, 0)), ((1, 0), (2, 0)), ((1, 0), (1, 1))]
+    chains = _chains(segments)
+    # 三本が出会う端点では繋ぎません
+    assert len(chains) == 3
+    assert all(len(chain) == 2 for chain in chains)
+    assert _edges(chains) == _edges([[list(a), list(b)] for a, b in segments])
+
+
+def test_reversed_segment():
+    chains = _chains([((0, 0), (1, 0)), ((2, 0), (1, 0))])
+    assert len(chains) == 1
+    assert chains[0] in ([[0, 0], [1, 0], [2, 0]], [[2, 0], [1, 0], [0, 0]])
+
+
+def test_reversed_duplicate():
+    # 同じ二点を結ぶ二本は長さ2の閉じた鎖です
+    chains = _chains([((0, 0), (1, 0)), ((1, 0), (0, 0))])
+    assert len(chains) == 1
+    assert len(chains[0]) == 3
+    assert chains[0][0] == chains[0][-1]
+
+
+def test_near_miss_tolerance():
+    segments = [((0, 0), (1, 0)), ((1.001, 0), (2, 0))]
+    assert len(_chains(segments, tolerance=1e-6)) == 2
+    assert len(_chains(segments, tolerance=1e-2)) == 1
+
+
+def test_every_segment_in_one_chain():
+    rng = np.random.default_rng(0)
+    # 格子の上の線分は、繋がる端点と分かれる端点を両方含みます
+    starts = rng.integers(0, 6, size=(200, 2))
+    ends = starts + rng.choice([(1, 0), (0, 1), (-1, 0), (0, -1)], size=200)
+    segments = np.stack([starts, ends], axis=1).astype(np.float64)
+    chains = _chains(segments)
+    assert _edges(chains) == _edges([[list(a), list(b)] for a, b in segments.tolist()])
+
+
+def test_stitch_lines_by_style():
+    red, green = (0, 0, 255), (0, 255, 0)
+    ops = [_line_op((0, 0), (1, 0), red), _line_op((1, 0), (1, 1), red),
+           _line_op((1, 1), (2, 1), green), _line_op((2, 1), (2, 2), red)]
+    stitched = stitch_lines(ops)
+    # 隣り合う同じスタイルの線だけがまとめられ、描く順は変わりません
+    assert [op.func for op in stitched] == [cv2.polylines, cv2.line, cv2.line]
+    assert stitched[1] is ops[2] and stitched[2] is ops[3]
+
+
+def test_stitch_lines_keeps_image():
+    rng = np.random.default_rng(1)
+    pts = rng.uniform(0, 100, size=(40, 2))
+    ops = [_line_op(tuple(a), tuple(b)) for a, b in zip(pts[:-1], pts[1:])]
+    dxf_space = ((0., 0.), (100., 100.))
+    shape = (200, 200, 3)
+    widths = StrokePolicy().widths(shape)
+
+    expected = np.zeros(shape)
+    for op in ops:
+        op(expected, dxf_space, stroke=widths)
+
+    stitched = stitch_lines(ops, widths)
+    assert len(stitched) == 1
+
+    actual = np.zeros(shape)
+    stitched[0](actual, dxf_space, stroke=widths)
+    assert np.array_equal(actual, expected)